@@ -0,0 +1,64 @@
+"""Measure the cost of Basic Auth per request, with the user id derived
+on each call of the policy, and once per request.
+
+Usage::
+
+    python benchmarks/authentication.py --users 100
+
+Each request authenticates one of the users, as the application does:
+authenticated user id first, then effective principals.
+"""
+import argparse
+import base64
+import random
+import timeit
+
+import mock
+from pyramid.request import Request
+
+from cliquet import authentication as cliquet_auth
+from readinglist import authentication
+
+
+def authorization(user):
+    credentials = ('user%s:secret' % user).encode('utf-8')
+    return 'Basic %s' % base64.b64encode(credentials).decode('ascii')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    registry = mock.Mock(settings={'cliquet.userid_hmac_secret': 'abc'})
+    headers = [authorization(random.randrange(args.users))
+               for _ in range(args.requests)]
+
+    def authenticate(policy):
+        for header in headers:
+            request = Request.blank('/', headers={'Authorization': header})
+            request.registry = registry
+            policy.authenticated_userid(request)
+            policy.effective_principals(request)
+
+    def build_requests():
+        for header in headers:
+            request = Request.blank('/', headers={'Authorization': header})
+            request.registry = registry
+
+    # Building requests is not part of the authentication cost.
+    baseline = timeit.timeit(build_requests, number=1)
+
+    policies = (
+        ('cliquet', cliquet_auth.BasicAuthAuthenticationPolicy()),
+        ('readinglist', authentication.BasicAuthAuthenticationPolicy()),
+    )
+    for name, policy in policies:
+        duration = timeit.timeit(lambda: authenticate(policy), number=1)
+        per_request = (duration - baseline) * 1000000 / args.requests
+        print('%-10s %8.2f us per request' % (name, per_request))
+
+
+if __name__ == '__main__':
+    main()
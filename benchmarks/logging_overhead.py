@@ -0,0 +1,107 @@
+"""Measure the logging overhead per request, with handlers run synchronously
+or from a queue, and with events of disabled levels rendered or skipped.
+
+Usage::
+
+    python benchmarks/logging_overhead.py --requests 20000
+    python benchmarks/logging_overhead.py --write-latency 0.5
+
+Each request logs debug events (disabled, as in production) and a request
+summary, with the *cliquet* processors and renderer, into a file. Writes
+can be slowed down, like a saturated pipe or a remote handler (e.g. Sentry).
+"""
+import argparse
+import logging
+import tempfile
+import time
+import timeit
+
+import structlog
+from cliquet.logs import ClassicLogRenderer
+
+from readinglist import logs
+
+
+class SlowStream(object):
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text):
+        time.sleep(self.latency)
+        self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def configure(wrapper_class, handler):
+    stdlib_logger = logging.getLogger('benchmark')
+    stdlib_logger.handlers = [handler]
+    stdlib_logger.setLevel(logging.INFO)
+    stdlib_logger.propagate = False
+
+    structlog.configure(
+        context_class=structlog.threadlocal.wrap_dict(dict),
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=wrapper_class,
+        processors=[
+            structlog.stdlib.filter_by_level,
+            structlog.processors.format_exc_info,
+            ClassicLogRenderer({}),
+        ])
+    return structlog.get_logger('benchmark')
+
+
+def request(logger, debug_events):
+    logger.new(agent='Firefox', path='/v2/articles', method='GET',
+               querystring={'_since': '1436094288171'}, uid='abc', lang='fr',
+               authn_type='fxa', errno=None)
+    for i in range(debug_events):
+        logger.debug('SELECT * FROM records WHERE parent_id = %(parent_id)s;',
+                     statement=i)
+    logger.info('request.summary', code=200, t=12, nb_records=25)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--debug-events', type=int, default=5)
+    parser.add_argument('--write-latency', type=float, default=0,
+                        help='Duration of each write, in milliseconds')
+    args = parser.parse_args()
+
+    output = tempfile.NamedTemporaryFile(mode='w', suffix='.log')
+    if args.write_latency:
+        output = SlowStream(output, args.write_latency / 1000)
+    formatter = logging.Formatter('%(asctime)s %(levelname)-5.5s %(message)s')
+
+    def stream_handler():
+        handler = logging.StreamHandler(output)
+        handler.setFormatter(formatter)
+        return handler
+
+    def queue_handler():
+        return logs.QueueHandler(max_size=100000, batch_size=100,
+                                 target=stream_handler())
+
+    variants = [
+        ('synchronous', structlog.stdlib.BoundLogger, stream_handler),
+        ('skip disabled levels', logs.BoundLogger, stream_handler),
+        ('queue', structlog.stdlib.BoundLogger, queue_handler),
+        ('queue, skip disabled levels', logs.BoundLogger, queue_handler),
+    ]
+    for name, wrapper_class, new_handler in variants:
+        handler = new_handler()
+        logger = configure(wrapper_class, handler)
+        duration = timeit.timeit(lambda: request(logger, args.debug_events),
+                                 number=args.requests)
+        handler.close()
+        print('%-30s %8.2f us per request' % (
+            name, duration * 1000000 / args.requests))
+        if isinstance(handler, logs.QueueHandler):
+            print('%-30s %8d' % ('    dropped records', handler.dropped))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Compare the frequent queries of articles with the *cliquet* in-memory
+storage backend, and with the indexed one of *Reading List*.
+
+Usage::
+
+    python benchmarks/memory_storage.py --articles 10000
+
+Articles are created for a single user, like for the requests below.
+"""
+import argparse
+import timeit
+
+from cliquet.storage import Filter, Sort
+from cliquet.storage import memory as cliquet_memory
+from cliquet.utils import COMPARISON
+
+from readinglist.storage import memory
+
+
+PARENT_ID = 'benchmark-memory'
+UNIQUE_FIELDS = ('url', 'resolved_url')
+KW = dict(collection_id='article', parent_id=PARENT_ID)
+
+
+def populate(storage, count):
+    records = []
+    for i in range(count):
+        article = {'url': 'http://%s.com' % i,
+                   'resolved_url': 'http://%s.com' % i,
+                   'title': 'Article %s' % i,
+                   'excerpt': 'About %s' % i,
+                   'unread': i % 10 == 0,
+                   'favorite': False,
+                   'archived': False}
+        records.append(storage.create(record=article,
+                                      unique_fields=UNIQUE_FIELDS, **KW))
+    return records
+
+
+def poll(storage, records):
+    """GET /articles?_since=...&unread=true"""
+    since = records[-10]['last_modified']
+    filters = [Filter('last_modified', since, COMPARISON.GT),
+               Filter('unread', True, COMPARISON.EQ)]
+    storage.get_all(filters=filters, sorting=[Sort('last_modified', -1)],
+                    include_deleted=True, limit=25, **KW)
+
+
+def list_unread(storage, records):
+    """GET /articles?unread=true&_limit=25"""
+    filters = [Filter('unread', True, COMPARISON.EQ)]
+    storage.get_all(filters=filters, sorting=[Sort('last_modified', -1)],
+                    limit=25, **KW)
+
+
+def update(storage, records):
+    """PATCH /articles/<id>"""
+    record = dict(records[0], read_position=42)
+    storage.update(object_id=record['id'], record=record,
+                   unique_fields=UNIQUE_FIELDS, **KW)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--articles', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    backends = [('cliquet', cliquet_memory.Memory()),
+                ('indexed', memory.Memory())]
+    for name, storage in backends:
+        records = populate(storage, args.articles)
+        print('%s (%s articles)' % (name, args.articles))
+        for func in (poll, list_unread, update):
+            duration = timeit.timeit(lambda: func(storage, records),
+                                     number=args.repeat)
+            print('    %-20s %8.3f ms' % (func.__name__,
+                                          duration * 1000 / args.repeat))
+
+
+if __name__ == '__main__':
+    main()
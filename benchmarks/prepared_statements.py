@@ -0,0 +1,112 @@
+"""Compare the storage queries of frequent requests, with and without
+prepared statements.
+
+Usage::
+
+    python benchmarks/prepared_statements.py config/readinglist.ini
+
+Articles are created for a dedicated user, and removed afterwards. The
+difference of durations is the time spent by PostgreSQL parsing and planning
+queries, saved by prepared statements.
+"""
+import argparse
+import timeit
+import uuid
+
+from pyramid.paster import get_appsettings
+
+from cliquet.storage import Filter, Sort
+from cliquet.utils import COMPARISON, json
+from readinglist.storage.postgresql import PostgreSQL, connection_kwargs
+
+
+PARENT_ID = 'benchmark-prepared-statements'
+UNIQUE_FIELDS = ('url', 'resolved_url')
+
+
+def populate(storage, count):
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    with storage.connect() as cursor:
+        for i, record_id in enumerate(ids):
+            article = {'url': 'http://%s.com' % i,
+                       'title': 'Article %s' % i,
+                       'unread': True}
+            cursor.execute("""
+            INSERT INTO records (id, parent_id, collection_id, data)
+            VALUES (%(id)s, %(parent_id)s, 'article', %(data)s::JSONB);
+            """, dict(id=record_id, parent_id=PARENT_ID,
+                      data=json.dumps(article)))
+    return ids
+
+
+def purge(storage):
+    with storage.connect() as cursor:
+        cursor.execute("""
+        DELETE FROM records WHERE parent_id = %(parent_id)s;
+        DELETE FROM deleted WHERE parent_id = %(parent_id)s;
+        """, dict(parent_id=PARENT_ID))
+
+
+def poll(storage, ids):
+    """GET /articles?_since=...&unread=true"""
+    timestamp = storage.collection_timestamp('article', PARENT_ID)
+    filters = [Filter('last_modified', timestamp - 1000, COMPARISON.GT),
+               Filter('unread', True, COMPARISON.EQ)]
+    sorting = [Sort('last_modified', -1)]
+    storage.get_all('article', PARENT_ID, filters=filters, sorting=sorting,
+                    limit=25)
+
+
+def read(storage, ids):
+    """GET /articles/<id>"""
+    storage.collection_timestamp('article', PARENT_ID)
+    storage.get('article', PARENT_ID, ids[0])
+
+
+def patch(storage, ids):
+    """PATCH /articles/<id>"""
+    record = storage.get('article', PARENT_ID, ids[1])
+    record['read_position'] = record.get('read_position', 0) + 1
+    storage.update('article', PARENT_ID, ids[1], record,
+                   unique_fields=UNIQUE_FIELDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('ini', help='Application configuration file')
+    parser.add_argument('--articles', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    settings = get_appsettings(args.ini)
+    conn_kwargs = connection_kwargs(settings['cliquet.storage_url'])
+    # Both instances share the same connection.
+    storages = [
+        PostgreSQL(max_fetch_size=args.articles, pool_size=1,
+                   prepared_statements=prepared, **conn_kwargs)
+        for prepared in (False, True)]
+    storages[0].initialize_schema()
+
+    ids = populate(storages[0], args.articles)
+    try:
+        with storages[0].connect() as cursor:
+            cursor.execute('ANALYZE records;')
+
+        for func in (poll, read, patch):
+            print('%s (%s)' % (func.__name__, func.__doc__))
+            durations = []
+            for storage in storages:
+                func(storage, ids)
+                duration = timeit.timeit(lambda: func(storage, ids),
+                                         number=args.repeat)
+                durations.append(duration * 1000 / args.repeat)
+            print('    %-20s %8.2f ms' % ('unprepared', durations[0]))
+            print('    %-20s %8.2f ms' % ('prepared', durations[1]))
+            print('    %-20s %8.2f ms' % ('saved per request',
+                                          durations[0] - durations[1]))
+    finally:
+        purge(storages[0])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Compare the full-text search of articles with the download of the whole
+collection, filtered on the client.
+
+Usage::
+
+    python benchmarks/search.py config/readinglist.ini --articles 10000
+
+Articles are created for a dedicated user, and removed afterwards.
+"""
+import argparse
+import random
+import string
+import timeit
+import uuid
+
+from pyramid.paster import get_appsettings
+
+from cliquet.utils import json
+from readinglist.storage.postgresql import PostgreSQL, connection_kwargs
+
+
+PARENT_ID = 'benchmark-search'
+# Frequent words match many articles, rare ones a few.
+WORDS = [''.join(random.sample(string.ascii_lowercase, 6))
+         for _ in range(2000)]
+
+
+def sentence(length):
+    words = [WORDS[int(random.paretovariate(1)) % len(WORDS)]
+             for _ in range(length)]
+    return ' '.join(words)
+
+
+def populate(storage, count):
+    with storage.connect() as cursor:
+        for _ in range(count):
+            article = {'title': sentence(5),
+                       'resolved_title': sentence(5),
+                       'excerpt': sentence(40),
+                       'unread': True}
+            cursor.execute("""
+            INSERT INTO records (id, parent_id, collection_id, data)
+            VALUES (%(id)s, %(parent_id)s, 'article', %(data)s::JSONB);
+            """, dict(id=str(uuid.uuid4()), parent_id=PARENT_ID,
+                      data=json.dumps(article)))
+
+
+def purge(storage):
+    with storage.connect() as cursor:
+        cursor.execute("""
+        DELETE FROM records WHERE parent_id = %(parent_id)s;
+        DELETE FROM deleted WHERE parent_id = %(parent_id)s;
+        """, dict(parent_id=PARENT_ID))
+
+
+def search(storage, terms, limit):
+    return storage.search('article', PARENT_ID, terms, limit=limit)
+
+
+def download_and_filter(storage, terms, limit):
+    records, _ = storage.get_all('article', PARENT_ID)
+    terms = terms.split()
+    fields = ('title', 'resolved_title', 'excerpt')
+    matching = [r for r in records
+                if all([any([t in r.get(f, '').split() for f in fields])
+                        for t in terms])]
+    return matching[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('ini', help='Application configuration file')
+    parser.add_argument('--articles', type=int, default=10000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    settings = get_appsettings(args.ini)
+    storage = PostgreSQL(max_fetch_size=args.articles, pool_size=1,
+                         **connection_kwargs(settings['cliquet.storage_url']))
+    storage.initialize_schema()
+
+    populate(storage, args.articles)
+    try:
+        with storage.connect() as cursor:
+            cursor.execute('ANALYZE records;')
+
+        queries = (WORDS[5], WORDS[200], '%s %s' % (WORDS[10], WORDS[50]))
+        for terms in queries:
+            _, total = search(storage, terms, args.limit)
+            print('%r: %s matching articles out of %s' % (terms, total,
+                                                          args.articles))
+            for func in (search, download_and_filter):
+                duration = timeit.timeit(
+                    lambda: func(storage, terms, args.limit),
+                    number=args.repeat)
+                print('    %-20s %8.2f ms' % (func.__name__,
+                                              duration * 1000 / args.repeat))
+    finally:
+        purge(storage)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Compare the size and the encoding/decoding time of articles lists in JSON,
+columnar JSON and MessagePack.
+
+Usage::
+
+    python benchmarks/serialization.py --articles 100
+
+Articles are generated in memory, with every field of the schema.
+"""
+import argparse
+import random
+import string
+import timeit
+import uuid
+
+from readinglist import compression, serialization
+from cliquet.utils import json
+
+
+def word(length=8):
+    return ''.join(random.sample(string.ascii_lowercase, length))
+
+
+def article(index):
+    url = 'http://%s.com/%s' % (word(), word())
+    return {
+        'id': str(uuid.uuid4()),
+        'last_modified': 1437034418940 + index,
+        'url': url,
+        'resolved_url': url,
+        'title': ' '.join([word() for _ in range(6)]),
+        'resolved_title': ' '.join([word() for _ in range(6)]),
+        'excerpt': ' '.join([word() for _ in range(30)]),
+        'added_by': 'Firefox on Android',
+        'added_on': 1437034418940,
+        'stored_on': 1437034418940,
+        'last_modified_by': None,
+        'archived': False,
+        'favorite': random.random() < 0.1,
+        'is_article': True,
+        'unread': random.random() < 0.8,
+        'read_position': 0,
+        'read_on': None,
+        'marked_read_by': None,
+        'marked_read_on': None,
+        'word_count': random.randint(100, 5000),
+    }
+
+
+def json_dumps(value):
+    return json.dumps(value).encode('utf-8')
+
+
+def json_loads(data):
+    return json.loads(data.decode('utf-8'))
+
+
+FORMATS = (
+    ('json', json_dumps, json_loads),
+    ('columnar', serialization.dumps_columnar, serialization.loads_columnar),
+    ('msgpack', serialization.dumps_msgpack, serialization.loads_msgpack),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--articles', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    value = {'data': [article(i) for i in range(args.articles)]}
+
+    columns = ('format', 'bytes', 'gzipped', 'encode (ms)', 'decode (ms)')
+    print('%-10s %10s %10s %12s %12s' % columns)
+    for name, dumps, loads in FORMATS:
+        data = dumps(value)
+        assert loads(data) == json_loads(json_dumps(value))
+        gzipped = compression.gzip_compress(data, 6)
+        encode = timeit.timeit(lambda: dumps(value), number=args.repeat)
+        decode = timeit.timeit(lambda: loads(data), number=args.repeat)
+        print('%-10s %10s %10s %12.3f %12.3f' % (
+            name, len(data), len(gzipped),
+            encode * 1000 / args.repeat,
+            decode * 1000 / args.repeat))
+
+
+if __name__ == '__main__':
+    main()
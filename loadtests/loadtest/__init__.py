@@ -26,6 +26,7 @@ ACTIONS_FREQUENCIES = [
     ('list_deleted', 40),
     ('batch_count', 50),
     ('list_continuated_pagination', 80),
+    ('search', 40),
 ]
 
 
@@ -192,6 +193,13 @@ class TestBasic(TestCase):
         self.incr_counter(resp.status_code)
         self.assertEqual(resp.status_code, 200)
 
+    def search(self):
+        terms = random.choice(['corp', 'site', 'corp site'])
+        url = self.api_url('articles?q={}&_limit=20'.format(terms))
+        resp = self.session.get(url, auth=self.auth)
+        self.incr_counter(resp.status_code)
+        self.assertEqual(resp.status_code, 200)
+
     def _patch(self, url, data, status=200):
         body = json.dumps({'data': data})
         resp = self.session.patch(url, body, auth=self.auth)
@@ -6,6 +6,9 @@ from pyramid.settings import asbool
 
 import cliquet
 
+from readinglist import (authentication, degraded, invalidation, logs,
+                         response_cache, workers)
+
 
 # Module version, as defined in PEP-0396.
 __version__ = pkg_resources.get_distribution(__package__).version
@@ -18,7 +21,76 @@ logger = logging.getLogger(__name__)
 
 
 DEFAULT_SETTINGS = {
-    'cliquet.paginate_by': 100
+    'cliquet.paginate_by': 100,
+    'multiauth.policies': 'fxa basicauth',
+    'multiauth.policy.fxa.use': ('readinglist.authentication.'
+                                 'FxAAuthenticationPolicy'),
+    'multiauth.policy.basicauth.use': ('readinglist.authentication.'
+                                       'BasicAuthAuthenticationPolicy'),
+    'multiauth.authorization_policy': ('readinglist.authorization.'
+                                       'OwnerOnlyAuthorizationPolicy'),
+    'cliquet.permission_backend': 'cliquet.permission.memory',
+    'fxa-oauth.scope': 'readinglist',
+    'fxa-oauth.cache_ttl_seconds': 300,
+    'fxa-oauth.cache_negative_ttl_seconds': 60,
+    'fxa-oauth.cache_max_size': 10000,
+    'fxa-oauth.requests_timeout_seconds': 5,
+    'readinglist.bus_url': '',
+    'readinglist.bus_reconnect_interval': 1,
+    'readinglist.cache_shared_backend': 'cliquet.cache.postgresql',
+    'readinglist.cache_local_max_size': 1000,
+    'readinglist.cache_local_ttl': 5,
+    'readinglist.timestamps_cache_enabled': False,
+    'readinglist.timestamps_cache_max_size': 10000,
+    'readinglist.timestamps_cache_ttl': 60,
+    'readinglist.timestamps_cache_fallback_ttl': 1,
+    'readinglist.storage_partitions': 8,
+    'readinglist.storage_partition_urls': '',
+    'readinglist.storage_partitions_directory_ttl': 5,
+    'readinglist.storage_replica_urls': '',
+    'readinglist.storage_replica_pin_ttl': 5,
+    'readinglist.storage_replica_max_lag': 10,
+    'readinglist.storage_replica_check_interval': 5,
+    'readinglist.storage_shared_metadata': False,
+    'readinglist.storage_prepared_statements': False,
+    'readinglist.storage_slow_query_threshold': 0,
+    'readinglist.storage_slow_query_max_samples': 10,
+    'readinglist.storage_slow_query_explain': True,
+    'readinglist.storage_memory_snapshot_path': '',
+    'readinglist.storage_memory_snapshot_interval': 60,
+    'readinglist.response_cache_enabled': True,
+    'readinglist.response_cache_max_size': 10 * 1024 * 1024,
+    'readinglist.response_cache_max_entry_size': 512 * 1024,
+    'readinglist.response_cache_shared': False,
+    'readinglist.response_cache_ttl': 3600,
+    'readinglist.serialization_enabled': True,
+    'readinglist.compression_enabled': True,
+    'readinglist.compression_min_size': 1024,
+    'readinglist.compression_gzip_level': 6,
+    'readinglist.compression_brotli_quality': 5,
+    'readinglist.compression_max_request_size': 10 * 1024 * 1024,
+    'readinglist.batch_workers': 4,
+    'readinglist.profiling_enabled': False,
+    'readinglist.profiling_secret': '',
+    'readinglist.profiling_directory': '',
+    'readinglist.profiling_top': 30,
+    'readinglist.admission_enabled': False,
+    'readinglist.admission_max_inflight': 50,
+    'readinglist.admission_target_latency': 1,
+    'readinglist.admission_soft_limit': 0.75,
+    'readinglist.admission_max_batch_size': 10,
+    'readinglist.admission_user_rate': 5,
+    'readinglist.admission_user_burst': 50,
+    'readinglist.admission_user_max_size': 10000,
+    'readinglist.idempotency_enabled': True,
+    'readinglist.idempotency_ttl': 3600,
+    'readinglist.idempotency_pending_ttl': 60,
+    'readinglist.degraded_enabled': False,
+    'readinglist.degraded_failure_threshold': 5,
+    'readinglist.degraded_reset_timeout': 10,
+    'readinglist.degraded_snapshot_ttl': 3600,
+    'readinglist.degraded_snapshot_max_size': 10 * 1024 * 1024,
+    'readinglist.degraded_snapshot_max_entry_size': 512 * 1024,
 }
 
 
@@ -39,7 +111,36 @@ def main(global_config, **settings):
 
     cliquet.initialize(config, version=__version__,
                        default_settings=DEFAULT_SETTINGS)
-
-    config.scan("readinglist.views")
+    logs.setup_logging()
+
+    config.registry.storage = invalidation.load_from_config(config)
+    config.registry.storage = degraded.load_from_config(config)
+    config.registry.token_verifier = authentication.load_from_config(config)
+    config.registry.response_cache = response_cache.load_from_config(config)
+    config.registry.batch_workers = workers.load_from_config(config)
+
+    # Snapshots are taken of JSON bodies, before any conversion.
+    if asbool(config.get_settings()['readinglist.degraded_enabled']):
+        config.add_tween('readinglist.degraded.degraded_tween_factory')
+    # Retries are answered within the rate limits of admission control.
+    if asbool(config.get_settings()['readinglist.idempotency_enabled']):
+        config.add_tween(
+            'readinglist.idempotency.idempotency_tween_factory')
+    # Admission is decided on decompressed JSON bodies, to count batches.
+    if asbool(config.get_settings()['readinglist.admission_enabled']):
+        config.add_tween('readinglist.admission.admission_tween_factory')
+    # Bodies are converted between formats inside the compression layer.
+    if asbool(config.get_settings()['readinglist.serialization_enabled']):
+        config.add_tween(
+            'readinglist.serialization.serialization_tween_factory')
+    if asbool(config.get_settings()['readinglist.compression_enabled']):
+        config.add_tween('readinglist.compression.compression_tween_factory')
+    # Profiled requests include every other layer.
+    if asbool(config.get_settings()['readinglist.profiling_enabled']):
+        config.add_tween('readinglist.profiling.profiling_tween_factory')
+
+    # Export and import endpoints take precedence over articles records.
+    config.scan("readinglist.views.bulk")
+    config.scan("readinglist.views", ignore="readinglist.views.bulk")
     app = config.make_wsgi_app()
     return cliquet.install_middlewares(app, settings)
@@ -0,0 +1,292 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import six
+from pyramid.httpexceptions import (HTTPClientError,
+                                    HTTPServiceUnavailable)
+
+from cliquet import errors, logger
+from cliquet.utils import reapply_cors
+
+from readinglist.storage.postgresql import PostgreSQL
+
+
+# Requests classes, from the most to the least important.
+CRITICAL = 'critical'
+NORMAL = 'normal'
+EXPENSIVE = 'expensive'
+
+VERSION_PREFIX_REGEXP = re.compile(r'^/v\d+')
+HEARTBEAT_PATHS = ('/__heartbeat__', '/__lbheartbeat__')
+
+
+class HTTPTooManyRequests(HTTPClientError):
+    """Missing from :mod:`pyramid.httpexceptions` (RFC 6585)."""
+    code = 429
+    title = 'Too Many Requests'
+    explanation = 'Too many requests were sent.'
+
+
+def classify(request, max_batch_size):
+    """Return the class of the request, according to its importance for
+    clients and its cost for the server.
+
+    Heartbeats, updates of articles (like the read position) and
+    synchronization polls (``_since``) are critical. Full listings, searches,
+    exports, imports and batches of more than ``max_batch_size`` requests are
+    expensive.
+
+    :rtype: str
+    """
+    method = request.method
+    path = VERSION_PREFIX_REGEXP.sub('', request.path_info).rstrip('/')
+
+    if method == 'OPTIONS' or path in HEARTBEAT_PATHS:
+        return CRITICAL
+    if path.startswith('/articles/') and method == 'PATCH':
+        return CRITICAL
+
+    if method in ('GET', 'HEAD') and path.startswith('/articles'):
+        if '_since' in request.GET:
+            return CRITICAL
+        if path in ('/articles', '/articles/export') or 'q' in request.GET:
+            return EXPENSIVE
+    if method == 'POST' and path == '/articles/import':
+        return EXPENSIVE
+
+    if method == 'POST' and path == '/batch':
+        try:
+            size = len(request.json_body['requests'])
+        except (ValueError, KeyError, TypeError):
+            size = 0
+        if size > max_batch_size:
+            return EXPENSIVE
+
+    return NORMAL
+
+
+def pool_usage():
+    """Return the highest ratio of connections in use among the
+    PostgreSQL pools of the process, including partitions and replicas.
+    """
+    ratios = [0.0]
+    with PostgreSQL._pools_lock:
+        pools = list(PostgreSQL._pools.values())
+    for pool in pools:
+        if not pool.closed:
+            # psycopg2 pools raise instead of waiting once exhausted.
+            ratios.append(len(pool._used) / float(pool.maxconn))
+    return max(ratios)
+
+
+class AdmissionController(object):
+    """Decide which requests are processed, according to the load of the
+    process.
+
+    The pressure is the highest of the ratios of requests in flight to
+    ``max_inflight``, of the average duration of recent requests to
+    ``target_latency``, and of the values of the ``probes`` (e.g.
+    :func:`pool_usage`). The average duration decays with a
+    ``half_life`` while no request completes.
+
+    Above ``soft_limit``, expensive requests are rejected and clients are
+    told to back off. Above 1.0, only critical requests are processed.
+
+    :param int max_inflight: requests processed concurrently at full load.
+    :param float target_latency: average duration of requests at full load,
+        in seconds.
+    :param float soft_limit: pressure above which load is shed.
+    :param float smoothing: weight of each request in the average duration.
+    :param float half_life: decay of the average duration, in seconds.
+    :param list probes: callables returning additional load ratios.
+    """
+
+    #: Decisions.
+    ADMIT = 'admit'
+    BACKOFF = 'backoff'
+    REJECT = 'reject'
+
+    def __init__(self, max_inflight, target_latency, soft_limit=0.75,
+                 smoothing=0.1, half_life=5, probes=()):
+        self.max_inflight = max_inflight
+        self.target_latency = target_latency
+        self.soft_limit = soft_limit
+        self.smoothing = smoothing
+        self.half_life = half_life
+        self.probes = list(probes)
+        self.inflight = 0
+        self._latency = 0.0
+        self._latency_time = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def latency(self):
+        """Average duration of recent requests, in seconds."""
+        elapsed = max(time.time() - self._latency_time, 0)
+        return self._latency * 0.5 ** (elapsed / self.half_life)
+
+    def pressure(self):
+        """Return the current load, where 1.0 is full load.
+
+        :rtype: float
+        """
+        ratios = [self.inflight / float(self.max_inflight),
+                  self.latency / self.target_latency]
+        ratios += [probe() for probe in self.probes]
+        return max(ratios)
+
+    def decide(self, pressure, request_class):
+        """Return the decision for a request of the specified class, under
+        the specified pressure.
+
+        :rtype: str
+        """
+        if pressure < self.soft_limit:
+            return self.ADMIT
+        if request_class == CRITICAL:
+            return self.BACKOFF
+        if pressure >= 1.0 or request_class == EXPENSIVE:
+            return self.REJECT
+        return self.BACKOFF
+
+    def started(self):
+        with self._lock:
+            self.inflight += 1
+
+    def finished(self, duration):
+        """Account for a request processed in ``duration`` seconds."""
+        with self._lock:
+            self.inflight -= 1
+            latency = self.latency
+            self._latency = latency + self.smoothing * (duration - latency)
+            self._latency_time = time.time()
+
+    def reset(self):
+        """Forget the duration of past requests."""
+        with self._lock:
+            self._latency = 0.0
+            self._latency_time = time.time()
+
+
+class TokenBuckets(object):
+    """Rate limit of requests per key, allowing bursts.
+
+    Each key is given ``rate`` tokens per second, up to ``burst`` tokens.
+    Only the ``max_size`` most recently seen keys are remembered.
+
+    :param float rate: sustained requests per second.
+    :param int burst: maximum number of requests in a row.
+    :param int max_size: maximum number of keys remembered.
+    """
+
+    def __init__(self, rate, burst, max_size=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take a token for the key.
+
+        :returns: ``0`` if a token was available, otherwise the number of
+            seconds until the next one.
+        :rtype: float
+        """
+        now = time.time()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            while len(self._buckets) >= self.max_size:
+                self._buckets.popitem(last=False)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def clear(self):
+        """Forget every key."""
+        with self._lock:
+            self._buckets.clear()
+
+
+def admission_tween_factory(handler, registry):
+    """Pyramid tween shedding load when the process is overloaded, and
+    limiting the rate of requests per credentials.
+
+    Rejected requests get a ``503 Service Unavailable`` error, rate limited
+    ones a ``429 Too Many Requests`` error, both with a ``Retry-After``
+    header. Responses sent under pressure have a ``Backoff`` header.
+
+    The outcome is bound to the request summary (``admission``).
+    """
+    settings = registry.settings
+    retry_after = int(settings['cliquet.retry_after_seconds'])
+    max_batch_size = int(settings['readinglist.admission_max_batch_size'])
+    controller = AdmissionController(
+        max_inflight=int(settings['readinglist.admission_max_inflight']),
+        target_latency=float(
+            settings['readinglist.admission_target_latency']),
+        soft_limit=float(settings['readinglist.admission_soft_limit']),
+        probes=[pool_usage])
+
+    buckets = None
+    user_rate = float(settings['readinglist.admission_user_rate'])
+    if user_rate > 0:
+        buckets = TokenBuckets(
+            rate=user_rate,
+            burst=int(settings['readinglist.admission_user_burst']),
+            max_size=int(settings['readinglist.admission_user_max_size']))
+    registry.admission_controller = controller
+    registry.admission_buckets = buckets
+
+    def error(request, httpexception, errno, message, seconds):
+        response = errors.http_error(httpexception, errno=errno,
+                                     message=message)
+        response.headers['Retry-After'] = str(seconds)
+        return reapply_cors(request, response)
+
+    def admission_tween(request):
+        # Users are identified by their credentials, without verifying them.
+        authorization = request.headers.get('Authorization')
+        if buckets is not None and authorization:
+            key = hashlib.sha256(six.b(authorization)).hexdigest()
+            wait = buckets.take(key)
+            if wait > 0:
+                logger.bind(admission='rate_limited')
+                message = 'Too many requests, please retry later.'
+                return error(request, HTTPTooManyRequests(),
+                             errors.ERRORS.CLIENT_REACHED_CAPACITY, message,
+                             int(wait) + 1)
+
+        # Requests are classified only under pressure.
+        pressure = controller.pressure()
+        decision = controller.ADMIT
+        if pressure >= controller.soft_limit:
+            request_class = classify(request, max_batch_size)
+            decision = controller.decide(pressure, request_class)
+        if decision == controller.REJECT:
+            logger.bind(admission='rejected')
+            message = ('Service unavailable due to high load, '
+                       'please retry later.')
+            return error(request, HTTPServiceUnavailable(),
+                         errors.ERRORS.BACKEND, message, retry_after)
+
+        start = time.time()
+        controller.started()
+        try:
+            response = handler(request)
+        finally:
+            controller.finished(time.time() - start)
+
+        if decision == controller.BACKOFF:
+            logger.bind(admission='backoff')
+            if 'Backoff' not in response.headers:
+                response.headers['Backoff'] = str(retry_after)
+        return response
+
+    return admission_tween
@@ -0,0 +1,278 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+import six
+from pyramid import authentication as base_auth
+from pyramid import httpexceptions
+from pyramid.settings import asbool
+
+from cliquet import authentication as cliquet_auth
+from cliquet import errors, logger, statsd, utils
+
+
+class TokenVerificationError(Exception):
+    """Raised when the OAuth server could not verify a token."""
+
+
+class Flight(object):
+    """Verification of a token in progress, awaited by concurrent requests
+    presenting the same token."""
+
+    def __init__(self, event):
+        self.event = event
+        self.userid = None
+        self.error = None
+
+
+class TokenVerifier(object):
+    """Verify FxA OAuth tokens against the OAuth server, and remember the
+    outcome.
+
+    Valid tokens are remembered during ``ttl`` seconds, or until they
+    expire if earlier. Invalid tokens are remembered during ``negative_ttl``
+    seconds. Concurrent verifications of the same token are performed only
+    once.
+
+    :param str oauth_uri: URL of the FxA OAuth server.
+    :param str scope: scope the tokens must have been granted.
+    :param float ttl: expiration of valid tokens, in seconds.
+    :param float negative_ttl: expiration of invalid tokens, in seconds.
+    :param int max_size: maximum number of tokens remembered.
+    :param float timeout: timeout of requests to the OAuth server, in seconds.
+    :param bool gevent_enabled: wait for concurrent verifications with
+        *gevent* primitives.
+    :param statsd: optional :class:`cliquet.statsd.Client`, counting the
+        cache hits and misses.
+
+    Verifications answered from the cache are counted as hits, those
+    requesting the OAuth server as misses. Verifications awaiting a
+    concurrent one are counted apart (``coalesced``).
+    """
+
+    def __init__(self, oauth_uri, scope, ttl, negative_ttl, max_size,
+                 timeout=5, gevent_enabled=False, statsd=None):
+        oauth_uri = oauth_uri.rstrip('/')
+        if not oauth_uri.endswith('/v1'):
+            oauth_uri += '/v1'
+        self.verify_url = oauth_uri + '/verify'
+        self.scope = scope
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.timeout = timeout
+        self.gevent_enabled = gevent_enabled
+        self.statsd = statsd
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        """Proportion of verifications answered from the cache."""
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    def _count(self, key):
+        if self.statsd is not None:
+            self.statsd.count('authentication.fxa.%s' % key)
+
+    def _new_event(self):
+        if self.gevent_enabled:
+            import gevent.event
+            return gevent.event.Event()
+        return threading.Event()
+
+    def _remember(self, key, userid, ttl):
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+            self._entries[key] = (time.time() + ttl, userid)
+
+    def clear(self):
+        """Forget every verified token, and the number of hits and misses.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.coalesced = 0
+
+    def _has_scope(self, scopes):
+        return any([s == self.scope or s.startswith(self.scope + ':')
+                    for s in scopes])
+
+    def _fetch(self, token):
+        """Ask the OAuth server, and return the user id with the
+        expiration of the outcome, in seconds.
+        """
+        try:
+            resp = requests.post(self.verify_url, json={'token': token},
+                                 timeout=self.timeout)
+        except requests.RequestException as e:
+            raise TokenVerificationError(e)
+
+        if resp.status_code == 400:
+            return None, self.negative_ttl
+        if resp.status_code != 200:
+            raise TokenVerificationError('OAuth server replied with %s' %
+                                         resp.status_code)
+
+        try:
+            body = resp.json()
+            userid = body['user']
+            scopes = body.get('scope') or []
+        except (KeyError, TypeError, ValueError):
+            raise TokenVerificationError('Invalid OAuth server response')
+
+        if not self._has_scope(scopes):
+            return None, self.negative_ttl
+
+        ttl = self.ttl
+        expires = body.get('exp')
+        if expires is not None:
+            try:
+                ttl = min(ttl, float(expires) - time.time())
+            except (TypeError, ValueError):
+                raise TokenVerificationError('Invalid OAuth server response')
+        return userid, ttl
+
+    def verify(self, token):
+        """Return the FxA user id of the token, or ``None`` if it is
+        invalid.
+
+        :raises TokenVerificationError: if the OAuth server could not be
+            reached.
+        """
+        key = hashlib.sha256(six.b(token)).hexdigest()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self.hits += 1
+                self._count('cache_hit')
+                return entry[1]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight(self._new_event())
+                self.misses += 1
+                self._count('cache_miss')
+            else:
+                self.coalesced += 1
+                self._count('cache_coalesced')
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.userid
+
+        try:
+            flight.userid, ttl = self._fetch(token)
+            if ttl > 0:
+                self._remember(key, flight.userid, ttl)
+            return flight.userid
+        except Exception as e:
+            # Concurrent verifications fail the same way.
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+
+class FxAAuthenticationPolicy(base_auth.CallbackAuthenticationPolicy):
+    """FxA OAuth Bearer tokens authentication, relying on the
+    :class:`TokenVerifier` of the application (``registry.token_verifier``).
+
+    Enabled in ``multiauth.policies`` with the name ``fxa``.
+    """
+    callback = None
+
+    def __init__(self, realm='Realm'):
+        self.realm = realm
+
+    def unauthenticated_userid(self, request):
+        verifier = getattr(request.registry, 'token_verifier', None)
+        authorization = request.headers.get('Authorization', '')
+        try:
+            authmeth, token = authorization.split(' ', 1)
+        except ValueError:
+            return None
+        if verifier is None or authmeth.lower() != 'bearer':
+            return None
+
+        try:
+            return verifier.verify(token.strip())
+        except TokenVerificationError as e:
+            logger.error(e)
+            message = 'Authentication could not be verified.'
+            raise errors.http_error(httpexceptions.HTTPServiceUnavailable(),
+                                    errno=errors.ERRORS.BACKEND,
+                                    message=message)
+
+    def remember(self, request, principal, **kw):
+        return []
+
+    def forget(self, request):
+        return [('WWW-Authenticate', 'Bearer realm="%s"' % self.realm)]
+
+
+class BasicAuthAuthenticationPolicy(
+        cliquet_auth.BasicAuthAuthenticationPolicy):
+    """*cliquet* Basic Auth, deriving the user id once per request.
+
+    User ids are not remembered across requests, so that no credentials
+    are kept in memory.
+    """
+
+    def unauthenticated_userid(self, request):
+        try:
+            return request._basicauth_userid
+        except AttributeError:
+            pass
+
+        userid = None
+        credentials = self._get_credentials(request)
+        if credentials and credentials[0]:
+            settings = request.registry.settings
+            hmac_secret = settings['cliquet.userid_hmac_secret']
+            userid = utils.hmac_digest(hmac_secret, '%s:%s' % credentials)
+
+        request._basicauth_userid = userid
+        return userid
+
+    def callback(self, userid, request):
+        # Any credentials are accepted, and give no additional principals.
+        return []
+
+
+def load_from_config(config):
+    settings = config.get_settings()
+
+    oauth_uri = settings.get('fxa-oauth.oauth_uri')
+    if not oauth_uri:
+        return None
+
+    client = None
+    if settings.get('cliquet.statsd_url'):
+        client = statsd.load_from_config(config)
+
+    return TokenVerifier(
+        oauth_uri=oauth_uri,
+        scope=settings['fxa-oauth.scope'],
+        ttl=float(settings['fxa-oauth.cache_ttl_seconds']),
+        negative_ttl=float(settings['fxa-oauth.cache_negative_ttl_seconds']),
+        max_size=int(settings['fxa-oauth.cache_max_size']),
+        timeout=float(settings['fxa-oauth.requests_timeout_seconds']),
+        gevent_enabled=asbool(settings.get('readinglist.gevent_enabled')),
+        statsd=client)
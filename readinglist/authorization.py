@@ -0,0 +1,22 @@
+from pyramid.interfaces import IAuthorizationPolicy
+from pyramid.security import Authenticated
+from zope.interface import implementer
+
+from cliquet.authorization import PRIVATE
+
+
+@implementer(IAuthorizationPolicy)
+class OwnerOnlyAuthorizationPolicy(object):
+    """Authorization policy of owner-only collections.
+
+    Articles are stored per user, hence views only require users to be
+    authenticated (``private`` permission). Access is decided from the
+    authenticated user id alone: the permission backend is never queried,
+    and any other permission is refused.
+    """
+
+    def permits(self, context, principals, permission):
+        return permission == PRIVATE and Authenticated in principals
+
+    def principals_allowed_by_permission(self, context, permission):
+        raise NotImplementedError()  # PRAGMA NOCOVER
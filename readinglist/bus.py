@@ -0,0 +1,254 @@
+import os
+import re
+import select
+import threading
+import time
+
+from cliquet import logger
+from cliquet.utils import psycopg2
+
+from readinglist.storage.postgresql import connection_kwargs
+
+
+CHANNEL_REGEXP = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+class Bus(object):
+    """Base class of message buses: messages published on a channel are
+    delivered to the subscribers of every process of the application.
+
+    Delivery is best effort: messages published while a process is
+    disconnected are lost for this process.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def connection_id(self):
+        """Identifier of the current connection, which changes on each
+        reconnection, or ``None`` if messages published by other processes
+        are not received.
+
+        Messages may have been lost between two connections.
+        """
+        return 0
+
+    @property
+    def connected(self):
+        """Whether messages published by other processes are received."""
+        return self.connection_id is not None
+
+    def subscribe(self, channel, callback):
+        """Call ``callback(message)`` for each message of the channel.
+
+        :param str channel: lowercase letters, digits and underscores.
+        :param callback: called from the thread receiving messages.
+        """
+        if not CHANNEL_REGEXP.match(channel):
+            raise ValueError('Invalid channel name %r' % channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def publish(self, channel, message):
+        """Deliver the message to the subscribers of the channel.
+
+        :param str channel: the channel name.
+        :param str message: the message, at most 8000 bytes.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Stop receiving messages."""
+        pass
+
+    def _dispatch(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, []))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.exception(e)
+
+
+class LocalBus(Bus):
+    """Stand-in delivering messages within the current process only,
+    suitable for development or single process deployments.
+    """
+
+    def publish(self, channel, message):
+        self._dispatch(channel, message)
+
+
+class PostgreSQLBus(Bus):
+    """Bus relying on PostgreSQL ``LISTEN`` and ``NOTIFY``.
+
+    Each process receives messages on a dedicated connection, from a
+    background thread started on first use, and again in forked processes.
+    If the connection is lost, it is opened again every ``reconnect_interval``
+    seconds, and :attr:`connection_id` is ``None`` meanwhile.
+
+    Messages are published from another background thread: those published
+    meanwhile are sent together, in a single round trip. They are also
+    delivered to the subscribers of the publishing process.
+
+    :param float reconnect_interval: seconds between two connection attempts.
+    :param float poll_interval: seconds between two checks of
+        :meth:`close`, while waiting for messages.
+    :param int batch_size: maximum number of messages sent at once.
+    :param conn_kwargs: ``psycopg2`` connection parameters.
+    """
+
+    def __init__(self, reconnect_interval=1, poll_interval=1, batch_size=100,
+                 **conn_kwargs):
+        super(PostgreSQLBus, self).__init__()
+        self.reconnect_interval = reconnect_interval
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._conn_kwargs = conn_kwargs
+        self._listener = None
+        self._connections = 0
+        self._pending = []
+        self._pending_changed = threading.Condition(threading.Lock())
+        self._pid = None
+        self._closed = False
+
+    @property
+    def connection_id(self):
+        self._ensure_threads()
+        with self._lock:
+            return self._connections if self._listener is not None else None
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._conn_kwargs)
+        conn.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _ensure_threads(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid != pid:
+                self._start_threads(pid)
+
+    def _start_threads(self, pid):
+        # Connections and messages of the parent process are left aside
+        # after a fork.
+        self._listener = None
+        self._pending = []
+        self._pid = pid
+        for target in (self._listen, self._publish):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def subscribe(self, channel, callback):
+        super(PostgreSQLBus, self).subscribe(channel, callback)
+        self._ensure_threads()
+        # Channels are listened on connection, or now if already connected.
+        with self._lock:
+            if self._listener is None:
+                return
+            try:
+                self._listener.cursor().execute('LISTEN "%s";' % channel)
+            except psycopg2.Error as e:
+                logger.error(e)
+
+    def publish(self, channel, message):
+        self._ensure_threads()
+        with self._pending_changed:
+            self._pending.append((channel, message))
+            self._pending_changed.notify()
+
+    def close(self):
+        self._closed = True
+        with self._pending_changed:
+            self._pending_changed.notify()
+
+    def _listen(self):
+        pid = os.getpid()
+        while not self._closed and self._pid == pid:
+            conn = None
+            try:
+                conn = self._connect()
+                with self._lock:
+                    cursor = conn.cursor()
+                    for channel in self._subscribers:
+                        cursor.execute('LISTEN "%s";' % channel)
+                    self._listener = conn
+                    self._connections += 1
+                self._receive(conn)
+            except (psycopg2.Error, select.error) as e:
+                logger.error(e)
+            finally:
+                self._listener = None
+                if conn is not None:
+                    conn.close()
+            if not self._closed:
+                time.sleep(self.reconnect_interval)
+
+    def _receive(self, conn):
+        while not self._closed:
+            ready, _, _ = select.select([conn], [], [], self.poll_interval)
+            if not ready:
+                continue
+            with self._lock:
+                conn.poll()
+                notifies = list(conn.notifies)
+                del conn.notifies[:]
+            for notify in notifies:
+                self._dispatch(notify.channel, notify.payload)
+
+    def _next_batch(self):
+        with self._pending_changed:
+            while not self._pending and not self._closed:
+                self._pending_changed.wait(self.poll_interval)
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+        return batch
+
+    def _publish(self):
+        pid = os.getpid()
+        conn = None
+        while not self._closed and self._pid == pid:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            notifications = ', '.join(['pg_notify(%s, %s)'] * len(batch))
+            params = [param for notification in batch
+                      for param in notification]
+            try:
+                if conn is None:
+                    conn = self._connect()
+                conn.cursor().execute('SELECT %s;' % notifications, params)
+            except psycopg2.Error as e:
+                logger.error(e)
+                # Messages are lost, and the connection is opened again.
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+def load_from_config(config):
+    """Return the bus of the application, created on first call."""
+    bus = getattr(config.registry, 'bus', None)
+    if bus is not None:
+        return bus
+
+    settings = config.get_settings()
+    url = settings['readinglist.bus_url']
+    if url:
+        interval = float(settings['readinglist.bus_reconnect_interval'])
+        bus = PostgreSQLBus(reconnect_interval=interval,
+                            **connection_kwargs(url))
+    else:
+        bus = LocalBus()
+
+    config.registry.bus = bus
+    return bus
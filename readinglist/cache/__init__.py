@@ -0,0 +1,66 @@
+"""Cache backends specific to *Reading List*.
+
+They implement the :class:`cliquet.cache.CacheBase` interface, and can
+be enabled using the ``cliquet.cache_backend`` setting.
+"""
+from cliquet.cache import postgresql as postgresql_cache
+from cliquet.cache import redis as redis_cache
+from cliquet.storage.redis import wrap_redis_error
+from cliquet.utils import json
+
+from readinglist.cache import layered
+
+
+def add(cache, key, value, ttl):
+    """Store the value unless the key already exists, and return whether it
+    was stored.
+
+    This is atomic with the *cliquet* PostgreSQL and Redis backends, and with
+    the layered backend in front of them. With other backends, the key is
+    read first, which is only safe within a process.
+
+    :param cache: :class:`cliquet.cache.CacheBase` instance.
+    :param float ttl: expiration of the value, in seconds.
+    :rtype: bool
+    """
+    if isinstance(cache, layered.Layered):
+        added = add(cache.shared, key, value, ttl)
+        if added:
+            cache._invalidate(key)
+        return added
+
+    if isinstance(cache, postgresql_cache.PostgreSQL):
+        return _add_postgresql(cache, key, value, ttl)
+
+    if isinstance(cache, redis_cache.Redis):
+        return _add_redis(cache, key, value, ttl)
+
+    if cache.get(key) is not None:
+        return False
+    cache.set(key, value, ttl)
+    return True
+
+
+def _add_postgresql(cache, key, value, ttl):
+    # Concurrent additions of the same key wait for each other.
+    query = """
+    SELECT pg_advisory_xact_lock(hashtext(%(key)s));
+
+    DELETE FROM cache
+     WHERE key = %(key)s
+       AND ttl IS NOT NULL AND now() > ttl;
+
+    INSERT INTO cache (key, value, ttl)
+    SELECT %(key)s, %(value)s, sec2ttl(%(ttl)s)
+     WHERE NOT EXISTS (SELECT key FROM cache WHERE key = %(key)s);
+    """
+    with cache.connect() as cursor:
+        cursor.execute(query, dict(key=key, value=json.dumps(value), ttl=ttl))
+        return cursor.rowcount > 0
+
+
+@wrap_redis_error
+def _add_redis(cache, key, value, ttl):
+    added = cache._client.set(key, json.dumps(value),
+                              px=int(ttl * 1000), nx=True)
+    return bool(added)
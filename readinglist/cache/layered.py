@@ -0,0 +1,163 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from cliquet import statsd
+from cliquet.cache import CacheBase
+from cliquet.utils import json
+
+from readinglist import bus as bus_module
+
+
+INVALIDATION_CHANNEL = 'readinglist_cache'
+
+
+class Layered(CacheBase):
+    """Cache backend keeping recently used values in memory, in front of a
+    shared backend.
+
+    Enable in configuration::
+
+        cliquet.cache_backend = readinglist.cache.layered
+        readinglist.cache_shared_backend = cliquet.cache.postgresql
+
+    Writes go through to the shared backend, and are announced on the
+    application bus (``readinglist.bus_url``), so that other processes evict
+    their copy. Values read from the shared backend are kept in memory at most
+    ``ttl`` seconds, which bounds staleness if announcements are lost, or
+    if the value expires in the shared backend.
+
+    :param shared: the shared :class:`cliquet.cache.CacheBase` backend.
+    :param bus: the :class:`readinglist.bus.Bus` of the application.
+    :param int max_size: maximum number of values kept in memory.
+    :param float ttl: seconds during which values are kept in memory.
+    :param statsd: optional :class:`cliquet.statsd.Client`, counting the
+        hits and misses of each tier.
+    """
+
+    def __init__(self, shared, bus, max_size, ttl, statsd=None):
+        self.shared = shared
+        self.bus = bus
+        self.max_size = max_size
+        self.ttl_seconds = ttl
+        self.statsd = statsd
+        self.origin = uuid.uuid4().hex
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._stats = {'local': {'hits': 0, 'misses': 0},
+                       'shared': {'hits': 0, 'misses': 0}}
+        self._lock = threading.Lock()
+        bus.subscribe(INVALIDATION_CHANNEL, self._on_invalidation)
+
+    @property
+    def stats(self):
+        """Number of hits and misses of each tier, in this process.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return dict([(tier, dict(counts))
+                         for tier, counts in self._stats.items()])
+
+    def _count(self, tier, hit):
+        # Called with the lock held.
+        self._stats[tier]['hits' if hit else 'misses'] += 1
+        if self.statsd is not None:
+            outcome = 'hit' if hit else 'miss'
+            self.statsd.count('cache.%s.%s' % (tier, outcome))
+
+    #
+    # Local tier
+    #
+
+    def _store(self, key, value, ttl=None):
+        ttl = self.ttl_seconds if ttl is None else min(ttl, self.ttl_seconds)
+        # Called with the lock held.
+        self._entries.pop(key, None)
+        while len(self._entries) >= self.max_size:
+            self._entries.popitem(last=False)
+        self._entries[key] = (time.time() + ttl, value)
+
+    def _evict(self, key=None):
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _invalidate(self, key=None):
+        self._evict(key)
+        message = json.dumps({'origin': self.origin, 'key': key})
+        self.bus.publish(INVALIDATION_CHANNEL, message)
+
+    def _on_invalidation(self, message):
+        message = json.loads(message)
+        if message['origin'] != self.origin:
+            self._evict(message['key'])
+
+    #
+    # Cache API
+    #
+
+    def initialize_schema(self):
+        self.shared.initialize_schema()
+
+    def flush(self):
+        self.shared.flush()
+        self._invalidate()
+
+    def ttl(self, key):
+        return self.shared.ttl(key)
+
+    def expire(self, key, ttl):
+        self.shared.expire(key, ttl)
+        self._invalidate(key)
+
+    def set(self, key, value, ttl=None):
+        self.shared.set(key, value, ttl)
+        self._invalidate(key)
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                # Mark as recently used.
+                self._entries[key] = self._entries.pop(key)
+                self._count('local', True)
+                return entry[1]
+            self._count('local', False)
+            generation = self._generation
+
+        value = self.shared.get(key)
+
+        with self._lock:
+            self._count('shared', value is not None)
+            # Values invalidated while being read are not kept.
+            if value is not None and generation == self._generation:
+                self._store(key, value)
+        return value
+
+    def delete(self, key):
+        self.shared.delete(key)
+        self._invalidate(key)
+
+
+def load_from_config(config):
+    settings = config.get_settings()
+
+    shared_backend = config.maybe_dotted(
+        settings['readinglist.cache_shared_backend'])
+    shared = shared_backend.load_from_config(config)
+
+    client = None
+    if settings.get('cliquet.statsd_url'):
+        client = statsd.load_from_config(config)
+
+    return Layered(shared, bus_module.load_from_config(config),
+                   max_size=int(settings['readinglist.cache_local_max_size']),
+                   ttl=float(settings['readinglist.cache_local_ttl']),
+                   statsd=client)
@@ -0,0 +1,139 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+from pyramid.httpexceptions import (HTTPBadRequest,
+                                    HTTPRequestEntityTooLarge)
+
+from cliquet import errors
+from cliquet.utils import reapply_cors
+
+from readinglist.serialization import (COLUMNAR_CONTENT_TYPE,
+                                       MSGPACK_CONTENT_TYPE)
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain',
+                      COLUMNAR_CONTENT_TYPE, MSGPACK_CONTENT_TYPE)
+
+
+def gzip_compress(data, level):
+    """Compress data with gzip.
+
+    :param bytes data: data to compress.
+    :param int level: compression level, between 1 and 9.
+    :rtype: bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_decompress(data, max_size):
+    """Decompress gzip data.
+
+    :param bytes data: data to decompress.
+    :param int max_size: maximum size of decompressed data.
+    :raises ValueError: if data is not valid gzip.
+    :raises OverflowError: if decompressed data is larger than `max_size`.
+    :rtype: bytes
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        decompressed = decompressor.decompress(data, max_size)
+    except zlib.error as e:
+        raise ValueError('Invalid gzip data (%s)' % e)
+    if decompressor.unconsumed_tail:
+        raise OverflowError('Decompressed data larger than %s' % max_size)
+    return decompressed
+
+
+def compression_tween_factory(handler, registry):
+    """Pyramid tween compressing responses according to the
+    ``Accept-Encoding`` request header, and decompressing gzip request
+    bodies.
+
+    Responses of the articles lists cache are compressed once, and kept in
+    the response cache (see :mod:`readinglist.response_cache`).
+    """
+    settings = registry.settings
+    min_size = int(settings['readinglist.compression_min_size'])
+    gzip_level = int(settings['readinglist.compression_gzip_level'])
+    brotli_quality = int(settings['readinglist.compression_brotli_quality'])
+    max_request_size = int(
+        settings['readinglist.compression_max_request_size'])
+
+    compressors = {
+        'gzip': lambda body: gzip_compress(body, gzip_level)
+    }
+    offers = ['gzip']
+    if brotli is not None:
+        compressors['br'] = lambda body: brotli.compress(
+            body, quality=brotli_quality)
+        offers.insert(0, 'br')
+
+    def decompress_request(request):
+        encoding = request.headers.get('Content-Encoding', '').lower()
+        if encoding != 'gzip':
+            return
+
+        try:
+            body = gzip_decompress(request.body, max_request_size)
+        except OverflowError as e:
+            return errors.http_error(HTTPRequestEntityTooLarge(),
+                                     errno=errors.ERRORS.REQUEST_TOO_LARGE,
+                                     message=str(e))
+        except ValueError as e:
+            return errors.http_error(HTTPBadRequest(),
+                                     errno=errors.ERRORS.INVALID_POSTED_DATA,
+                                     message=str(e))
+        del request.headers['Content-Encoding']
+        request.body = body
+
+    def compress_response(request, response):
+        if response.content_type not in COMPRESSIBLE_TYPES:
+            return
+        if response.content_encoding is not None:
+            return
+        vary = tuple(response.vary or ())
+        if 'Accept-Encoding' not in vary:
+            response.vary = vary + ('Accept-Encoding',)
+
+        # Streamed responses have no length, and are left untouched.
+        length = response.content_length
+        if response.status_code != 200 or length is None or length < min_size:
+            return
+
+        # Clients not sending the header are not given compressed bodies.
+        if 'Accept-Encoding' not in request.headers:
+            return
+        encoding = request.accept_encoding.best_match(offers)
+        if encoding is None:
+            return
+
+        response_cache = getattr(registry, 'response_cache', None)
+        cache_key = getattr(request, 'response_cache_key', None)
+        if response_cache is None or cache_key is None:
+            body = compressors[encoding](response.body)
+        else:
+            cache_key = '%s:%s:%s' % (cache_key, response.content_type,
+                                      encoding)
+            body = response_cache.get_bytes(cache_key)
+            if body is None:
+                body = compressors[encoding](response.body)
+                response_cache.set_bytes(cache_key, body)
+
+        response.body = body
+        response.content_encoding = encoding
+
+    def compression_tween(request):
+        error = decompress_request(request)
+        if error is not None:
+            return reapply_cors(request, error)
+
+        response = handler(request)
+        compress_response(request, response)
+        return response
+
+    return compression_tween
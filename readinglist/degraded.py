@@ -0,0 +1,282 @@
+import hashlib
+import threading
+import time
+import types
+
+from pyramid.httpexceptions import HTTPException, HTTPNotModified
+from pyramid.response import Response
+from pyramid.settings import asbool
+
+from cliquet import logger
+from cliquet.storage.exceptions import BackendError
+from cliquet.utils import json, psycopg2
+
+from readinglist.response_cache import ResponseCache
+
+
+SNAPSHOT_KEY_PREFIX = 'snapshot:'
+SNAPSHOT_HEADERS = ('ETag', 'Last-Modified', 'Total-Records', 'Next-Page')
+SNAPSHOT_PATH_SUFFIX = '/articles'
+
+# Errors meaning that the storage cannot be reached.
+UNAVAILABLE_ERRORS = ()
+if psycopg2 is not None:
+    UNAVAILABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the storage while the circuit is open."""
+
+
+class CircuitBreaker(object):
+    """Stop calling the storage after ``failure_threshold`` consecutive
+    failures, during ``reset_timeout`` seconds.
+
+    The circuit is then half-open: one call at a time is allowed as a probe,
+    and closes the circuit if it succeeds, or opens it again otherwise. A
+    probe without outcome (e.g. interrupted) is released, and is given up
+    after ``reset_timeout`` seconds anyway.
+
+    :param int failure_threshold: consecutive failures opening the circuit.
+    :param float reset_timeout: seconds before probing the storage again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.time() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """Return ``True`` if the storage can be called."""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN:
+                now = time.time()
+                if not self._probing or \
+                        now - self._probe_started_at >= self.reset_timeout:
+                    self._probing = True
+                    self._probe_started_at = now
+                    return True
+            return False
+
+    def reset(self):
+        """Close the circuit, and forget the failures."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def release(self):
+        """Allow another probe, if the current one ended without outcome."""
+        with self._lock:
+            self._probing = False
+
+    def succeeded(self):
+        if self.failures == 0 and self.opened_at is None:
+            return
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info('Storage circuit closed')
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.opened_at is not None or \
+                    self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning('Storage circuit opened',
+                                   failures=self.failures)
+                self.opened_at = time.time()
+
+
+class BreakerStorage(object):
+    """Storage wrapper failing fast while the :class:`CircuitBreaker` is
+    open, with a :class:`cliquet.storage.exceptions.BackendError`.
+
+    Only errors reaching the storage (e.g. connection failures) count as
+    failures. Health checks (``ping``) always reach the storage. The outcome
+    of methods returning generators (e.g. ``iter_records``) is recorded while
+    they are consumed.
+
+    :param storage: the storage backend.
+    :param breaker: the :class:`CircuitBreaker` of the application.
+    """
+
+    PASSTHROUGH = ('ping', 'connect')
+
+    def __init__(self, storage, breaker):
+        self.storage = storage
+        self.breaker = breaker
+
+    def __getattr__(self, name):
+        attribute = getattr(self.storage, name)
+        if name in self.PASSTHROUGH or not callable(attribute):
+            return attribute
+
+        def guarded(*args, **kwargs):
+            if not self.breaker.allow():
+                error = CircuitOpenError('Storage is unavailable')
+                raise BackendError(original=error)
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception as e:
+                self._record_error(e)
+                raise
+            except BaseException:
+                # Interrupted (e.g. timeout).
+                self.breaker.release()
+                raise
+            if isinstance(result, types.GeneratorType):
+                # The storage is only reached once it is consumed.
+                return self._consume(result)
+            self.breaker.succeeded()
+            return result
+
+        return guarded
+
+    def _record_error(self, error):
+        if isinstance(error, BackendError) and \
+                isinstance(error.original, UNAVAILABLE_ERRORS):
+            self.breaker.failed()
+        else:
+            # Storage was reached (e.g. record not found).
+            self.breaker.succeeded()
+
+    def _consume(self, generator):
+        try:
+            while True:
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    self.breaker.succeeded()
+                    return
+                except Exception as e:
+                    self._record_error(e)
+                    raise
+                yield item
+        finally:
+            # Closed early (e.g. client disconnected) or interrupted.
+            self.breaker.release()
+
+
+def snapshot_key(request, userid):
+    """Return the snapshot key of an articles list, for the authenticated
+    user and the query of the request.
+
+    :rtype: str
+    """
+    querystring = json.dumps(sorted(request.GET.items()))
+    parts = [userid, request.host_url, request.path, querystring]
+    unique = u'\n'.join([u'%s' % part for part in parts])
+    digest = hashlib.sha256(unique.encode('utf-8')).hexdigest()
+    return SNAPSHOT_KEY_PREFIX + digest
+
+
+def degraded_tween_factory(handler, registry):
+    """Pyramid tween answering the articles lists from snapshots of their
+    last responses while the storage circuit is open.
+
+    Snapshots are kept in the memory of each process, and served during
+    ``readinglist.degraded_snapshot_ttl`` seconds at most, with ``Age`` and
+    ``Warning`` headers, to the user they were taken for, once
+    authenticated. Other requests fail fast with a ``503`` error.
+    """
+    settings = registry.settings
+    breaker = registry.storage.breaker
+    snapshot_ttl = float(settings['readinglist.degraded_snapshot_ttl'])
+    snapshots = ResponseCache(
+        max_size=int(settings['readinglist.degraded_snapshot_max_size']),
+        max_entry_size=int(
+            settings['readinglist.degraded_snapshot_max_entry_size']))
+    registry.degraded_snapshots = snapshots
+
+    def is_snapshotable(request):
+        return (request.method == 'GET' and
+                'Authorization' in request.headers and
+                request.path.rstrip('/').endswith(SNAPSHOT_PATH_SUFFIX))
+
+    def from_snapshot(request, snapshot):
+        age = int(time.time() - snapshot['time'])
+        headers = [(str(name), str(value))
+                   for name, value in snapshot['headers'].items()]
+        etag = snapshot['headers'].get('ETag', '').strip('"')
+        if etag and etag in request.if_none_match:
+            response = HTTPNotModified(headers=headers)
+        else:
+            response = Response(status=200, headerlist=headers)
+            response.content_type = 'application/json'
+            response.body = snapshot['body'].encode('utf-8')
+        response.headers['Age'] = str(age)
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        logger.bind(degraded='snapshot')
+        return response
+
+    def degraded_tween(request):
+        if not is_snapshotable(request):
+            return handler(request)
+
+        # Credentials are verified, so that revoked ones get no snapshot.
+        try:
+            userid = request.authenticated_userid
+        except HTTPException:
+            userid = None
+        if userid is None:
+            return handler(request)
+
+        key = snapshot_key(request, userid)
+        if breaker.state != breaker.CLOSED:
+            snapshot = snapshots.get(key)
+            if snapshot is not None and \
+                    time.time() - snapshot['time'] < snapshot_ttl:
+                return from_snapshot(request, snapshot)
+
+        response = handler(request)
+        if response.status_code == 200 and \
+                response.content_type == 'application/json':
+            headers = dict([(h, response.headers[h]) for h in SNAPSHOT_HEADERS
+                            if h in response.headers])
+            snapshots.set(key, {'time': time.time(),
+                                'headers': headers,
+                                'body': response.body.decode('utf-8')})
+        return response
+
+    return degraded_tween
+
+
+def load_from_config(config):
+    """Wrap the storage backend of the application with a circuit breaker,
+    if degraded mode is enabled.
+    """
+    settings = config.get_settings()
+    storage = config.registry.storage
+
+    if not asbool(settings['readinglist.degraded_enabled']):
+        return storage
+
+    breaker = CircuitBreaker(
+        failure_threshold=int(
+            settings['readinglist.degraded_failure_threshold']),
+        reset_timeout=float(settings['readinglist.degraded_reset_timeout']))
+    return BreakerStorage(storage, breaker)
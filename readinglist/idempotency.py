@@ -0,0 +1,177 @@
+import hashlib
+import threading
+
+from pyramid.httpexceptions import (HTTPBadRequest, HTTPConflict,
+                                    HTTPUnprocessableEntity)
+from pyramid.response import Response
+from pyramid.settings import asbool
+
+from cliquet import errors, logger
+
+from readinglist import cache as cache_module
+
+
+KEY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _digest(*parts):
+    hashed = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8')
+        hashed.update(part + b'\0')
+    return hashed.hexdigest()
+
+
+class IdempotentRequests(object):
+    """Remember the responses of ``POST`` requests carrying an
+    ``Idempotency-Key`` header, and send them again when the requests are
+    retried with the same key and credentials.
+
+    Successful JSON responses are kept in the cache backend during ``ttl``
+    seconds. Errors are not kept, and retried requests are processed again.
+
+    Concurrent requests with the same key are processed once in each
+    process: the others wait for the first one. In other processes, they
+    are rejected until the first one completes, or during ``pending_ttl``
+    seconds at most. The first one is elected atomically with the
+    PostgreSQL and Redis cache backends (see :func:`readinglist.cache.add`).
+
+    :param cache: :class:`cliquet.cache.CacheBase` instance.
+    :param float ttl: expiration of responses, in seconds.
+    :param float pending_ttl: maximum duration of requests, in seconds.
+    :param bool gevent_enabled: wait for concurrent requests with *gevent*
+        primitives.
+    """
+
+    def __init__(self, cache, ttl, pending_ttl=60, gevent_enabled=False):
+        self.cache = cache
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.gevent_enabled = gevent_enabled
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _new_event(self):
+        if self.gevent_enabled:
+            import gevent.event
+            return gevent.event.Event()
+        return threading.Event()
+
+    def process(self, request, handler, idempotency_key):
+        """Return the response of the request, obtained from the handler
+        unless already known.
+
+        Credentials are part of the key, hence responses are never sent to
+        other users.
+        """
+        authorization = request.headers.get('Authorization', '')
+        key = 'idempotency:%s' % _digest(authorization, idempotency_key)
+
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = self._new_event()
+                    break
+            flight.wait()
+
+        try:
+            return self._process(request, handler, key)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.set()
+
+    def _process(self, request, handler, key):
+        fingerprint = _digest(request.method, request.path_qs, request.body)
+
+        # The request is marked as pending unless known, atomically across
+        # processes.
+        pending = {'fingerprint': fingerprint}
+        while not cache_module.add(self.cache, key, pending,
+                                   ttl=self.pending_ttl):
+            entry = self.cache.get(key)
+            if entry is None:
+                # Expired or deleted meanwhile.
+                continue
+            if entry['fingerprint'] != fingerprint:
+                message = '%s was used for another request.' % KEY_HEADER
+                return errors.http_error(
+                    HTTPUnprocessableEntity(),
+                    errno=errors.ERRORS.INVALID_PARAMETERS,
+                    message=message)
+            if 'status' not in entry:
+                message = ('A request with the same %s is in progress.' %
+                           KEY_HEADER)
+                response = errors.http_error(
+                    HTTPConflict(),
+                    errno=errors.ERRORS.CONSTRAINT_VIOLATED,
+                    message=message)
+                response.headers['Retry-After'] = '1'
+                return response
+            logger.bind(idempotency='replayed')
+            return self._replay(entry)
+
+        try:
+            response = handler(request)
+        except Exception:
+            self.cache.delete(key)
+            raise
+
+        # Streamed responses have no length, and are not kept.
+        if (200 <= response.status_code < 300 and
+                response.content_type == 'application/json' and
+                response.content_length is not None):
+            headers = [[name, value] for name, value in response.headerlist
+                       if name.lower() != 'content-length']
+            entry = {'fingerprint': fingerprint,
+                     'status': response.status,
+                     'headers': headers,
+                     'body': response.body.decode('utf-8')}
+            self.cache.set(key, entry, ttl=self.ttl)
+        else:
+            self.cache.delete(key)
+        return response
+
+    def _replay(self, entry):
+        headers = [(str(name), str(value))
+                   for name, value in entry['headers']]
+        response = Response(status=str(entry['status']), headerlist=headers)
+        response.body = entry['body'].encode('utf-8')
+        response.headers[REPLAYED_HEADER] = 'true'
+        return response
+
+
+def idempotency_tween_factory(handler, registry):
+    """Pyramid tween answering retried ``POST`` requests with the response
+    of their first attempt, according to their ``Idempotency-Key`` header
+    (see :class:`IdempotentRequests`).
+    """
+    settings = registry.settings
+    requests = IdempotentRequests(
+        cache=registry.cache,
+        ttl=float(settings['readinglist.idempotency_ttl']),
+        pending_ttl=float(settings['readinglist.idempotency_pending_ttl']),
+        gevent_enabled=asbool(settings.get('readinglist.gevent_enabled')))
+
+    def idempotency_tween(request):
+        idempotency_key = request.headers.get(KEY_HEADER)
+        if request.method != 'POST' or idempotency_key is None:
+            return handler(request)
+        # Unauthenticated requests are rejected anyway.
+        if 'Authorization' not in request.headers:
+            return handler(request)
+
+        if not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+            message = '%s must have 1 to %s characters.' % (KEY_HEADER,
+                                                            MAX_KEY_LENGTH)
+            return errors.http_error(HTTPBadRequest(),
+                                     errno=errors.ERRORS.INVALID_PARAMETERS,
+                                     message=message)
+
+        return requests.process(request, handler, idempotency_key)
+
+    return idempotency_tween
@@ -0,0 +1,210 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from pyramid.settings import asbool
+
+from cliquet.storage import DEFAULT_MODIFIED_FIELD
+from cliquet.utils import json
+
+from readinglist import bus as bus_module
+
+
+CHANNEL = 'readinglist_collections'
+
+
+class CollectionTimestamps(object):
+    """Collection timestamps kept in memory, and evicted as soon as the
+    collections change in any process.
+
+    Changes are announced on the application bus as
+    ``(collection_id, parent_id, timestamp)`` events. Timestamps are kept
+    during ``ttl`` seconds at most. If the bus is disconnected, or was
+    disconnected since they were read, they are kept during ``fallback_ttl``
+    seconds only, since changes may have been missed.
+
+    :param bus: the :class:`readinglist.bus.Bus` of the application.
+    :param int max_size: maximum number of timestamps kept in memory.
+    :param float ttl: seconds during which timestamps are kept.
+    :param float fallback_ttl: seconds during which timestamps are kept,
+        while changes may be missed.
+    """
+
+    def __init__(self, bus, max_size, ttl, fallback_ttl):
+        self.bus = bus
+        self.max_size = max_size
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.origin = uuid.uuid4().hex
+        # Evicted timestamps are replaced by markers (``None`` timestamp),
+        # so that timestamps read before a change are not kept.
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        bus.subscribe(CHANNEL, self._on_message)
+
+    def _put(self, key, entry):
+        # Called with the lock held.
+        self._entries.pop(key, None)
+        while len(self._entries) >= self.max_size:
+            self._entries.popitem(last=False)
+        self._entries[key] = entry
+
+    def get(self, collection_id, parent_id):
+        """Return the timestamp of the collection, or ``None`` if unknown.
+
+        :rtype: int
+        """
+        connection_id = self.bus.connection_id
+        with self._lock:
+            entry = self._entries.get((collection_id, parent_id))
+        if entry is None:
+            return None
+
+        stored_on, stored_connection_id, timestamp = entry
+        ttl = self.ttl
+        if connection_id is None or stored_connection_id != connection_id:
+            ttl = self.fallback_ttl
+        if stored_on + ttl > time.time():
+            return timestamp
+
+    def set(self, collection_id, parent_id, timestamp, read_on):
+        """Remember the timestamp of the collection, unless it changed
+        since it was read.
+
+        :param int timestamp: the collection timestamp.
+        :param float read_on: time at which the reading started.
+        """
+        connection_id = self.bus.connection_id
+        key = (collection_id, parent_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is None and entry[0] >= read_on:
+                return
+            self._put(key, (time.time(), connection_id, timestamp))
+
+    def _evict(self, events):
+        now = time.time()
+        with self._lock:
+            for collection_id, parent_id, _ in events:
+                self._put((collection_id, parent_id), (now, None, None))
+
+    def changed(self, events):
+        """Evict the timestamps of changed collections, in every process.
+
+        :param list events: ``(collection_id, parent_id, timestamp)`` tuples,
+            where ``timestamp`` is the new collection timestamp if known.
+        """
+        if not events:
+            return
+        self._evict(events)
+        message = json.dumps({'origin': self.origin, 'events': events})
+        self.bus.publish(CHANNEL, message)
+
+    def _on_message(self, message):
+        message = json.loads(message)
+        if message['origin'] != self.origin:
+            self._evict(message['events'])
+
+    def clear(self):
+        """Forget every timestamp of this process."""
+        with self._lock:
+            self._entries.clear()
+
+
+class InvalidatingStorage(object):
+    """Storage wrapper reading collection timestamps from
+    :class:`CollectionTimestamps`, and announcing the changes of
+    collections.
+
+    :param storage: the storage backend.
+    :param timestamps: the :class:`CollectionTimestamps` of the application.
+    """
+
+    def __init__(self, storage, timestamps):
+        self.storage = storage
+        self.timestamps = timestamps
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def _changed(self, collection_id, parent_id, records,
+                 modified_field=DEFAULT_MODIFIED_FIELD):
+        timestamps = [r[modified_field] for r in records]
+        timestamp = max(timestamps) if timestamps else None
+        self.timestamps.changed([(collection_id, parent_id, timestamp)])
+
+    def flush(self, auth=None):
+        self.storage.flush(auth=auth)
+        self.timestamps.clear()
+
+    def collection_timestamp(self, collection_id, parent_id, auth=None):
+        timestamp = self.timestamps.get(collection_id, parent_id)
+        if timestamp is None:
+            read_on = time.time()
+            timestamp = self.storage.collection_timestamp(
+                collection_id, parent_id, auth=auth)
+            self.timestamps.set(collection_id, parent_id, timestamp,
+                                read_on=read_on)
+        return timestamp
+
+    def create(self, collection_id, parent_id, record, **kwargs):
+        record = self.storage.create(collection_id, parent_id, record,
+                                     **kwargs)
+        self._changed(collection_id, parent_id, [record],
+                      kwargs.get('modified_field', DEFAULT_MODIFIED_FIELD))
+        return record
+
+    def create_many(self, collection_id, parent_id, records, **kwargs):
+        results = self.storage.create_many(collection_id, parent_id, records,
+                                           **kwargs)
+        created = [record for record, is_created in results if is_created]
+        if created:
+            self._changed(collection_id, parent_id, created,
+                          kwargs.get('modified_field', DEFAULT_MODIFIED_FIELD))
+        return results
+
+    def update(self, collection_id, parent_id, object_id, record, **kwargs):
+        record = self.storage.update(collection_id, parent_id, object_id,
+                                     record, **kwargs)
+        self._changed(collection_id, parent_id, [record],
+                      kwargs.get('modified_field', DEFAULT_MODIFIED_FIELD))
+        return record
+
+    def delete(self, collection_id, parent_id, object_id, **kwargs):
+        deleted = self.storage.delete(collection_id, parent_id, object_id,
+                                      **kwargs)
+        self._changed(collection_id, parent_id, [deleted],
+                      kwargs.get('modified_field', DEFAULT_MODIFIED_FIELD))
+        return deleted
+
+    def delete_all(self, collection_id, parent_id, **kwargs):
+        deleted = self.storage.delete_all(collection_id, parent_id, **kwargs)
+        if deleted:
+            self._changed(collection_id, parent_id, deleted,
+                          kwargs.get('modified_field', DEFAULT_MODIFIED_FIELD))
+        return deleted
+
+    def purge(self, collection_id, parent_id):
+        purged = self.storage.purge(collection_id, parent_id)
+        self._changed(collection_id, parent_id, [])
+        return purged
+
+
+def load_from_config(config):
+    """Wrap the storage backend of the application, if the collection
+    timestamps cache is enabled.
+    """
+    settings = config.get_settings()
+    storage = config.registry.storage
+
+    if not asbool(settings['readinglist.timestamps_cache_enabled']):
+        return storage
+
+    timestamps = CollectionTimestamps(
+        bus_module.load_from_config(config),
+        max_size=int(settings['readinglist.timestamps_cache_max_size']),
+        ttl=float(settings['readinglist.timestamps_cache_ttl']),
+        fallback_ttl=float(
+            settings['readinglist.timestamps_cache_fallback_ttl']))
+    return InvalidatingStorage(storage, timestamps)
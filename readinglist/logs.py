@@ -0,0 +1,188 @@
+import logging
+import logging.handlers
+import os
+import threading
+
+import structlog
+from six.moves import queue
+
+
+# Stops the writer thread.
+_STOP = object()
+
+
+class QueueHandler(logging.handlers.MemoryHandler):
+    """Logging handler putting records in a bounded queue, written to its
+    target handler by a background thread.
+
+    Records are written in batches of at most ``batch_size`` records, with
+    a single flush of streams. When the queue is full, records are dropped
+    and counted, and the number of dropped records is logged with the next
+    batch.
+
+    Handlers relying on the context of the logging thread when records are
+    emitted (e.g. the Sentry handler) should not be run from the queue.
+
+    Its target is set in the logging configuration, like for
+    :class:`logging.handlers.MemoryHandler`::
+
+        [handler_console_queue]
+        class = readinglist.logs.QueueHandler
+        args = (10000, 100)
+        target = console
+
+    :param int max_size: maximum number of records waiting in the queue.
+    :param int batch_size: maximum number of records written at once.
+    """
+
+    def __init__(self, max_size=10000, batch_size=100, target=None):
+        super(QueueHandler, self).__init__(capacity=max_size, target=target)
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._unreported = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        # Threads do not survive forks (e.g. preloaded application).
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._thread = threading.Thread(target=self._run,
+                                            name='readinglist-logs')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        """Merge the arguments in the message of records written to streams,
+        since they could change before the record is written.
+
+        Other targets may use the message and its arguments separately (e.g.
+        Sentry groups events by message template): the arguments are only
+        copied.
+        """
+        if isinstance(self.target, logging.StreamHandler):
+            record.msg = record.getMessage()
+            record.args = None
+        elif isinstance(record.args, dict):
+            record.args = dict(record.args)
+        elif record.args:
+            record.args = tuple(record.args)
+        return record
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            with self._start_lock:
+                self.dropped += 1
+                self._unreported += 1
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        q = self._queue
+        while True:
+            records = [q.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in records
+            self.write([r for r in records if r is not _STOP])
+            if stop:
+                return
+
+    def _drain(self):
+        records = []
+        while self._queue is not None:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [r for r in records if r is not _STOP]
+
+    def write(self, records):
+        """Write the records with the target handler."""
+        with self._start_lock:
+            unreported, self._unreported = self._unreported, 0
+        if unreported:
+            records.append(logging.makeLogRecord({
+                'name': __name__,
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': '%s log records dropped' % unreported}))
+
+        target = self.target
+        if target is None:
+            return
+        records = [r for r in records if r.levelno >= target.level and
+                   target.filter(r)]
+        if not records:
+            return
+
+        if not isinstance(target, logging.StreamHandler):
+            for record in records:
+                target.handle(record)
+            return
+
+        # Streams are written and flushed once per batch.
+        target.acquire()
+        try:
+            lines = []
+            for record in records:
+                try:
+                    lines.append(target.format(record))
+                except Exception:
+                    target.handleError(record)
+            if lines:
+                text = '\n'.join(lines) + '\n'
+                try:
+                    target.stream.write(text)
+                except UnicodeError:
+                    # Python 2 files only accept ASCII unicode strings.
+                    encoding = getattr(target.stream, 'encoding', None)
+                    target.stream.write(text.encode(encoding or 'utf-8'))
+                target.flush()
+        except Exception:
+            target.handleError(records[-1])
+        finally:
+            target.release()
+
+    def flush(self):
+        """Write the records of the queue from the calling thread."""
+        self.write(self._drain())
+
+    def close(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(1)
+        self.flush()
+        logging.Handler.close(self)
+
+
+class BoundLogger(structlog.stdlib.BoundLogger):
+    """*structlog* logger skipping the context and the processors of
+    events below the level of the underlying logger.
+    """
+
+    def _proxy_to_logger(self, method_name, event, *event_args,
+                         **event_kw):
+        level = structlog.stdlib._NAME_TO_LEVEL[method_name]
+        if not self._logger.isEnabledFor(level):
+            return None
+        return super(BoundLogger, self)._proxy_to_logger(
+            method_name, event, *event_args, **event_kw)
+
+
+def setup_logging():
+    """Skip disabled log levels before rendering events."""
+    structlog.configure(wrapper_class=BoundLogger)
@@ -0,0 +1,133 @@
+import cProfile
+import hmac
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+import six
+
+
+PROFILE_HEADER = 'Readinglist-Profile'
+REPORT_HEADER = 'Readinglist-Profile-Report'
+
+
+def _bytes(value):
+    return value if isinstance(value, bytes) else value.encode('utf-8')
+
+
+class Profiler(object):
+    """Run functions under ``cProfile``, and under ``tracemalloc`` if
+    available (Python 3.4+), and write a report of their top functions and
+    allocation sites.
+
+    Each report is written in the directory as ``<name>.txt``, along with
+    the raw ``cProfile`` statistics (``<name>.prof``), for tools like
+    *snakeviz*.
+
+    Only one function is profiled at a time. Allocations of the other
+    threads are counted meanwhile, but only the calls of the current thread
+    are profiled.
+
+    :param str directory: directory in which reports are written.
+    :param int top: number of functions and allocation sites reported.
+    """
+
+    def __init__(self, directory, top=30):
+        self.directory = directory
+        self.top = top
+        self._lock = threading.Lock()
+
+    def run(self, title, func, *args, **kwargs):
+        """Call the function, profiled unless another one is.
+
+        :param str title: first line of the report.
+        :returns: the result of the function, and the name of the report,
+            or ``None`` if not profiled.
+        :rtype: tuple
+        """
+        if not self._lock.acquire(False):
+            return func(*args, **kwargs), None
+        try:
+            return self._profile(title, func, *args, **kwargs)
+        finally:
+            self._lock.release()
+
+    def _profile(self, title, func, *args, **kwargs):
+        tracing = tracemalloc is not None
+        started = tracing and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot() if tracing else None
+
+        profile = cProfile.Profile()
+        start = time.time()
+        profile.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profile.disable()
+            duration = time.time() - start
+            after = tracemalloc.take_snapshot() if tracing else None
+            if started:
+                tracemalloc.stop()
+
+        name = '%s-%s' % (time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex)
+        path = os.path.join(self.directory, name)
+        profile.dump_stats(path + '.prof')
+
+        lines = [title, 'Duration: %.2f ms' % (duration * 1000), '']
+        lines += ['Top functions (cumulative time)', '']
+        stream = six.StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(self.top)
+        lines.append(stream.getvalue().strip())
+
+        if tracing:
+            ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            before = before.filter_traces(ignored)
+            after = after.filter_traces(ignored)
+            differences = after.compare_to(before, 'lineno')[:self.top]
+            lines += ['', 'Top allocation sites', '']
+            lines += [str(difference) for difference in differences]
+
+        with open(path + '.txt', 'w') as report:
+            report.write('\n'.join(lines) + '\n')
+        return result, name
+
+
+def profiling_tween_factory(handler, registry):
+    """Pyramid tween profiling the requests whose ``Readinglist-Profile``
+    header is the profiling secret of the settings.
+
+    The name of the report is sent in the ``Readinglist-Profile-Report``
+    response header, or ``busy`` if another request is being profiled.
+    """
+    settings = registry.settings
+    secret = settings['readinglist.profiling_secret']
+    if not secret:
+        raise ValueError('readinglist.profiling_secret must be set')
+    secret = _bytes(secret)
+    directory = (settings['readinglist.profiling_directory'] or
+                 tempfile.gettempdir())
+    top = int(settings['readinglist.profiling_top'])
+    profiler = Profiler(directory, top=top)
+
+    def profiling_tween(request):
+        token = request.headers.get(PROFILE_HEADER)
+        if token is None or not hmac.compare_digest(_bytes(token), secret):
+            return handler(request)
+
+        title = '%s %s' % (request.method, request.path_qs)
+        response, name = profiler.run(title, handler, request)
+        response.headers[REPORT_HEADER] = name or 'busy'
+        return response
+
+    return profiling_tween
@@ -0,0 +1,163 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+from pyramid.settings import asbool
+
+from cliquet.utils import json
+
+
+CACHE_KEY_PREFIX = 'response:'
+
+
+def cache_key(request, parent_id, timestamp):
+    """Return the cache key of a collection response.
+
+    The query string is normalized, so that the order of parameters does not
+    matter. Since the collection timestamp is part of the key, any write
+    in the collection invalidates previous entries.
+
+    :param request: the current request.
+    :param str parent_id: the collection parent (e.g. the user id).
+    :param int timestamp: the current collection timestamp.
+    :rtype: str
+    """
+    querystring = json.dumps(sorted(request.GET.items()))
+    parts = [parent_id, timestamp, request.host_url, request.path,
+             querystring]
+    unique = u'\n'.join([u'%s' % part for part in parts])
+    digest = hashlib.sha256(unique.encode('utf-8')).hexdigest()
+    return CACHE_KEY_PREFIX + digest
+
+
+class ResponseCache(object):
+    """In-memory LRU cache of responses, optionally backed by the *cliquet*
+    cache backend, shared among processes.
+
+    :param int max_size: maximum size of the entries kept in memory, in
+        bytes.
+    :param int max_entry_size: entries larger than this size, in bytes, are
+        not cached.
+    :param backend: optional :class:`cliquet.cache.CacheBase` instance.
+    :param float ttl: expiration of entries in the backend, in seconds.
+    """
+
+    def __init__(self, max_size, max_entry_size, backend=None, ttl=None):
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self.backend = backend
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        """Size of the entries kept in memory, in bytes."""
+        return self._size
+
+    def _store(self, key, serialized):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            # Evict least recently used entries.
+            while self._entries and \
+                    self._size + len(serialized) > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+            self._entries[key] = serialized
+            self._size += len(serialized)
+
+    def get(self, key):
+        """Return the cached value, or ``None`` if missing.
+
+        :param str key: key
+        :rtype: dict
+        """
+        with self._lock:
+            serialized = self._entries.pop(key, None)
+            if serialized is not None:
+                # Mark as recently used.
+                self._entries[key] = serialized
+
+        if serialized is None and self.backend is not None:
+            serialized = self.backend.get(key)
+            if serialized is not None:
+                self._store(key, serialized)
+
+        if serialized is not None:
+            return json.loads(serialized)
+
+    def set(self, key, value):
+        """Cache the value, unless it is larger than ``max_entry_size``.
+
+        :param str key: key
+        :param dict value: JSON serializable value.
+        """
+        serialized = json.dumps(value)
+        if len(serialized) > min(self.max_entry_size, self.max_size):
+            return
+
+        self._store(key, serialized)
+        if self.backend is not None:
+            self.backend.set(key, serialized, self.ttl)
+
+    def get_bytes(self, key):
+        """Return the cached binary data, or ``None`` if missing.
+
+        :param str key: key
+        :rtype: bytes
+        """
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is not None:
+                self._entries[key] = data
+
+        if data is None and self.backend is not None:
+            encoded = self.backend.get(key)
+            if encoded is not None:
+                data = base64.b64decode(encoded)
+                self._store(key, data)
+
+        return data
+
+    def set_bytes(self, key, data):
+        """Cache binary data (e.g. compressed bodies), unless it is larger
+        than ``max_entry_size``.
+
+        :param str key: key
+        :param bytes data: the data to cache.
+        """
+        if len(data) > min(self.max_entry_size, self.max_size):
+            return
+
+        self._store(key, data)
+        if self.backend is not None:
+            encoded = base64.b64encode(data).decode('ascii')
+            self.backend.set(key, encoded, self.ttl)
+
+    def flush(self):
+        """Remove every entry from memory."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def load_from_config(config):
+    settings = config.get_settings()
+
+    if not asbool(settings['readinglist.response_cache_enabled']):
+        return None
+
+    backend = None
+    if asbool(settings['readinglist.response_cache_shared']):
+        backend = config.registry.cache
+
+    return ResponseCache(
+        max_size=int(settings['readinglist.response_cache_max_size']),
+        max_entry_size=int(
+            settings['readinglist.response_cache_max_entry_size']),
+        backend=backend,
+        ttl=float(settings['readinglist.response_cache_ttl']))
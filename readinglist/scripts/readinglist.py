@@ -0,0 +1,96 @@
+from __future__ import absolute_import
+
+import argparse
+import logging
+import sys
+import textwrap
+
+from pyramid.paster import bootstrap
+
+from readinglist.views.article import Article
+
+
+def rebalance(env, args):
+    """Move users records from a partition to another.
+
+    Either a single user is moved (``--user``), or the specified number of
+    users from the source partition (``--source`` and ``--limit``).
+    """
+    storage = env['registry'].storage
+    collection_ids = (Article.__name__.lower(),)
+
+    if args.user:
+        parent_ids = args.user
+    else:
+        parent_ids = storage.parent_ids(args.source, collection_ids[0])
+        parent_ids = parent_ids[:args.limit]
+
+    for parent_id in parent_ids:
+        storage.move(parent_id, args.target, collection_ids)
+
+
+def metadata_report(env, args):
+    """Report the space saved by sharing the metadata of articles among
+    users, after deleting unused metadata if ``--collect`` is specified.
+    """
+    storage = env['registry'].storage
+    if args.collect:
+        collected = storage.collect_metadata()
+        sys.stdout.write('Unused metadata deleted: %s\n' % collected)
+
+    report = storage.metadata_report()
+    lines = [
+        ('Articles referring to shared metadata', report['records']),
+        ('Shared metadata', report['metadata']),
+        ('Size if stored in every article (bytes)', report['records_size']),
+        ('Size of shared metadata (bytes)', report['metadata_size']),
+        ('Space saved (bytes)', report['saved_size']),
+    ]
+    for label, value in lines:
+        sys.stdout.write('%s: %s\n' % (label, value))
+
+
+def main(args=None):
+    description = """\
+    Reading List administration commands.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description=textwrap.dedent(description))
+    parser.add_argument('--ini',
+                        help='Application configuration file',
+                        dest='ini_file',
+                        required=True)
+
+    subparsers = parser.add_subparsers()
+
+    parser_rebalance = subparsers.add_parser(
+        'rebalance',
+        help='Move users between storage partitions')
+    parser_rebalance.add_argument('--user', action='append',
+                                  help='User id (e.g. basicauth:a3e7...)')
+    parser_rebalance.add_argument('--source', type=int,
+                                  help='Partition to move users from')
+    parser_rebalance.add_argument('--limit', type=int, default=None,
+                                  help='Maximum number of users to move')
+    parser_rebalance.add_argument('--target', type=int, required=True,
+                                  help='Partition to move users to')
+    parser_rebalance.set_defaults(func=rebalance)
+
+    parser_metadata = subparsers.add_parser(
+        'metadata-report',
+        help='Report the space saved by sharing articles metadata')
+    parser_metadata.add_argument('--collect', action='store_true',
+                                 help='Delete unused metadata first')
+    parser_metadata.set_defaults(func=metadata_report)
+
+    args = parser.parse_args(sys.argv[1:] if args is None else args)
+    if args.func == rebalance and not (args.user or args.source is not None):
+        parser.error('Specify --user or --source.')
+
+    env = bootstrap(args.ini_file)
+    args.func(env, args)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main() or 0)
@@ -0,0 +1,172 @@
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+from pyramid.httpexceptions import HTTPBadRequest
+
+from cliquet import errors
+from cliquet.utils import json, reapply_cors
+
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+COLUMNAR_CONTENT_TYPE = 'application/vnd.readinglist.columnar+json'
+
+# Reserved keys of columnar objects, which cannot be article fields.
+COLUMNS_KEY = '$columns'
+ROWS_KEY = '$rows'
+
+CONTAINERS = (dict, list)
+
+
+def to_columns(value):
+    """Recursively replace lists of objects sharing the same keys by an
+    object with the list of keys, and the list of values of each object.
+
+    For example, ``[{"a": 1}, {"a": 2}]`` becomes
+    ``{"$columns": ["a"], "$rows": [[1], [2]]}``. Lists of objects with
+    different keys are left as is.
+    """
+    if isinstance(value, dict):
+        return dict([(k, to_columns(v) if isinstance(v, CONTAINERS) else v)
+                     for k, v in value.items()])
+
+    if not isinstance(value, list):
+        return value
+
+    items = [to_columns(i) if isinstance(i, CONTAINERS) else i
+             for i in value]
+    if len(items) < 2 or not all([isinstance(i, dict) for i in items]):
+        return items
+
+    keys = set(items[0])
+    if not all([keys == set(item) for item in items]):
+        return items
+
+    columns = sorted(keys)
+    rows = [[item[column] for column in columns] for item in items]
+    return {COLUMNS_KEY: columns, ROWS_KEY: rows}
+
+
+def from_columns(value):
+    """Reverse :func:`to_columns`. Only objects with the reserved
+    ``$columns`` key are read as lists of objects.
+
+    :raises ValueError: if such an object is not made of a list of
+        ``$columns`` and a list of ``$rows`` of as many values.
+    """
+    if isinstance(value, list):
+        return [from_columns(i) if isinstance(i, CONTAINERS) else i
+                for i in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    if COLUMNS_KEY not in value:
+        return dict([(k, from_columns(v) if isinstance(v, CONTAINERS) else v)
+                     for k, v in value.items()])
+
+    columns = value[COLUMNS_KEY]
+    if set(value) != set([COLUMNS_KEY, ROWS_KEY]) or \
+            not isinstance(columns, list) or \
+            not isinstance(value[ROWS_KEY], list):
+        raise ValueError('Columnar objects must have only a list of '
+                         'columns and a list of rows')
+    records = []
+    for row in value[ROWS_KEY]:
+        if not isinstance(row, list) or len(row) != len(columns):
+            raise ValueError('Rows must have as many values as columns')
+        records.append(dict(zip(columns, from_columns(row))))
+    return records
+
+
+def dumps_columnar(value):
+    return json.dumps(to_columns(value)).encode('utf-8')
+
+
+def loads_columnar(data):
+    return from_columns(json.loads(data.decode('utf-8')))
+
+
+def dumps_msgpack(value):
+    # Strings are sent as text with both Python versions.
+    return msgpack.packb(value, use_bin_type=False)
+
+
+def loads_msgpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def serialization_tween_factory(handler, registry):
+    """Pyramid tween serving JSON responses in the format preferred in the
+    ``Accept`` request header, and reading request bodies posted in these
+    formats (according to ``Content-Type``).
+
+    Views keep dealing with JSON only: bodies are converted on the way in
+    and out. Converted articles lists are kept in the response cache (see
+    :mod:`readinglist.response_cache`).
+    """
+    serializers = {
+        COLUMNAR_CONTENT_TYPE: (dumps_columnar, loads_columnar)
+    }
+    if msgpack is not None:
+        serializers[MSGPACK_CONTENT_TYPE] = (dumps_msgpack, loads_msgpack)
+
+    offers = [JSON_CONTENT_TYPE] + sorted(serializers.keys())
+
+    def decode_request(request):
+        if request.content_type not in serializers:
+            return
+        _, loads = serializers[request.content_type]
+        try:
+            body = json.dumps(loads(request.body))
+        except (TypeError, ValueError) as e:
+            message = 'Invalid %s body (%s)' % (request.content_type, e)
+            return errors.http_error(HTTPBadRequest(),
+                                     errno=errors.ERRORS.INVALID_POSTED_DATA,
+                                     message=message)
+        request.body = body.encode('utf-8')
+        request.content_type = JSON_CONTENT_TYPE
+
+    def encode_response(request, response):
+        if response.content_type != JSON_CONTENT_TYPE:
+            return
+        vary = tuple(response.vary or ())
+        if 'Accept' not in vary:
+            response.vary = vary + ('Accept',)
+
+        if 'Accept' not in request.headers or not response.body:
+            return
+        content_type = request.accept.best_match(offers)
+        if content_type not in serializers:
+            return
+
+        dumps, _ = serializers[content_type]
+        response_cache = getattr(registry, 'response_cache', None)
+        cache_key = getattr(request, 'response_cache_key', None)
+        if response_cache is None or cache_key is None:
+            body = dumps(json.loads(response.body.decode('utf-8')))
+        else:
+            cache_key = '%s:%s' % (cache_key, content_type)
+            body = response_cache.get_bytes(cache_key)
+            if body is None:
+                body = dumps(json.loads(response.body.decode('utf-8')))
+                response_cache.set_bytes(cache_key, body)
+
+        response.body = body
+        response.content_type = content_type
+        if content_type == MSGPACK_CONTENT_TYPE:
+            # Binary data has no charset.
+            del response.charset
+
+    def serialization_tween(request):
+        error = decode_request(request)
+        if error is not None:
+            return reapply_cors(request, error)
+
+        response = handler(request)
+        encode_response(request, response)
+        return response
+
+    return serialization_tween
@@ -0,0 +1,5 @@
+"""Storage backends specific to *Reading List*.
+
+They implement the :class:`cliquet.storage.StorageBase` interface, and can
+be enabled using the ``cliquet.storage_backend`` setting.
+"""
@@ -0,0 +1,862 @@
+import atexit
+import mmap
+import operator
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+import six
+
+from cliquet import logger, utils
+from cliquet.storage import (
+    StorageBase, exceptions,
+    DEFAULT_ID_FIELD, DEFAULT_MODIFIED_FIELD, DEFAULT_DELETED_FIELD)
+from cliquet.utils import COMPARISON, json
+
+
+# Fields of :class:`readinglist.views.article.ArticleSchema`, with the id
+# and the timestamp of records.
+ARTICLE_FIELDS = ('id', 'last_modified', 'url', 'preview', 'title',
+                  'added_by', 'added_on', 'stored_on', 'archived', 'favorite',
+                  'unread', 'is_article', 'excerpt', 'read_position',
+                  'marked_read_by', 'marked_read_on', 'word_count',
+                  'resolved_url', 'resolved_title')
+# Unique fields and boolean filters of articles.
+INDEXED_FIELDS = ('url', 'resolved_url', 'archived', 'favorite', 'unread',
+                  'is_article')
+# Searched fields, with their weight in relevance (like ``ts_rank``).
+SEARCH_WEIGHTS = {'title': 1.0, 'resolved_title': 1.0, 'excerpt': 0.4}
+
+OPERATORS = {
+    COMPARISON.LT: operator.lt,
+    COMPARISON.MAX: operator.le,
+    COMPARISON.EQ: operator.eq,
+    COMPARISON.NOT: operator.ne,
+    COMPARISON.MIN: operator.ge,
+    COMPARISON.GT: operator.gt,
+}
+
+_SLOTS = frozenset(ARTICLE_FIELDS)
+_INDEXABLE_TYPES = (bool,) + six.string_types + six.integer_types
+_WORDS = re.compile(r'\w+', re.UNICODE)
+_MISSING = object()
+
+
+def words(text):
+    """Split the text in lowercase words, like the ``simple`` configuration
+    of PostgreSQL full-text search.
+
+    :rtype: list
+    """
+    if not isinstance(text, six.string_types):
+        return []
+    return _WORDS.findall(text.lower())
+
+
+class Record(object):
+    """Compact record, with the fields of articles in slots, and the other
+    fields in a dictionary.
+
+    :param dict data: the fields of the record.
+    """
+
+    __slots__ = ARTICLE_FIELDS + ('_extra',)
+
+    def __init__(self, data):
+        self._extra = None
+        for name, value in data.items():
+            if name in _SLOTS:
+                setattr(self, name, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[name] = value
+
+    def get(self, name, default=None):
+        if name in _SLOTS:
+            return getattr(self, name, default)
+        if self._extra is None:
+            return default
+        return self._extra.get(name, default)
+
+    def as_dict(self):
+        data = dict(self._extra or {})
+        for name in ARTICLE_FIELDS:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                data[name] = value
+        return data
+
+
+class Tombstone(object):
+    """Deleted record, as seen by filters."""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, object_id, timestamp, id_field, modified_field,
+                 deleted_field):
+        self.fields = {id_field: object_id,
+                       modified_field: timestamp,
+                       deleted_field: True}
+
+    def get(self, name, default=None):
+        return self.fields.get(name, default)
+
+    def as_dict(self):
+        return self.fields.copy()
+
+
+def indexable(value):
+    return isinstance(value, _INDEXABLE_TYPES)
+
+
+class Collection(object):
+    """Records and tombstones of a parent in a collection, with their
+    indexes.
+
+    Records are indexed by value of their :data:`INDEXED_FIELDS`, by search
+    word, and by timestamp. Timestamps are unique in a collection, so the
+    timeline holds records and tombstones sorted by timestamp.
+    """
+
+    def __init__(self):
+        self.timestamp = None
+        self.records = {}
+        self.modified = {}
+        self.timeline = []
+        self.timeline_ids = []
+        self.indexes = dict([(field, defaultdict(set))
+                             for field in INDEXED_FIELDS])
+        self.words = defaultdict(set)
+        # Record id -> (creation timestamp, {field: modification timestamp})
+        self.changes = {}
+        # Device -> timestamp of last synchronization
+        self.cursors = {}
+
+    def __len__(self):
+        return len(self.modified)
+
+    def bump(self):
+        """Return a new timestamp for the collection, based on the current
+        millisecond, and increasing even if requests burst in.
+        """
+        current = utils.msec_time()
+        if self.timestamp is not None and self.timestamp >= current:
+            current = self.timestamp + 1
+        self.timestamp = current
+        return current
+
+    def _record_words(self, record):
+        found = set()
+        for field in SEARCH_WEIGHTS:
+            found.update(words(record.get(field)))
+        return found
+
+    def add(self, object_id, timestamp, record=None):
+        """Add a record, or a tombstone if ``record`` is ``None``, replacing
+        the previous version.
+        """
+        self.remove(object_id)
+        self.modified[object_id] = timestamp
+        position = bisect_right(self.timeline, timestamp)
+        self.timeline.insert(position, timestamp)
+        self.timeline_ids.insert(position, object_id)
+        if record is None:
+            return
+
+        self.records[object_id] = record
+        for field, index in self.indexes.items():
+            value = record.get(field)
+            if indexable(value):
+                index[value].add(object_id)
+        for word in self._record_words(record):
+            self.words[word].add(object_id)
+
+    def remove(self, object_id):
+        """Forget a record or a tombstone."""
+        timestamp = self.modified.pop(object_id, None)
+        if timestamp is None:
+            return
+        position = bisect_left(self.timeline, timestamp)
+        del self.timeline[position]
+        del self.timeline_ids[position]
+
+        record = self.records.pop(object_id, None)
+        if record is None:
+            return
+        for field, index in self.indexes.items():
+            value = record.get(field)
+            if indexable(value):
+                self._discard(index, value, object_id)
+        for word in self._record_words(record):
+            self._discard(self.words, word, object_id)
+
+    def _discard(self, index, key, object_id):
+        ids = index[key]
+        ids.discard(object_id)
+        if not ids:
+            del index[key]
+
+    def entry(self, object_id, id_field, modified_field, deleted_field):
+        """Return the record, or its tombstone."""
+        record = self.records.get(object_id)
+        if record is not None:
+            return record
+        return Tombstone(object_id, self.modified[object_id],
+                         id_field, modified_field, deleted_field)
+
+    def lookup(self, field, value, id_field):
+        """Return the ids of the records whose field equals the value."""
+        if field == id_field:
+            return set([value]) if value in self.records else set()
+        if field in self.indexes and indexable(value):
+            return self.indexes[field].get(value, set())
+        return set([object_id for object_id, record in self.records.items()
+                    if record.get(field) == value])
+
+    def select(self, filters, include_deleted, id_field, modified_field,
+               deleted_field):
+        """Return the ids of the records matching the filters, by ascending
+        timestamp.
+
+        Candidates are read from the indexes, either from the timeline if
+        timestamps are compared, or from the values of indexed fields and ids
+        if they are filtered by equality, whichever is smaller. Filters are
+        then checked on the candidates.
+        """
+        lower, upper = 0, len(self.timeline)
+        candidates = None
+        for f in filters:
+            if f.field == modified_field:
+                if f.operator in (COMPARISON.GT, COMPARISON.EQ,
+                                  COMPARISON.MAX):
+                    found = bisect_right(self.timeline, f.value)
+                    if f.operator == COMPARISON.GT:
+                        lower = max(lower, found)
+                    else:
+                        upper = min(upper, found)
+                if f.operator in (COMPARISON.MIN, COMPARISON.EQ,
+                                  COMPARISON.LT):
+                    found = bisect_left(self.timeline, f.value)
+                    if f.operator == COMPARISON.LT:
+                        upper = min(upper, found)
+                    else:
+                        lower = max(lower, found)
+            elif f.operator == COMPARISON.EQ and f.value is not None and \
+                    (f.field == id_field or f.field in self.indexes):
+                ids = self.lookup(f.field, f.value, id_field)
+                if candidates is None:
+                    candidates = set(ids)
+                else:
+                    candidates.intersection_update(ids)
+
+        if candidates is None or upper - lower < len(candidates):
+            ids = self.timeline_ids[lower:upper]
+        else:
+            ids = sorted(candidates, key=self.modified.__getitem__)
+        if not include_deleted:
+            ids = [object_id for object_id in ids
+                   if object_id in self.records]
+
+        return [object_id for object_id in ids
+                if matches(self.entry(object_id, id_field, modified_field,
+                                      deleted_field), filters)]
+
+    def search(self, terms):
+        """Return the ids of the records containing every term, and their
+        relevance.
+
+        :rtype: dict
+        """
+        if not terms:
+            return {}
+        candidates = None
+        for term in set(terms):
+            ids = self.words.get(term, set())
+            if candidates is None:
+                candidates = set(ids)
+            else:
+                candidates.intersection_update(ids)
+
+        ranks = {}
+        for object_id in candidates:
+            record = self.records[object_id]
+            rank = 0
+            for field, weight in SEARCH_WEIGHTS.items():
+                found = words(record.get(field))
+                rank += weight * sum([found.count(term) for term in terms])
+            ranks[object_id] = rank
+        return ranks
+
+    def track(self, object_id, timestamp, previous, record, ignored):
+        """Keep the timestamp of the last change of each field, for
+        synchronizations.
+        """
+        if previous is None:
+            self.changes[object_id] = (timestamp, {})
+            return
+        old = previous.as_dict()
+        new = record.as_dict()
+        fields = self.changes[object_id][1]
+        for field in set(old.keys()) | set(new.keys()):
+            if field not in ignored and \
+                    old.get(field, _MISSING) != new.get(field, _MISSING):
+                fields[field] = timestamp
+
+    def dump(self):
+        """Return a copy of the state of the collection, serializable as
+        JSON.
+        """
+        return {
+            'timestamp': self.timestamp,
+            'records': [[object_id, self.modified[object_id],
+                         self.records[object_id].as_dict()
+                         if object_id in self.records else None]
+                        for object_id in self.timeline_ids],
+            'changes': dict([(object_id, (created, dict(fields)))
+                             for object_id, (created, fields)
+                             in self.changes.items()]),
+            'cursors': dict(self.cursors),
+        }
+
+    @classmethod
+    def load(cls, state):
+        collection = cls()
+        collection.timestamp = state['timestamp']
+        for object_id, timestamp, data in state['records']:
+            record = Record(data) if data is not None else None
+            collection.add(object_id, timestamp, record)
+        collection.changes = dict([(object_id, (created, fields))
+                                   for object_id, (created, fields)
+                                   in state['changes'].items()])
+        collection.cursors = state['cursors']
+        return collection
+
+
+def matches(record, filters):
+    for f in filters:
+        if not OPERATORS[f.operator](record.get(f.field), f.value):
+            return False
+    return True
+
+
+def apply_sorting(records, sorting):
+    """Sort the records, with missing values last in ascending order, and
+    first in descending order (like PostgreSQL).
+    """
+    records = list(records)
+    for field, direction in reversed(sorting):
+        records.sort(key=lambda r: (r.get(field) is None, r.get(field)),
+                     reverse=(direction < 0))
+    return records
+
+
+class Memory(StorageBase):
+    """Storage backend keeping the records in the memory of the process,
+    with indexes for the filters, sorting and synchronization of articles.
+
+    Enable in configuration::
+
+        cliquet.storage_backend = readinglist.storage.memory
+
+    Records of each user are kept in dedicated dictionaries, as compact
+    :class:`Record` objects. Their unique fields (``url``, ``resolved_url``)
+    and boolean filters (``unread``, ``favorite``, etc.) are indexed, as well
+    as their timestamps for synchronizations (``_since``) and the words of
+    their titles and excerpts for searches.
+
+    Records are lost when the process stops, unless they are written to a
+    snapshot file, which is read on startup. Snapshots are written by a
+    background thread, from a copy of the collections::
+
+        readinglist.storage_memory_snapshot_path = /var/lib/readinglist/data
+        readinglist.storage_memory_snapshot_interval = 60
+
+    .. warning::
+
+        Every process has its own records: run the application with a single
+        process.
+
+    :param int max_fetch_size: maximum number of search results.
+    :param str snapshot_path: optional path of the snapshot file.
+    :param float snapshot_interval: minimum number of seconds between two
+        snapshots, written after changes.
+    """
+
+    def __init__(self, max_fetch_size=10000, snapshot_path=None,
+                 snapshot_interval=0):
+        self._max_fetch_size = max_fetch_size
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.RLock()
+        self._collections = {}
+        self._saved_at = time.time()
+        self._save_lock = threading.Lock()
+        self._saver = None
+        if snapshot_path is not None:
+            self.load()
+
+    def initialize_schema(self):
+        # Nothing to do.
+        pass
+
+    def flush(self, auth=None):
+        with self._lock:
+            self._collections.clear()
+            self._changed()
+
+    def _collection(self, collection_id, parent_id):
+        key = (collection_id, parent_id)
+        collection = self._collections.get(key)
+        if collection is None:
+            collection = self._collections[key] = Collection()
+        return collection
+
+    #
+    # Snapshots
+    #
+
+    def _changed(self):
+        # Called with the lock held.
+        if self.snapshot_path is None:
+            return
+        if time.time() - self._saved_at < self.snapshot_interval:
+            return
+        if self._saver is not None and self._saver.is_alive():
+            return
+        self._saved_at = time.time()
+        self._saver = threading.Thread(target=self._save_in_background,
+                                       name='readinglist-snapshot')
+        self._saver.daemon = True
+        self._saver.start()
+
+    def _save_in_background(self):
+        try:
+            self.save()
+        except Exception as e:
+            logger.error('Storage snapshot failed: %s' % e)
+
+    def save(self):
+        """Write every collection to the snapshot file.
+
+        The collections are copied with the lock held, and then written
+        without it, so that requests are not blocked meanwhile. The snapshot
+        is written to a temporary file first, and then renamed, so that the
+        previous snapshot remains intact if the process stops meanwhile.
+        """
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        with self._save_lock:
+            with self._lock:
+                self._saved_at = time.time()
+                states = []
+                for (collection_id, parent_id), collection in \
+                        self._collections.items():
+                    if not len(collection) and not collection.cursors:
+                        continue
+                    state = collection.dump()
+                    state.update(collection_id=collection_id,
+                                 parent_id=parent_id)
+                    states.append(state)
+
+            fd, path = tempfile.mkstemp(dir=directory,
+                                        prefix='.readinglist-snapshot-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for state in states:
+                        # Non-ASCII characters are escaped.
+                        f.write(json.dumps(state).encode('ascii') + b'\n')
+                os.rename(path, self.snapshot_path)
+            except Exception:
+                os.remove(path)
+                raise
+
+    def load(self):
+        """Read the collections from the snapshot file, if any.
+
+        The file is mapped in memory and read one collection at a time, so
+        that it is never copied whole.
+        """
+        if not os.path.exists(self.snapshot_path) or \
+                os.path.getsize(self.snapshot_path) == 0:
+            return
+
+        with self._lock, open(self.snapshot_path, 'rb') as f:
+            snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for line in iter(snapshot.readline, b''):
+                    state = json.loads(line.decode('utf-8'))
+                    key = (state['collection_id'], state['parent_id'])
+                    self._collections[key] = Collection.load(state)
+            finally:
+                snapshot.close()
+        logger.info('Storage snapshot loaded',
+                    collections=len(self._collections))
+
+    #
+    # Records
+    #
+
+    def collection_timestamp(self, collection_id, parent_id, auth=None):
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            if collection.timestamp is not None:
+                return collection.timestamp
+            return collection.bump()
+
+    def _check_unicity(self, collection, record, object_id, unique_fields,
+                       id_field, for_creation=False):
+        fields = tuple(unique_fields or ())
+        if for_creation:
+            fields = (id_field,) + fields
+        for field in fields:
+            value = record.get(field)
+            if value is None:
+                continue
+            for existing_id in collection.lookup(field, value, id_field):
+                if existing_id != object_id or field == id_field:
+                    existing = collection.records[existing_id].as_dict()
+                    raise exceptions.UnicityError(field, existing)
+
+    def _save(self, collection, object_id, record, id_field,
+              modified_field):
+        previous = collection.records.get(object_id)
+        timestamp = collection.bump()
+        record[id_field] = object_id
+        record[modified_field] = timestamp
+        compact = Record(record)
+        collection.add(object_id, timestamp, compact)
+        collection.track(object_id, timestamp, previous, compact,
+                         (id_field, modified_field))
+        return record
+
+    def create(self, collection_id, parent_id, record, id_generator=None,
+               unique_fields=None, id_field=DEFAULT_ID_FIELD,
+               modified_field=DEFAULT_MODIFIED_FIELD, auth=None):
+        id_generator = id_generator or self.id_generator
+        record = record.copy()
+        object_id = record.setdefault(id_field, id_generator())
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            self._check_unicity(collection, record, object_id,
+                                unique_fields, id_field, for_creation=True)
+            self._save(collection, object_id, record, id_field,
+                       modified_field)
+            self._changed()
+        return record
+
+    def get(self, collection_id, parent_id, object_id,
+            id_field=DEFAULT_ID_FIELD,
+            modified_field=DEFAULT_MODIFIED_FIELD,
+            auth=None):
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            record = collection.records.get(object_id)
+            if record is None:
+                raise exceptions.RecordNotFoundError(object_id)
+            return record.as_dict()
+
+    def update(self, collection_id, parent_id, object_id, record,
+               unique_fields=None, id_field=DEFAULT_ID_FIELD,
+               modified_field=DEFAULT_MODIFIED_FIELD,
+               auth=None):
+        record = record.copy()
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            self._check_unicity(collection, record, object_id,
+                                unique_fields, id_field)
+            self._save(collection, object_id, record, id_field,
+                       modified_field)
+            self._changed()
+        return record
+
+    def delete(self, collection_id, parent_id, object_id,
+               id_field=DEFAULT_ID_FIELD,
+               modified_field=DEFAULT_MODIFIED_FIELD,
+               deleted_field=DEFAULT_DELETED_FIELD,
+               auth=None):
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            if object_id not in collection.records:
+                raise exceptions.RecordNotFoundError(object_id)
+            timestamp = collection.bump()
+            collection.add(object_id, timestamp)
+            collection.changes.pop(object_id, None)
+            self._changed()
+        return {id_field: object_id,
+                modified_field: timestamp,
+                deleted_field: True}
+
+    def delete_all(self, collection_id, parent_id, filters=None,
+                   id_field=DEFAULT_ID_FIELD,
+                   modified_field=DEFAULT_MODIFIED_FIELD,
+                   deleted_field=DEFAULT_DELETED_FIELD,
+                   auth=None):
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            ids = collection.select(filters or [], False, id_field,
+                                    modified_field, deleted_field)
+            return [self.delete(collection_id, parent_id, object_id,
+                                id_field=id_field,
+                                modified_field=modified_field,
+                                deleted_field=deleted_field)
+                    for object_id in ids]
+
+    def get_all(self, collection_id, parent_id, filters=None, sorting=None,
+                pagination_rules=None, limit=None, include_deleted=False,
+                id_field=DEFAULT_ID_FIELD,
+                modified_field=DEFAULT_MODIFIED_FIELD,
+                deleted_field=DEFAULT_DELETED_FIELD,
+                auth=None):
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            ids = collection.select(filters or [], include_deleted,
+                                    id_field, modified_field, deleted_field)
+            total_records = len([object_id for object_id in ids
+                                 if object_id in collection.records])
+
+            entries = [collection.entry(object_id, id_field, modified_field,
+                                        deleted_field)
+                       for object_id in ids]
+            if pagination_rules:
+                entries = [entry for entry in entries
+                           if any([matches(entry, rule)
+                                   for rule in pagination_rules])]
+
+            if sorting and [s.field for s in sorting] == [modified_field]:
+                # Selected records are already sorted by timestamp.
+                if sorting[0].direction < 0:
+                    entries.reverse()
+            elif sorting:
+                entries = apply_sorting(entries, sorting)
+
+            if limit:
+                entries = entries[:limit]
+            return [entry.as_dict() for entry in entries], total_records
+
+    def search(self, collection_id, parent_id, terms, filters=None,
+               sorting=None, limit=None, offset=0,
+               id_field=DEFAULT_ID_FIELD,
+               modified_field=DEFAULT_MODIFIED_FIELD,
+               auth=None):
+        """Return the records whose title, resolved title or excerpt contain
+        every search term.
+
+        Records are sorted by relevance (titles weigh more than excerpts),
+        then by descending timestamp, unless `sorting` is specified.
+
+        :param str terms: the search terms.
+        :param filters: additional filters (see :meth:`get_all`).
+        :param sorting: optional sorting, instead of relevance.
+        :param int limit: optional maximum number of records returned.
+        :param int offset: number of matching records to skip.
+        :returns: the list of records in the current page, and the total
+            number of matching records.
+        :rtype: tuple
+        """
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            ranks = collection.search(words(terms))
+            ids = [object_id for object_id in ranks
+                   if matches(collection.records[object_id], filters or [])]
+            ids.sort(key=lambda i: (ranks[i], collection.modified[i]),
+                     reverse=True)
+            records = [collection.records[object_id] for object_id in ids]
+            if sorting:
+                records = apply_sorting(records, sorting)
+
+            limit = min(limit or self._max_fetch_size, self._max_fetch_size)
+            page = records[offset:offset + limit]
+            return [record.as_dict() for record in page], len(records)
+
+    def iter_records(self, collection_id, parent_id, since=None,
+                     include_deleted=False,
+                     id_field=DEFAULT_ID_FIELD,
+                     modified_field=DEFAULT_MODIFIED_FIELD,
+                     deleted_field=DEFAULT_DELETED_FIELD,
+                     auth=None):
+        """Iterate on the records of the parent, by ascending timestamp.
+
+        Records are copied one at a time. Those changed during the iteration
+        are returned in their current version.
+
+        :param int since: only iterate on records modified after this
+            timestamp.
+        :param bool include_deleted: iterate on tombstones too.
+        :rtype: generator
+        """
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            start = 0
+            if since is not None:
+                start = bisect_right(collection.timeline, since)
+            ids = collection.timeline_ids[start:]
+
+        key = (collection_id, parent_id)
+        for object_id in ids:
+            with self._lock:
+                if self._collections.get(key) is not collection or \
+                        object_id not in collection.modified:
+                    continue
+                if not include_deleted and \
+                        object_id not in collection.records:
+                    continue
+                entry = collection.entry(object_id, id_field, modified_field,
+                                         deleted_field)
+                record = entry.as_dict()
+            yield record
+
+    def sync(self, collection_id, parent_id, device, since=None, limit=None,
+             id_field=DEFAULT_ID_FIELD,
+             modified_field=DEFAULT_MODIFIED_FIELD,
+             deleted_field=DEFAULT_DELETED_FIELD,
+             auth=None):
+        """Return the changes of the records since the last synchronization
+        of the device, by ascending timestamp, and advance its cursor.
+
+        Records created since then are returned whole. Others only have the
+        fields modified since then, with their current values. Deleted
+        records are returned as tombstones.
+
+        :param str device: the device name.
+        :param int since: start from this timestamp instead of the device
+            cursor.
+        :param int limit: optional maximum number of changes returned.
+        :returns: the changes, the new cursor of the device (``None`` if
+            it never received any change), and whether more changes remain.
+        :rtype: tuple
+        """
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            if since is None:
+                since = collection.cursors.get(device)
+
+            if since is None:
+                ids = [object_id for object_id in collection.timeline_ids
+                       if object_id in collection.records]
+            else:
+                start = bisect_right(collection.timeline, since)
+                ids = collection.timeline_ids[start:]
+            has_more = limit is not None and len(ids) > limit
+            ids = ids[:limit]
+
+            changes = []
+            for object_id in ids:
+                record = collection.records.get(object_id)
+                if record is None:
+                    change = {deleted_field: True}
+                else:
+                    change = record.as_dict()
+                    created, fields = collection.changes.get(object_id,
+                                                             (None, {}))
+                    if since is not None and created is not None and \
+                            created <= since:
+                        change = dict([(field, change.get(field))
+                                       for field, modified in fields.items()
+                                       if modified > since])
+                change[id_field] = object_id
+                change[modified_field] = collection.modified[object_id]
+                changes.append(change)
+
+            if changes:
+                since = changes[-1][modified_field]
+                collection.cursors[device] = since
+                self._changed()
+
+        return changes, since, has_more
+
+    def create_many(self, collection_id, parent_id, records,
+                    id_generator=None, unique_fields=None,
+                    id_field=DEFAULT_ID_FIELD,
+                    modified_field=DEFAULT_MODIFIED_FIELD,
+                    auth=None):
+        """Create several records at once.
+
+        Records conflicting with existing ones, or with previous ones in the
+        list, are not created.
+
+        :param list records: the records to create.
+        :returns: for each record, in order, a tuple with the created record
+            and ``True``, or the conflicting record and ``False``.
+        :rtype: list
+        """
+        id_generator = id_generator or self.id_generator
+        records = [r.copy() for r in records]
+        for record in records:
+            record.setdefault(id_field, id_generator())
+        unique_fields = (id_field,) + tuple(unique_fields or ())
+
+        # Conflicts among the created records are detected here.
+        duplicates = {}
+        seen = {}
+        for position, record in enumerate(records):
+            values = [(f, record.get(f)) for f in unique_fields
+                      if record.get(f) is not None]
+            for value in values:
+                if value in seen:
+                    duplicates[position] = seen[value]
+                    break
+            else:
+                seen.update([(value, position) for value in values])
+
+        created = []
+        with self._lock:
+            collection = self._collection(collection_id, parent_id)
+            for position, record in enumerate(records):
+                if position in duplicates:
+                    previous = created[duplicates[position]][0]
+                    created.append((previous.copy(), False))
+                    continue
+                try:
+                    self._check_unicity(collection, record, record[id_field],
+                                        unique_fields, id_field,
+                                        for_creation=True)
+                except exceptions.UnicityError as e:
+                    created.append((e.record, False))
+                    continue
+                self._save(collection, record[id_field], record, id_field,
+                           modified_field)
+                created.append((record, True))
+            self._changed()
+        return created
+
+    def parent_ids(self, collection_id):
+        """Return the ids of the parents having records in the collection.
+
+        :param str collection_id: the collection id.
+        :rtype: list
+        """
+        with self._lock:
+            return [parent_id
+                    for (collection, parent_id), records
+                    in self._collections.items()
+                    if collection == collection_id and len(records) > 0]
+
+    def purge(self, collection_id, parent_id):
+        """Remove the records of a parent, tombstones included.
+
+        :param str collection_id: the collection id.
+        :param str parent_id: the collection parent.
+        """
+        with self._lock:
+            self._collections.pop((collection_id, parent_id), None)
+            self._changed()
+
+
+def load_from_config(config):
+    settings = config.get_settings()
+
+    max_fetch_size = int(settings['cliquet.storage_max_fetch_size'])
+    snapshot_path = settings['readinglist.storage_memory_snapshot_path']
+    snapshot_interval = float(
+        settings['readinglist.storage_memory_snapshot_interval'])
+    storage = Memory(max_fetch_size=max_fetch_size,
+                     snapshot_path=snapshot_path or None,
+                     snapshot_interval=snapshot_interval)
+    if storage.snapshot_path is not None:
+        # Changes made since the last snapshot are written on exit.
+        atexit.register(storage.save)
+    return storage
@@ -0,0 +1,171 @@
+import re
+import threading
+import time
+
+import six
+import structlog
+from pyramid.settings import asbool
+
+from cliquet.utils import psycopg2
+
+
+# Dedicated logger, which can be routed separately in logging configuration.
+logger = structlog.get_logger('readinglist.slow_queries')
+
+WHITESPACES_REGEXP = re.compile(r'\s+')
+LITERAL_REGEXP = re.compile(r"'(?:[^']|'')*'")
+EXPLAINABLE_REGEXP = re.compile(
+    r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|EXECUTE)\b', re.IGNORECASE)
+
+
+def redact(params):
+    """Describe the parameters of a statement without their content:
+    strings and lists are replaced by their length.
+
+    :param params: dict or list of parameters, or ``None``.
+    """
+    def describe(value):
+        if value is None or isinstance(value, (bool, float) +
+                                       six.integer_types):
+            return value
+        if isinstance(value, six.string_types):
+            return '<%s chars>' % len(value)
+        if isinstance(value, (list, tuple)):
+            return '<%s items>' % len(value)
+        return '<%s>' % type(value).__name__
+
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return dict([(k, describe(v)) for k, v in params.items()])
+    return [describe(v) for v in params]
+
+
+class SlowQueries(object):
+    """Log the SQL statements slower than a threshold, with their shape,
+    redacted parameters, number of rows and execution plan.
+
+    Plans are obtained by running the statements again with
+    ``EXPLAIN (ANALYZE, BUFFERS)``, in a transaction or savepoint rolled
+    back afterwards. Constants are removed from plans. Plans of statements
+    failing when run again (e.g. insertion of an existing id) are not
+    available.
+
+    At most ``max_samples`` statements are logged every ``interval``
+    seconds. The number of statements skipped meanwhile is logged with the
+    next one.
+
+    :param float threshold: seconds above which statements are logged.
+    :param int max_samples: maximum number of statements logged per interval.
+    :param float interval: seconds of the rate limit window.
+    :param bool explain: capture the execution plans of statements.
+    """
+
+    def __init__(self, threshold, max_samples=10, interval=60, explain=True):
+        self.threshold = threshold
+        self.max_samples = max_samples
+        self.interval = interval
+        self.explain = explain
+        self._window_start = 0
+        self._samples = 0
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+    def _take_sample(self):
+        """Return the number of statements skipped since the last sample,
+        or ``None`` if the rate limit is reached.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._window_start >= self.interval:
+                self._window_start = now
+                self._samples = 0
+            if self._samples >= self.max_samples:
+                self._skipped += 1
+                return None
+            self._samples += 1
+            skipped, self._skipped = self._skipped, 0
+            return skipped
+
+    def capture(self, cursor, query, params, duration, statement=None):
+        """Log the statement just executed with the cursor, if slow.
+
+        :param cursor: the cursor which executed the statement.
+        :param str query: the executed query.
+        :param params: the parameters of the query.
+        :param float duration: seconds spent executing the statement.
+        :param str statement: the query of the prepared statement executed,
+            if any.
+        """
+        if duration < self.threshold:
+            return
+        skipped = self._take_sample()
+        if skipped is None:
+            return
+
+        shape = WHITESPACES_REGEXP.sub(' ', statement or query).strip()
+        event = dict(statement=shape,
+                     parameters=redact(params),
+                     duration=round(duration * 1000, 2),
+                     rows=cursor.rowcount,
+                     skipped=skipped)
+        # Statements following the first one would be run again.
+        single = ';' not in query.strip().rstrip(';')
+        if self.explain and single and EXPLAINABLE_REGEXP.match(query):
+            event['plan'] = self._explain(cursor.connection, query, params)
+        logger.warning('Slow query', **event)
+
+    def _explain(self, connection, query, params):
+        if connection.autocommit:
+            begin, end = 'BEGIN;', 'ROLLBACK;'
+        else:
+            begin = 'SAVEPOINT slow_query;'
+            end = 'ROLLBACK TO SAVEPOINT slow_query;'
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute(begin)
+            try:
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + query, params)
+                plan = '\n'.join([row[0] for row in cursor.fetchall()])
+            except psycopg2.Error as e:
+                # Error messages may contain values.
+                plan = 'Not available (error %s)' % e.pgcode
+            cursor.execute(end)
+        finally:
+            cursor.close()
+        return LITERAL_REGEXP.sub("'?'", plan)
+
+
+class TimedCursor(psycopg2.extras.DictCursor if psycopg2 else object):
+    """Cursor reporting the duration of its statements to
+    :attr:`slow_queries`.
+    """
+
+    slow_queries = None
+
+    #: Query of the prepared statement being executed, if any.
+    prepared_query = None
+
+    def execute(self, query, vars=None):
+        start = time.time()
+        result = super(TimedCursor, self).execute(query, vars)
+        self.slow_queries.capture(self, query, vars, time.time() - start,
+                                  statement=self.prepared_query)
+        return result
+
+
+def load_from_config(config):
+    """Return the :class:`SlowQueries` of the storage backends, or ``None``
+    if disabled.
+    """
+    settings = config.get_settings()
+
+    threshold = float(settings['readinglist.storage_slow_query_threshold'])
+    if threshold <= 0:
+        return None
+    max_samples = int(settings['readinglist.storage_slow_query_max_samples'])
+    explain = asbool(settings['readinglist.storage_slow_query_explain'])
+    return SlowQueries(threshold=threshold,
+                       max_samples=max_samples,
+                       explain=explain)
@@ -3,24 +3,67 @@ try:
 except ImportError:
     import unittest  # NOQA
 
+import structlog
 import webtest
+from pyramid.paster import get_appsettings
 
 from cliquet.tests.support import (BaseWebTest as CliquetBaseTest,
                                    get_request_class)
-from readinglist import API_VERSION
+from readinglist import API_VERSION, main
+
+
+# Storage backends may log before any test application configured logging.
+# Make sure the underlying loggers are the same as the application ones.
+structlog.configure(logger_factory=structlog.stdlib.LoggerFactory())
+
+# Test applications, by settings.
+_applications = {}
 
 
 class BaseWebTest(CliquetBaseTest):
     """Base Web Test to test your cornice service.
 
-    It setups the database before each test and delete it after.
-    """
-    def __init__(self, *args, **kwargs):
-        super(BaseWebTest, self).__init__(*args, **kwargs)
-        self.storage.initialize_schema()
+    Applications are built once for each set of settings (see
+    :meth:`get_app_settings`), and shared among tests. The database is
+    setup when they are built, and their storage, cache and in-memory state
+    are flushed after each test.
 
+    Tests are not run in a transaction: changes are committed, and seen by
+    other connections and threads, until flushed.
+    """
     def _get_test_app(self, settings=None):
-        app = webtest.TestApp("config:config/readinglist.ini",
-                              relative_to='.')
-        app.RequestClass = get_request_class(API_VERSION)
+        settings = self.get_app_settings(settings)
+        key = tuple(sorted(settings.items()))
+        app = _applications.get(key)
+        if app is None:
+            app = webtest.TestApp(main({}, **settings))
+            app.RequestClass = get_request_class(API_VERSION)
+            app.app.registry.storage.initialize_schema()
+            _applications[key] = app
         return app
+
+    def get_app_settings(self, additional_settings=None):
+        settings = get_appsettings('config/readinglist.ini')
+        settings.update(additional_settings or {})
+        return settings
+
+    def tearDown(self):
+        registry = self.app.app.registry
+        # The storage is flushed through the circuit breaker, if any.
+        breaker = getattr(self.storage, 'breaker', None)
+        if breaker is not None:
+            breaker.reset()
+        super(BaseWebTest, self).tearDown()
+        registry.cache.flush()
+        registry.permission.flush()
+        for name in ('response_cache', 'degraded_snapshots'):
+            cache = getattr(registry, name, None)
+            if cache is not None:
+                cache.flush()
+        for name in ('token_verifier', 'admission_buckets'):
+            state = getattr(registry, name, None)
+            if state is not None:
+                state.clear()
+        controller = getattr(registry, 'admission_controller', None)
+        if controller is not None:
+            controller.reset()
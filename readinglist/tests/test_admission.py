@@ -0,0 +1,249 @@
+import json
+import time
+
+import mock
+from pyramid.request import Request
+from pyramid.response import Response
+
+from readinglist import admission
+
+from .support import BaseWebTest, unittest
+
+
+class ClassifyTest(unittest.TestCase):
+    def classify(self, path, method='GET', body=None):
+        request = Request.blank(path, method=method)
+        if body is not None:
+            request.body = json.dumps(body).encode('utf-8')
+        return admission.classify(request, max_batch_size=2)
+
+    def test_polls_and_updates_are_critical(self):
+        self.assertEqual(self.classify('/v2/articles?_since=123'),
+                         admission.CRITICAL)
+        self.assertEqual(self.classify('/v2/articles/abc', method='PATCH'),
+                         admission.CRITICAL)
+        self.assertEqual(self.classify('/v2/__heartbeat__'),
+                         admission.CRITICAL)
+        self.assertEqual(self.classify('/v2/articles', method='OPTIONS'),
+                         admission.CRITICAL)
+
+    def test_listings_searches_and_bulk_operations_are_expensive(self):
+        self.assertEqual(self.classify('/v2/articles'), admission.EXPENSIVE)
+        self.assertEqual(self.classify('/v2/articles/'), admission.EXPENSIVE)
+        self.assertEqual(self.classify('/v2/articles?_limit=10&q=mozilla'),
+                         admission.EXPENSIVE)
+        self.assertEqual(self.classify('/v2/articles/export'),
+                         admission.EXPENSIVE)
+        self.assertEqual(self.classify('/v2/articles/import', method='POST'),
+                         admission.EXPENSIVE)
+
+    def test_big_batches_are_expensive(self):
+        body = {'requests': [{'path': '/articles'}] * 3}
+        self.assertEqual(self.classify('/v2/batch', 'POST', body),
+                         admission.EXPENSIVE)
+        body = {'requests': [{'path': '/articles'}] * 2}
+        self.assertEqual(self.classify('/v2/batch', 'POST', body),
+                         admission.NORMAL)
+        self.assertEqual(self.classify('/v2/batch', 'POST', []),
+                         admission.NORMAL)
+
+    def test_other_requests_are_normal(self):
+        self.assertEqual(self.classify('/v2/articles/abc'), admission.NORMAL)
+        self.assertEqual(self.classify('/v2/articles', method='POST'),
+                         admission.NORMAL)
+        self.assertEqual(self.classify('/v2/articles/abc', method='DELETE'),
+                         admission.NORMAL)
+
+
+class PoolUsageTest(unittest.TestCase):
+    def test_highest_ratio_of_open_pools_is_returned(self):
+        pools = {
+            'a': mock.Mock(closed=False, maxconn=10, _used={1: 1}),
+            'b': mock.Mock(closed=False, maxconn=4, _used={1: 1, 2: 2}),
+            'c': mock.Mock(closed=True, maxconn=1, _used={1: 1})}
+        with mock.patch.dict(admission.PostgreSQL._pools, pools, clear=True):
+            self.assertEqual(admission.pool_usage(), 0.5)
+
+    def test_usage_is_zero_without_pools(self):
+        with mock.patch.dict(admission.PostgreSQL._pools, {}, clear=True):
+            self.assertEqual(admission.pool_usage(), 0.0)
+
+
+class AdmissionControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = admission.AdmissionController(
+            max_inflight=4, target_latency=0.1, half_life=0.05)
+
+    def test_pressure_is_the_ratio_of_requests_in_flight(self):
+        self.controller.started()
+        self.controller.started()
+        self.assertEqual(self.controller.pressure(), 0.5)
+
+    def test_pressure_is_the_ratio_of_average_duration(self):
+        self.controller.smoothing = 1
+        self.controller.started()
+        self.controller.finished(0.2)
+        self.assertAlmostEqual(self.controller.pressure(), 2, places=1)
+
+    def test_average_duration_decays_without_requests(self):
+        self.controller.smoothing = 1
+        self.controller.started()
+        self.controller.finished(0.2)
+        time.sleep(0.1)
+        self.assertLess(self.controller.pressure(), 0.6)
+
+    def test_average_duration_is_forgotten_on_reset(self):
+        self.controller.smoothing = 1
+        self.controller.started()
+        self.controller.finished(0.2)
+        self.controller.reset()
+        self.assertEqual(self.controller.pressure(), 0)
+
+    def test_pressure_includes_probes(self):
+        self.controller.probes.append(lambda: 0.9)
+        self.assertEqual(self.controller.pressure(), 0.9)
+
+    def test_every_request_is_admitted_below_soft_limit(self):
+        for request_class in (admission.CRITICAL, admission.NORMAL,
+                              admission.EXPENSIVE):
+            self.assertEqual(self.controller.decide(0.5, request_class),
+                             self.controller.ADMIT)
+
+    def test_expensive_requests_are_rejected_above_soft_limit(self):
+        decide = self.controller.decide
+        self.assertEqual(decide(0.8, admission.CRITICAL),
+                         self.controller.BACKOFF)
+        self.assertEqual(decide(0.8, admission.NORMAL),
+                         self.controller.BACKOFF)
+        self.assertEqual(decide(0.8, admission.EXPENSIVE),
+                         self.controller.REJECT)
+
+    def test_only_critical_requests_are_admitted_at_full_load(self):
+        decide = self.controller.decide
+        self.assertEqual(decide(1.5, admission.CRITICAL),
+                         self.controller.BACKOFF)
+        self.assertEqual(decide(1.5, admission.NORMAL),
+                         self.controller.REJECT)
+
+
+class TokenBucketsTest(unittest.TestCase):
+    def setUp(self):
+        self.buckets = admission.TokenBuckets(rate=20, burst=2, max_size=2)
+
+    def test_requests_are_limited_after_burst(self):
+        self.assertEqual(self.buckets.take('bob'), 0)
+        self.assertEqual(self.buckets.take('bob'), 0)
+        wait = self.buckets.take('bob')
+        self.assertTrue(0 < wait <= 0.05)
+        self.assertEqual(self.buckets.take('alice'), 0)
+
+    def test_tokens_are_given_back_over_time(self):
+        for _ in range(3):
+            self.buckets.take('bob')
+        time.sleep(0.1)
+        self.assertEqual(self.buckets.take('bob'), 0)
+
+    def test_cleared_keys_get_a_full_burst(self):
+        for _ in range(3):
+            self.buckets.take('bob')
+        self.buckets.clear()
+        self.assertEqual(self.buckets.take('bob'), 0)
+
+    def test_least_recently_seen_keys_are_forgotten(self):
+        self.buckets.take('bob')
+        self.buckets.take('bob')
+        self.buckets.take('alice')
+        self.buckets.take('mary')
+        self.assertEqual(self.buckets.take('bob'), 0)
+
+
+class AdmissionTweenTest(unittest.TestCase):
+    def setUp(self):
+        self.settings = {
+            'cliquet.retry_after_seconds': 30,
+            'readinglist.admission_max_inflight': 10,
+            'readinglist.admission_target_latency': 1,
+            'readinglist.admission_soft_limit': 0.75,
+            'readinglist.admission_max_batch_size': 10,
+            'readinglist.admission_user_rate': 1,
+            'readinglist.admission_user_burst': 2,
+            'readinglist.admission_user_max_size': 100}
+        self.response = Response()
+        self.tween = self.new_tween()
+        patch = mock.patch.object(admission.AdmissionController, 'pressure',
+                                  return_value=0.0)
+        self.pressure = patch.start()
+        self.addCleanup(patch.stop)
+
+    def new_tween(self):
+        registry = mock.Mock(settings=self.settings)
+        return admission.admission_tween_factory(lambda r: self.response,
+                                                 registry)
+
+    def request(self, path='/v2/articles', method='GET', user='bob'):
+        headers = {'Authorization': 'Basic %s' % user}
+        return self.tween(Request.blank(path, method=method,
+                                        headers=headers))
+
+    def test_requests_are_admitted_without_pressure(self):
+        response = self.request()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Backoff', response.headers)
+
+    def test_clients_are_told_to_back_off_under_pressure(self):
+        self.pressure.return_value = 0.8
+        response = self.request('/v2/articles?_since=42')
+        self.assertEqual(response.headers['Backoff'], '30')
+
+    def test_static_backoff_is_kept(self):
+        self.pressure.return_value = 0.8
+        self.response.headers['Backoff'] = '600'
+        response = self.request('/v2/articles/abc', method='PATCH')
+        self.assertEqual(response.headers['Backoff'], '600')
+
+    def test_expensive_requests_are_rejected_under_pressure(self):
+        self.pressure.return_value = 0.8
+        response = self.request('/v2/articles')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '30')
+        self.assertEqual(response.json['errno'], 201)
+
+    def test_requests_are_rate_limited_per_credentials(self):
+        self.request()
+        self.request()
+        response = self.request()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(response.json['errno'], 117)
+        self.assertEqual(self.request(user='alice').status_code, 200)
+
+    def test_anonymous_requests_are_not_rate_limited(self):
+        for _ in range(3):
+            response = self.tween(Request.blank('/v2/'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_rate_limit_can_be_disabled(self):
+        self.settings['readinglist.admission_user_rate'] = 0
+        self.tween = self.new_tween()
+        for _ in range(3):
+            response = self.request()
+        self.assertEqual(response.status_code, 200)
+
+
+class AdmissionTest(BaseWebTest, unittest.TestCase):
+    def get_app_settings(self, additional_settings=None):
+        settings = super(AdmissionTest, self).get_app_settings(
+            additional_settings)
+        settings.update({'readinglist.admission_enabled': 'true'})
+        return settings
+
+    def test_requests_are_processed_without_pressure(self):
+        resp = self.app.get('/articles', headers=self.headers)
+        self.assertNotIn('Backoff', resp.headers)
+
+    def test_requests_are_rejected_at_full_load(self):
+        with mock.patch.object(admission.AdmissionController, 'pressure',
+                               return_value=2):
+            resp = self.app.get('/articles', headers=self.headers,
+                                status=503)
+        self.assertEqual(resp.headers['Retry-After'], '30')
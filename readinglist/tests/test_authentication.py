@@ -0,0 +1,361 @@
+import json
+import sys
+import threading
+import time
+from wsgiref import simple_server
+
+import mock
+from pyramid.request import Request
+
+from cliquet import authentication as cliquet_auth
+from cliquet.errors import ERRORS
+
+from readinglist import authentication
+
+from .support import BaseWebTest, unittest
+
+
+VALID_TOKEN = 'abc'
+USER = '4c9c39c5f6'
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+class QuietHandler(simple_server.WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class StubOAuthServer(object):
+    """Local FxA OAuth server, replying to verifications from ``tokens``
+    (token -> (status, body)). Unknown tokens are invalid.
+    """
+    def __init__(self):
+        self.tokens = {}
+        self.calls = []
+        self.released = threading.Event()
+        self.released.set()
+        self.httpd = simple_server.make_server('127.0.0.1', 0, self.app,
+                                               handler_class=QuietHandler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s' % self.httpd.server_port
+
+    def app(self, environ, start_response):
+        length = int(environ['CONTENT_LENGTH'])
+        token = json.loads(environ['wsgi.input'].read(length))['token']
+        self.calls.append((environ['PATH_INFO'], token))
+        self.released.wait(5)
+
+        invalid = (400, {'code': 400, 'errno': 108,
+                         'message': 'Invalid token'})
+        status, body = self.tokens.get(token, invalid)
+        start_response('%s Status' % status,
+                       [('Content-Type', 'application/json')])
+        return [json.dumps(body).encode('utf-8')]
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class VerifierTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubOAuthServer()
+        self.addCleanup(self.server.stop)
+        self.server.tokens[VALID_TOKEN] = (200, {'user': USER,
+                                                 'client_id': 'abc',
+                                                 'scope': ['readinglist']})
+        self.verifier = authentication.TokenVerifier(
+            self.server.url, scope='readinglist', ttl=300, negative_ttl=60,
+            max_size=3, statsd=mock.Mock())
+
+    def verify_at(self, now, token=VALID_TOKEN):
+        with mock.patch('readinglist.authentication.time.time',
+                        return_value=now):
+            return self.verifier.verify(token)
+
+    def test_user_id_is_returned_for_valid_tokens(self):
+        self.assertEqual(self.verifier.verify(VALID_TOKEN), USER)
+        self.assertEqual(self.server.calls, [('/v1/verify', VALID_TOKEN)])
+
+    def test_version_prefix_is_not_duplicated(self):
+        verifier = authentication.TokenVerifier(
+            self.server.url + '/v1/', scope='readinglist', ttl=300,
+            negative_ttl=60, max_size=3)
+        self.assertEqual(verifier.verify_url, self.server.url + '/v1/verify')
+
+    def test_valid_tokens_are_verified_once(self):
+        self.verifier.verify(VALID_TOKEN)
+        self.assertEqual(self.verifier.verify(VALID_TOKEN), USER)
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_valid_tokens_are_verified_again_after_ttl(self):
+        self.verify_at(1000)
+        self.verify_at(1299)
+        self.assertEqual(len(self.server.calls), 1)
+        self.verify_at(1301)
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_ttl_is_bounded_by_token_expiration(self):
+        self.server.tokens[VALID_TOKEN][1]['exp'] = 1010
+        self.verify_at(1000)
+        self.verify_at(1011)
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_expired_tokens_are_not_remembered(self):
+        self.server.tokens[VALID_TOKEN][1]['exp'] = 900
+        self.verify_at(1000)
+        self.verify_at(1000)
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_invalid_tokens_are_remembered_during_negative_ttl(self):
+        self.assertIsNone(self.verify_at(1000, token='unknown'))
+        self.assertIsNone(self.verify_at(1059, token='unknown'))
+        self.assertEqual(len(self.server.calls), 1)
+        self.verify_at(1061, token='unknown')
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_tokens_must_have_the_scope(self):
+        self.server.tokens['profile'] = (200, {'user': USER,
+                                               'scope': ['profile']})
+        self.assertIsNone(self.verifier.verify('profile'))
+        self.server.tokens['write'] = (200, {'user': USER,
+                                             'scope': ['readinglist:write']})
+        self.assertEqual(self.verifier.verify('write'), USER)
+
+    def test_least_recently_added_tokens_are_forgotten(self):
+        for token in ('a', 'b', 'c', 'd'):
+            self.verifier.verify(token)
+        self.verifier.verify('a')
+        self.assertEqual(len(self.server.calls), 5)
+
+    def test_server_errors_are_raised_and_not_remembered(self):
+        self.server.tokens['error'] = (503, {})
+        for _ in range(2):
+            self.assertRaises(authentication.TokenVerificationError,
+                              self.verifier.verify, 'error')
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_invalid_server_responses_are_raised(self):
+        self.server.tokens['error'] = (200, {'scope': []})
+        self.assertRaises(authentication.TokenVerificationError,
+                          self.verifier.verify, 'error')
+
+    def test_invalid_expirations_are_raised(self):
+        self.server.tokens['error'] = (200, {'user': USER, 'exp': 'soon',
+                                             'scope': ['readinglist']})
+        self.assertRaises(authentication.TokenVerificationError,
+                          self.verifier.verify, 'error')
+
+    def test_unreachable_server_is_raised(self):
+        self.verifier.verify_url = 'http://127.0.0.1:1/v1/verify'
+        self.assertRaises(authentication.TokenVerificationError,
+                          self.verifier.verify, VALID_TOKEN)
+
+    def verify_concurrently(self, token, count=4):
+        self.server.released.clear()
+        results = []
+
+        def verify():
+            try:
+                results.append(self.verifier.verify(token))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=verify) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        # Release the server once every thread awaits the verification.
+        deadline = time.time() + 5
+        while self.verifier.coalesced < count - 1 and \
+                time.time() < deadline:
+            time.sleep(0.001)
+        self.server.released.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_verifications_are_performed_once(self):
+        results = self.verify_concurrently(VALID_TOKEN)
+        self.assertEqual(results, [USER] * 4)
+        self.assertEqual(len(self.server.calls), 1)
+        self.assertEqual((self.verifier.hits, self.verifier.coalesced),
+                         (0, 3))
+
+    def test_concurrent_verifications_share_errors(self):
+        self.server.tokens['error'] = (500, {})
+        results = self.verify_concurrently('error')
+        self.assertEqual(len(self.server.calls), 1)
+        self.assertTrue(all([isinstance(r, Exception) for r in results]))
+
+    def test_concurrent_verifications_share_unexpected_errors(self):
+        with mock.patch.object(self.verifier, '_remember',
+                               side_effect=RuntimeError):
+            results = self.verify_concurrently(VALID_TOKEN)
+        self.assertEqual(len(self.server.calls), 1)
+        self.assertTrue(all([isinstance(r, RuntimeError) for r in results]))
+
+    def test_hits_and_misses_are_counted(self):
+        self.assertEqual(self.verifier.hit_rate, 0.0)
+        for _ in range(4):
+            self.verifier.verify(VALID_TOKEN)
+        self.assertEqual(self.verifier.hit_rate, 0.75)
+        self.verifier.statsd.count.assert_any_call(
+            'authentication.fxa.cache_miss')
+        self.verifier.statsd.count.assert_any_call(
+            'authentication.fxa.cache_hit')
+
+    def test_cleared_tokens_are_verified_again(self):
+        self.verifier.verify(VALID_TOKEN)
+        self.verifier.verify(VALID_TOKEN)
+        self.verifier.clear()
+        self.assertEqual(self.verifier.hit_rate, 0.0)
+        self.verifier.verify(VALID_TOKEN)
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_gevent_events_are_used_if_enabled(self):
+        gevent_mocked = mock.MagicMock()
+        modules = {'gevent': gevent_mocked,
+                   'gevent.event': gevent_mocked.event}
+        self.verifier.gevent_enabled = True
+        with mock.patch.dict(sys.modules, modules):
+            self.verifier.verify(VALID_TOKEN)
+        self.assertTrue(gevent_mocked.event.Event.called)
+
+
+class BasicAuthTest(unittest.TestCase):
+    def setUp(self):
+        self.policy = authentication.BasicAuthAuthenticationPolicy()
+        self.settings = {'cliquet.userid_hmac_secret': 'secret'}
+
+    def request(self, authorization='Basic Ym9iOjE='):
+        request = Request.blank('/', headers={'Authorization':
+                                              authorization})
+        request.registry = mock.Mock(settings=self.settings)
+        return request
+
+    def test_user_id_is_the_one_of_cliquet(self):
+        policy = cliquet_auth.BasicAuthAuthenticationPolicy()
+        expected = policy.unauthenticated_userid(self.request())
+        userid = self.policy.unauthenticated_userid(self.request())
+        self.assertEqual(userid, expected)
+
+    def test_user_id_is_derived_once_per_request(self):
+        request = self.request()
+        with mock.patch('readinglist.authentication.utils.hmac_digest',
+                        wraps=cliquet_auth.utils.hmac_digest) as digest:
+            self.policy.authenticated_userid(request)
+            self.policy.effective_principals(request)
+            self.policy.unauthenticated_userid(request)
+        self.assertEqual(digest.call_count, 1)
+
+    def test_credentials_are_read_once_per_request(self):
+        request = self.request()
+        self.policy.effective_principals(request)
+        with mock.patch.object(self.policy, '_get_credentials') as read:
+            self.policy.authenticated_userid(request)
+            self.assertFalse(read.called)
+
+    def test_user_id_changes_with_secret(self):
+        before = self.policy.unauthenticated_userid(self.request())
+        self.settings['cliquet.userid_hmac_secret'] = 'rotated'
+        after = self.policy.unauthenticated_userid(self.request())
+        self.assertNotEqual(before, after)
+
+    def test_empty_usernames_are_not_authenticated(self):
+        request = self.request('Basic OjE=')
+        self.assertIsNone(self.policy.authenticated_userid(request))
+        self.assertIsNone(self.policy.unauthenticated_userid(self.request('')))
+
+    def test_no_additional_principals_are_given(self):
+        principals = self.policy.effective_principals(self.request())
+        self.assertEqual(len(principals), 3)
+
+
+class LoadFromConfigTest(unittest.TestCase):
+    def load(self, **settings):
+        config = mock.Mock(get_settings=mock.Mock(return_value=settings))
+        return authentication.load_from_config(config)
+
+    def test_verifier_is_disabled_without_oauth_server(self):
+        self.assertIsNone(self.load())
+
+    def test_hits_are_sent_to_statsd_if_configured(self):
+        with mock.patch('readinglist.authentication.statsd') as statsd:
+            verifier = self.load(**{
+                'fxa-oauth.oauth_uri': 'http://oauth',
+                'fxa-oauth.scope': 'readinglist',
+                'fxa-oauth.cache_ttl_seconds': '300',
+                'fxa-oauth.cache_negative_ttl_seconds': '60',
+                'fxa-oauth.cache_max_size': '100',
+                'fxa-oauth.requests_timeout_seconds': '2',
+                'cliquet.statsd_url': 'udp://localhost:8125'})
+        self.assertEqual(verifier.statsd,
+                         statsd.load_from_config.return_value)
+        self.assertEqual(verifier.timeout, 2.0)
+
+
+class FxAAuthenticationTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(FxAAuthenticationTest, self).setUp()
+        self.server = StubOAuthServer()
+        self.addCleanup(self.server.stop)
+        self.server.tokens[VALID_TOKEN] = (200, {'user': USER,
+                                                 'scope': ['readinglist']})
+
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'token_verifier',
+                        registry.token_verifier)
+        registry.token_verifier = authentication.TokenVerifier(
+            self.server.url, scope='readinglist', ttl=300, negative_ttl=60,
+            max_size=100)
+
+    def get(self, token, url='/', status=200):
+        headers = {'Authorization': 'Bearer %s' % token}
+        return self.app.get(url, headers=headers, status=status)
+
+    def test_users_are_authenticated_with_bearer_tokens(self):
+        headers = {'Authorization': 'Bearer %s' % VALID_TOKEN}
+        self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                           headers=headers)
+        storage = self.app.app.registry.storage
+        records, _ = storage.get_all('article', 'fxa:%s' % USER)
+        self.assertEqual(len(records), 1)
+
+    def test_tokens_are_verified_once(self):
+        self.get(VALID_TOKEN, url='/articles')
+        self.get(VALID_TOKEN, url='/articles')
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_invalid_tokens_are_rejected(self):
+        self.get('unknown', url='/articles', status=401)
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_unavailable_server_returns_service_unavailable(self):
+        self.server.tokens['error'] = (500, {})
+        resp = self.get('error', url='/articles', status=503)
+        self.assertEqual(resp.json['errno'], ERRORS.BACKEND)
+
+    def test_other_authorization_types_are_ignored(self):
+        self.app.get('/articles', headers={'Authorization': 'Bearer'},
+                     status=401)
+        self.app.get('/articles', headers=self.headers)
+        self.assertEqual(self.server.calls, [])
+
+    def test_tokens_are_ignored_without_oauth_server(self):
+        self.app.app.registry.token_verifier = None
+        self.get(VALID_TOKEN, url='/articles', status=401)
+
+    def test_tokens_are_neither_remembered_nor_forgotten(self):
+        policy = authentication.FxAAuthenticationPolicy()
+        self.assertEqual(policy.remember(None, USER), [])
+        challenge = dict(policy.forget(None))['WWW-Authenticate']
+        self.assertTrue(challenge.startswith('Bearer'))
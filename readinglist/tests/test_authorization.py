@@ -0,0 +1,73 @@
+import mock
+from pyramid.security import Authenticated, Everyone
+
+from cliquet.authorization import DYNAMIC, PRIVATE
+
+from readinglist.authorization import OwnerOnlyAuthorizationPolicy
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+class OwnerOnlyPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.policy = OwnerOnlyAuthorizationPolicy()
+        self.context = mock.Mock()
+
+    def test_authenticated_users_are_permitted(self):
+        principals = [Everyone, Authenticated, 'basicauth:bob']
+        self.assertTrue(self.policy.permits(self.context, principals,
+                                            PRIVATE))
+
+    def test_anonymous_users_are_not_permitted(self):
+        self.assertFalse(self.policy.permits(self.context, [Everyone],
+                                             PRIVATE))
+
+    def test_other_permissions_are_refused_without_lookup(self):
+        principals = [Everyone, Authenticated]
+        self.assertFalse(self.policy.permits(self.context, principals,
+                                             DYNAMIC))
+        self.assertEqual(self.context.mock_calls, [])
+
+
+class PermissionQueriesTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(PermissionQueriesTest, self).setUp()
+        resp = self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                                  headers=self.headers)
+        self.record_url = '/articles/%s' % resp.json['data']['id']
+
+        # Count every call to the permission backend.
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'permission', registry.permission)
+        registry.permission = mock.Mock(wraps=registry.permission)
+        self.permission = registry.permission
+
+    def test_articles_requests_do_not_query_permissions(self):
+        article = dict(MINIMALIST_ARTICLE, url='http://mozilla.com')
+        self.app.get('/articles', headers=self.headers)
+        self.app.get('/articles?q=mofo', headers=self.headers)
+        self.app.post_json('/articles', {'data': article},
+                           headers=self.headers)
+        self.app.get(self.record_url, headers=self.headers)
+        self.app.patch_json(self.record_url, {'data': {'favorite': True}},
+                            headers=self.headers)
+        self.app.delete(self.record_url, headers=self.headers)
+        self.assertEqual(self.permission.mock_calls, [])
+
+    def test_batch_and_bulk_requests_do_not_query_permissions(self):
+        self.app.post_json('/batch', {'requests': [
+            {'path': '/articles'}, {'path': self.record_url}]},
+            headers=self.headers)
+        export = self.app.get('/articles/export', headers=self.headers)
+        self.app.post('/articles/import', export.body, headers=self.headers)
+        self.assertEqual(self.permission.mock_calls, [])
+
+    def test_anonymous_requests_are_refused(self):
+        self.app.get('/articles', status=401)
+        self.app.get(self.record_url, status=401)
+        self.assertEqual(self.permission.mock_calls, [])
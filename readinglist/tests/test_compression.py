@@ -0,0 +1,161 @@
+import json
+import zlib
+
+import mock
+
+import brotli
+from pyramid.response import Response
+from pyramid.request import Request
+
+from readinglist import compression, DEFAULT_SETTINGS
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS",
+                          excerpt="Lorem ipsum " * 100)
+
+
+def gunzip(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+class GzipTest(unittest.TestCase):
+    def test_compressed_data_can_be_decompressed(self):
+        data = b'abc' * 100
+        compressed = compression.gzip_compress(data, 6)
+        self.assertLess(len(compressed), len(data))
+        self.assertEqual(compression.gzip_decompress(compressed, 1000), data)
+
+    def test_invalid_data_raises_value_error(self):
+        self.assertRaises(ValueError, compression.gzip_decompress,
+                          b'abc', 1000)
+
+    def test_large_data_raises_overflow_error(self):
+        compressed = compression.gzip_compress(b'abc' * 100, 6)
+        self.assertRaises(OverflowError, compression.gzip_decompress,
+                          compressed, 299)
+
+
+class CompressionTweenTest(unittest.TestCase):
+    def setUp(self):
+        self.response = Response(b'a' * 2000, content_type='application/json')
+        registry = mock.Mock(settings=DEFAULT_SETTINGS, response_cache=None)
+        self.tween = compression.compression_tween_factory(
+            lambda request: self.response, registry)
+        self.request = Request.blank('/', headers={'Accept-Encoding': 'gzip'})
+
+    def test_encoded_responses_are_left_untouched(self):
+        self.response.content_encoding = 'deflate'
+        response = self.tween(self.request)
+        self.assertEqual(response.body, b'a' * 2000)
+
+    def test_vary_header_is_not_duplicated(self):
+        self.response.vary = ('Accept-Encoding',)
+        response = self.tween(self.request)
+        self.assertEqual(response.vary, ('Accept-Encoding',))
+
+
+class CompressionTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(CompressionTest, self).setUp()
+        self.app.app.registry.response_cache.flush()
+        for i in range(3):
+            data = MINIMALIST_ARTICLE.copy()
+            data['url'] += '-%s' % i
+            self.app.post_json('/articles', {'data': data},
+                               headers=self.headers)
+
+    def get(self, url='/articles', encoding='gzip', status=200):
+        # WebTest decodes responses, use the application directly.
+        headers = self.headers.copy()
+        if encoding is not None:
+            headers['Accept-Encoding'] = encoding
+        request = self.app.RequestClass.blank(url, headers=headers)
+        response = request.get_response(self.app.app)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_responses_are_gzipped_if_accepted(self):
+        resp = self.get(encoding='gzip, deflate')
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertIn(b'Lorem ipsum', gunzip(resp.body))
+
+    def test_responses_are_brotli_compressed_if_accepted(self):
+        resp = self.get(encoding='gzip, br')
+        self.assertEqual(resp.headers['Content-Encoding'], 'br')
+        self.assertIn(b'Lorem ipsum', brotli.decompress(resp.body))
+
+    def test_responses_vary_on_accept_encoding(self):
+        resp = self.get(encoding=None)
+        self.assertIn('Accept-Encoding', resp.headers['Vary'])
+        self.assertNotIn('Content-Encoding', resp.headers)
+
+    def test_refused_encodings_are_not_used(self):
+        resp = self.get(encoding='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', resp.headers)
+
+    def test_small_responses_are_not_compressed(self):
+        resp = self.get('/', encoding='gzip')
+        self.assertNotIn('Content-Encoding', resp.headers)
+
+    def test_errors_are_not_compressed(self):
+        resp = self.get('/articles/unknown', status=400)
+        self.assertNotIn('Content-Encoding', resp.headers)
+
+    def test_compressed_lists_are_served_from_response_cache(self):
+        first = self.get()
+        with mock.patch.object(compression, 'gzip_compress') as compress:
+            second = self.get()
+            self.assertFalse(compress.called)
+        self.assertEqual(first.body, second.body)
+
+    def test_compressed_lists_are_specific_to_encoding(self):
+        self.get(encoding='gzip')
+        resp = self.get(encoding='br')
+        self.assertIn(b'Lorem ipsum', brotli.decompress(resp.body))
+
+    def test_responses_are_compressed_without_response_cache(self):
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'response_cache',
+                        registry.response_cache)
+        registry.response_cache = None
+        resp = self.get()
+        self.assertIn(b'Lorem ipsum', gunzip(resp.body))
+
+
+class RequestDecompressionTest(BaseWebTest, unittest.TestCase):
+    def post(self, body, url='/articles', status=201):
+        headers = self.headers.copy()
+        headers['Content-Encoding'] = 'gzip'
+        headers['Content-Type'] = 'application/json'
+        return self.app.post(url, body, headers=headers, status=status)
+
+    def test_gzipped_bodies_are_accepted(self):
+        body = compression.gzip_compress(
+            b'{"data": {"url": "http://mozilla.org", "added_by": "FxOS",'
+            b' "title": "MoFo"}}', 6)
+        resp = self.post(body)
+        self.assertEqual(resp.json['data']['title'], 'MoFo')
+
+    def test_gzipped_batch_requests_are_accepted(self):
+        requests = [{'method': 'POST', 'path': '/articles',
+                     'body': {'data': dict(MINIMALIST_ARTICLE,
+                                           url='http://%s.org' % i)}}
+                    for i in range(25)]
+        body = json.dumps({'requests': requests}).encode('utf-8')
+        resp = self.post(compression.gzip_compress(body, 6), url='/batch',
+                         status=200)
+        statuses = [r['status'] for r in resp.json['responses']]
+        self.assertEqual(statuses, [201] * 25)
+
+    def test_invalid_gzip_bodies_are_rejected(self):
+        resp = self.post(b'not gzip', status=400)
+        self.assertEqual(resp.json['errno'], 109)
+
+    def test_too_large_bodies_are_rejected(self):
+        body = compression.gzip_compress(b' ' * (10 * 1024 * 1024 + 1), 6)
+        resp = self.post(body, status=413)
+        self.assertEqual(resp.json['errno'], 113)
@@ -0,0 +1,249 @@
+import time
+
+import mock
+from pyramid.httpexceptions import HTTPServiceUnavailable
+
+from cliquet.storage.exceptions import BackendError, RecordNotFoundError
+from cliquet.utils import psycopg2
+
+from readinglist import authentication, degraded
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = degraded.CircuitBreaker(failure_threshold=2,
+                                               reset_timeout=10)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.breaker.failed()
+        self.breaker.succeeded()
+        self.breaker.failed()
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.failed()
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_one_probe_at_a_time_is_allowed_once_half_open(self):
+        self.breaker.failed()
+        self.breaker.failed()
+        self.breaker.opened_at -= 10
+        self.assertEqual(self.breaker.state, self.breaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_probe_closes_circuit(self):
+        self.breaker.failed()
+        self.breaker.failed()
+        self.breaker.opened_at -= 10
+        self.breaker.allow()
+        self.breaker.succeeded()
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_released_probe_allows_another_one(self):
+        self.breaker.failed()
+        self.breaker.failed()
+        self.breaker.opened_at -= 10
+        self.breaker.allow()
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+
+    def test_probes_are_given_up_after_reset_timeout(self):
+        self.breaker.failed()
+        self.breaker.failed()
+        self.breaker.opened_at -= 10
+        self.breaker.allow()
+        self.breaker._probe_started_at -= 10
+        self.assertTrue(self.breaker.allow())
+
+    def test_reset_closes_circuit(self):
+        self.breaker.failed()
+        self.breaker.failed()
+        self.breaker.reset()
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_failed_probe_opens_circuit_again(self):
+        self.breaker.failed()
+        self.breaker.failed()
+        self.breaker.opened_at -= 10
+        self.breaker.allow()
+        self.breaker.failed()
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+
+
+class BreakerStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = mock.Mock(pool='pool')
+        self.breaker = degraded.CircuitBreaker(failure_threshold=1,
+                                               reset_timeout=10)
+        self.storage = degraded.BreakerStorage(self.backend, self.breaker)
+
+    def test_calls_are_forwarded_while_closed(self):
+        self.backend.get.return_value = {'id': 1}
+        self.assertEqual(self.storage.get('article', 'bob', 1), {'id': 1})
+        self.assertEqual(self.storage.pool, 'pool')
+
+    def test_unavailable_storage_opens_circuit(self):
+        error = BackendError(original=psycopg2.OperationalError('down'))
+        self.backend.get.side_effect = error
+        self.assertRaises(BackendError, self.storage.get)
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+
+    def test_calls_fail_fast_while_open(self):
+        self.breaker.failed()
+        with self.assertRaises(BackendError) as cm:
+            self.storage.get()
+        self.assertIsInstance(cm.exception.original,
+                              degraded.CircuitOpenError)
+        self.assertFalse(self.backend.get.called)
+
+    def test_other_errors_do_not_open_circuit(self):
+        for error in (BackendError(original=psycopg2.IntegrityError()),
+                      RecordNotFoundError()):
+            self.backend.get.side_effect = error
+            self.assertRaises(type(error), self.storage.get)
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+
+    def test_generators_record_outcome_while_consumed(self):
+        def records():
+            yield {'id': 1}
+            raise BackendError(original=psycopg2.OperationalError('down'))
+
+        self.backend.iter_records.side_effect = lambda: records()
+        iterator = self.storage.iter_records()
+        self.assertEqual(next(iterator), {'id': 1})
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+        self.assertRaises(BackendError, next, iterator)
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+
+    def test_consumed_generators_close_half_open_circuit(self):
+        self.breaker.failed()
+        self.breaker.opened_at -= 10
+        self.backend.iter_records.side_effect = lambda: (r for r in [{}])
+        iterator = self.storage.iter_records()
+        self.assertEqual(self.breaker.state, self.breaker.HALF_OPEN)
+        self.assertEqual(list(iterator), [{}])
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+
+    def half_open(self):
+        self.breaker.failed()
+        self.breaker.opened_at -= 10
+        self.assertEqual(self.breaker.state, self.breaker.HALF_OPEN)
+
+    def test_abandoned_generators_release_probe(self):
+        self.half_open()
+        self.backend.iter_records.side_effect = lambda: (r for r in [{}, {}])
+        iterator = self.storage.iter_records()
+        next(iterator)
+        iterator.close()
+        self.assertTrue(self.breaker.allow())
+
+    def test_interrupted_calls_release_probe(self):
+        self.half_open()
+        self.backend.get.side_effect = KeyboardInterrupt
+        self.assertRaises(KeyboardInterrupt, self.storage.get)
+        self.assertTrue(self.breaker.allow())
+
+    def test_interrupted_generators_release_probe(self):
+        def records():
+            yield {}
+            raise KeyboardInterrupt
+
+        self.half_open()
+        self.backend.iter_records.side_effect = lambda: records()
+        iterator = self.storage.iter_records()
+        next(iterator)
+        self.assertRaises(KeyboardInterrupt, next, iterator)
+        self.assertTrue(self.breaker.allow())
+
+    def test_health_checks_reach_storage_while_open(self):
+        self.breaker.failed()
+        self.storage.ping(None)
+        self.assertTrue(self.backend.ping.called)
+
+
+class DegradedTest(BaseWebTest, unittest.TestCase):
+    def get_app_settings(self, additional_settings=None):
+        settings = super(DegradedTest, self).get_app_settings(
+            additional_settings)
+        settings.update({'readinglist.degraded_enabled': 'true'})
+        return settings
+
+    def setUp(self):
+        super(DegradedTest, self).setUp()
+        self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                           headers=self.headers)
+        self.breaker = self.app.app.registry.storage.breaker
+
+    def open_circuit(self):
+        for _ in range(self.breaker.failure_threshold):
+            self.breaker.failed()
+
+    def test_lists_are_served_from_snapshots_while_open(self):
+        resp = self.app.get('/articles?unread=true', headers=self.headers)
+        self.open_circuit()
+        snapshot = self.app.get('/articles?unread=true', headers=self.headers)
+        self.assertEqual(snapshot.json, resp.json)
+        self.assertEqual(snapshot.headers['ETag'], resp.headers['ETag'])
+        self.assertEqual(snapshot.headers['Total-Records'], '1')
+        self.assertEqual(snapshot.headers['Age'], '0')
+        self.assertIn('110', snapshot.headers['Warning'])
+
+    def test_snapshots_answer_conditional_requests(self):
+        resp = self.app.get('/articles', headers=self.headers)
+        self.open_circuit()
+        headers = self.headers.copy()
+        headers['If-None-Match'] = resp.headers['ETag']
+        self.app.get('/articles', headers=headers, status=304)
+
+    def test_snapshots_are_specific_to_credentials_and_query(self):
+        self.app.get('/articles', headers=self.headers)
+        self.open_circuit()
+        self.app.get('/articles?_since=1', headers=self.headers, status=503)
+        headers = self.headers.copy()
+        headers['Authorization'] = 'Basic YWxpY2U6'
+        self.app.get('/articles', headers=headers, status=503)
+
+    def test_revoked_credentials_get_no_snapshot(self):
+        self.app.get('/articles', headers=self.headers)
+        self.open_circuit()
+        policy = authentication.BasicAuthAuthenticationPolicy
+        with mock.patch.object(policy, 'unauthenticated_userid',
+                               return_value=None):
+            self.app.get('/articles', headers=self.headers, status=401)
+
+    def test_authentication_errors_are_left_to_the_application(self):
+        self.open_circuit()
+        policy = authentication.BasicAuthAuthenticationPolicy
+        with mock.patch.object(policy, 'unauthenticated_userid',
+                               side_effect=HTTPServiceUnavailable):
+            self.app.get('/articles', headers=self.headers, status=503)
+
+    def test_old_snapshots_are_not_served(self):
+        with mock.patch('readinglist.degraded.time.time',
+                        return_value=time.time() - 3600):
+            self.app.get('/articles', headers=self.headers)
+        self.open_circuit()
+        self.app.get('/articles', headers=self.headers, status=503)
+
+    def test_writes_are_rejected_while_open(self):
+        self.open_circuit()
+        resp = self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                                  headers=self.headers, status=503)
+        self.assertIn('Retry-After', resp.headers)
+
+    def test_circuit_closes_after_successful_probe(self):
+        self.open_circuit()
+        self.breaker.opened_at -= self.breaker.reset_timeout
+        self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                           headers=self.headers, status=200)
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
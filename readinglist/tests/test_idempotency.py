@@ -0,0 +1,183 @@
+import sys
+import threading
+import uuid
+
+import mock
+from pyramid.request import Request
+from pyramid.response import Response
+
+from cliquet.cache.memory import Memory
+from cliquet.utils import json
+
+from readinglist import idempotency
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+class IdempotentRequestsTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = Memory()
+        self.requests = idempotency.IdempotentRequests(self.cache, ttl=60)
+        self.handler = mock.Mock(side_effect=self.respond)
+
+    def respond(self, request):
+        return Response(json_body={'id': 1}, status=201)
+
+    def process(self, body=b'{}', key='abc', user='bob'):
+        request = Request.blank('/v2/articles', method='POST', body=body,
+                                headers={'Authorization': 'Basic %s' % user})
+        return self.requests.process(request, self.handler, key)
+
+    def test_responses_are_replayed(self):
+        first = self.process()
+        second = self.process()
+        self.assertEqual(self.handler.call_count, 1)
+        self.assertEqual(second.status, '201 Created')
+        self.assertEqual(second.json, first.json)
+        self.assertEqual(second.content_type, 'application/json')
+        self.assertEqual(second.headers[idempotency.REPLAYED_HEADER], 'true')
+        self.assertNotIn(idempotency.REPLAYED_HEADER, first.headers)
+
+    def test_responses_are_not_replayed_for_other_credentials_or_keys(self):
+        self.process()
+        self.process(user='alice')
+        self.process(key='def')
+        self.assertEqual(self.handler.call_count, 3)
+
+    def test_keys_can_be_unicode(self):
+        self.process(key=u'cl\xe9')
+        self.process(key=u'cl\xe9')
+        self.assertEqual(self.handler.call_count, 1)
+
+    def test_keys_cannot_be_used_for_other_requests(self):
+        self.process()
+        response = self.process(body=b'{"title": "other"}')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.handler.call_count, 1)
+
+    def test_errors_are_not_replayed(self):
+        self.handler.side_effect = lambda r: Response(status=400)
+        self.process()
+        self.process()
+        self.assertEqual(self.handler.call_count, 2)
+
+    def test_streamed_responses_are_not_replayed(self):
+        self.handler.side_effect = lambda r: Response(
+            app_iter=iter([b'{}']), content_type='application/json')
+        self.process()
+        self.process()
+        self.assertEqual(self.handler.call_count, 2)
+
+    def test_failed_requests_can_be_retried(self):
+        self.handler.side_effect = ValueError
+        self.assertRaises(ValueError, self.process)
+        self.handler.side_effect = self.respond
+        self.assertEqual(self.process().status_code, 201)
+
+    def test_requests_in_progress_in_other_processes_are_rejected(self):
+        def other_process(request):
+            response = self.process()
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.headers['Retry-After'], '1')
+            return self.respond(request)
+
+        other = idempotency.IdempotentRequests(self.cache, ttl=60)
+        request = Request.blank('/v2/articles', method='POST', body=b'{}',
+                                headers={'Authorization': 'Basic bob'})
+        other.process(request, other_process, 'abc')
+        self.assertEqual(self.handler.call_count, 0)
+
+    def test_requests_are_processed_if_pending_marker_expired_meanwhile(self):
+        with mock.patch.object(idempotency.cache_module, 'add',
+                               side_effect=[False, True]) as add:
+            self.assertEqual(self.process().status_code, 201)
+        self.assertEqual(add.call_count, 2)
+        self.assertEqual(self.handler.call_count, 1)
+
+    def test_concurrent_requests_are_processed_once(self):
+        started = threading.Event()
+        proceed = threading.Event()
+
+        def slow(request):
+            started.set()
+            proceed.wait()
+            return self.respond(request)
+
+        self.handler.side_effect = slow
+        responses = []
+        threads = [threading.Thread(
+            target=lambda: responses.append(self.process()))
+            for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        proceed.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.handler.call_count, 1)
+        self.assertEqual(sorted([r.status_code for r in responses]),
+                         [201, 201, 201])
+
+    def test_gevent_events_are_used_if_enabled(self):
+        gevent_mocked = mock.MagicMock()
+        modules = {'gevent': gevent_mocked,
+                   'gevent.event': gevent_mocked.event}
+        self.requests.gevent_enabled = True
+        with mock.patch.dict(sys.modules, modules):
+            self.process()
+        self.assertTrue(gevent_mocked.event.Event.called)
+
+
+class IdempotencyTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(IdempotencyTest, self).setUp()
+        self.key_headers = self.headers.copy()
+        self.key_headers[idempotency.KEY_HEADER] = str(uuid.uuid4())
+
+    def test_retried_creations_are_not_processed_again(self):
+        first = self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                                   headers=self.key_headers, status=201)
+        with mock.patch.object(self.app.app.registry, 'storage') as storage:
+            second = self.app.post_json('/articles',
+                                        {'data': MINIMALIST_ARTICLE},
+                                        headers=self.key_headers,
+                                        status=201)
+        self.assertFalse(storage.mock_calls)
+        self.assertEqual(second.json, first.json)
+        self.assertEqual(second.headers[idempotency.REPLAYED_HEADER], 'true')
+
+    def test_retried_batches_are_not_processed_again(self):
+        body = {'requests': [{'method': 'POST', 'path': '/articles',
+                              'body': {'data': MINIMALIST_ARTICLE}}]}
+        first = self.app.post_json('/batch', body, headers=self.key_headers)
+        second = self.app.post_json('/batch', body, headers=self.key_headers)
+        self.assertEqual(second.json, first.json)
+        resp = self.app.get('/articles', headers=self.headers)
+        self.assertEqual(len(resp.json['data']), 1)
+
+    def test_requests_without_key_are_processed(self):
+        self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                           headers=self.headers, status=201)
+        self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                           headers=self.headers, status=200)
+
+    def test_other_methods_are_not_replayed(self):
+        resp = self.app.get('/articles', headers=self.key_headers)
+        resp = self.app.get('/articles', headers=self.key_headers)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, resp.headers)
+
+    def test_unauthenticated_requests_are_not_replayed(self):
+        headers = {idempotency.KEY_HEADER: 'abc'}
+        self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                           headers=headers, status=401)
+
+    def test_keys_are_limited_in_length(self):
+        self.key_headers[idempotency.KEY_HEADER] = 'a' * 256
+        resp = self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                                  headers=self.key_headers, status=400)
+        self.assertEqual(json.loads(resp.body)['errno'], 107)
@@ -0,0 +1,240 @@
+import time
+
+import mock
+from pyramid.config import Configurator
+
+from cliquet.storage import memory
+
+from readinglist import bus, invalidation
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+class LocalBus(bus.LocalBus):
+    connection_id = 0
+
+
+class CollectionTimestampsTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = LocalBus()
+        self.timestamps = self.new_timestamps()
+        self.other = self.new_timestamps()
+
+    def new_timestamps(self, **kwargs):
+        params = dict(max_size=10, ttl=60, fallback_ttl=0)
+        params.update(kwargs)
+        return invalidation.CollectionTimestamps(self.bus, **params)
+
+    def test_unknown_timestamps_are_none(self):
+        self.assertIsNone(self.timestamps.get('article', 'bob'))
+
+    def test_timestamps_are_kept_in_memory(self):
+        self.timestamps.set('article', 'bob', 42, read_on=time.time())
+        self.assertEqual(self.timestamps.get('article', 'bob'), 42)
+        self.assertIsNone(self.timestamps.get('article', 'alice'))
+
+    def test_changes_evict_timestamps_of_every_process(self):
+        for timestamps in (self.timestamps, self.other):
+            timestamps.set('article', 'bob', 42, read_on=time.time())
+            timestamps.set('article', 'alice', 43, read_on=time.time())
+        self.timestamps.changed([('article', 'bob', 44)])
+        for timestamps in (self.timestamps, self.other):
+            self.assertIsNone(timestamps.get('article', 'bob'))
+            self.assertEqual(timestamps.get('article', 'alice'), 43)
+
+    def test_own_changes_are_not_evicted_twice(self):
+        with mock.patch.object(self.bus, 'publish') as publish:
+            self.timestamps.changed([('article', 'bob', 44)])
+        self.timestamps.set('article', 'bob', 44, read_on=time.time())
+        channel, message = publish.call_args[0]
+        self.bus.publish(channel, message)
+        self.assertEqual(self.timestamps.get('article', 'bob'), 44)
+        self.assertIsNone(self.other.get('article', 'bob'))
+
+    def test_no_changes_are_not_announced(self):
+        with mock.patch.object(self.bus, 'publish') as publish:
+            self.timestamps.changed([])
+        self.assertFalse(publish.called)
+
+    def test_timestamps_read_before_a_change_are_not_kept(self):
+        read_on = time.time()
+        self.other.changed([('article', 'bob', 44)])
+        self.timestamps.set('article', 'bob', 42, read_on=read_on)
+        self.assertIsNone(self.timestamps.get('article', 'bob'))
+        self.timestamps.set('article', 'bob', 44, read_on=time.time())
+        self.assertEqual(self.timestamps.get('article', 'bob'), 44)
+
+    def test_timestamps_are_kept_until_ttl(self):
+        timestamps = self.new_timestamps(ttl=0.01)
+        timestamps.set('article', 'bob', 42, read_on=time.time())
+        time.sleep(0.02)
+        self.assertIsNone(timestamps.get('article', 'bob'))
+
+    def test_timestamps_are_kept_until_fallback_ttl_if_disconnected(self):
+        timestamps = self.new_timestamps(fallback_ttl=0.05)
+        timestamps.set('article', 'bob', 42, read_on=time.time())
+        self.bus.connection_id = None
+        self.assertEqual(timestamps.get('article', 'bob'), 42)
+        time.sleep(0.06)
+        self.assertIsNone(timestamps.get('article', 'bob'))
+
+    def test_timestamps_read_before_a_reconnection_use_fallback_ttl(self):
+        self.timestamps.set('article', 'bob', 42, read_on=time.time())
+        self.bus.connection_id = 1
+        self.assertIsNone(self.timestamps.get('article', 'bob'))
+        self.timestamps.set('article', 'bob', 42, read_on=time.time())
+        self.assertEqual(self.timestamps.get('article', 'bob'), 42)
+
+    def test_least_recently_stored_timestamps_are_evicted(self):
+        timestamps = self.new_timestamps(max_size=2)
+        for parent_id in ('a', 'b', 'c'):
+            timestamps.set('article', parent_id, 42, read_on=time.time())
+        self.assertIsNone(timestamps.get('article', 'a'))
+        self.assertEqual(timestamps.get('article', 'c'), 42)
+
+    def test_clear_forgets_every_timestamp(self):
+        self.timestamps.set('article', 'bob', 42, read_on=time.time())
+        self.timestamps.clear()
+        self.assertIsNone(self.timestamps.get('article', 'bob'))
+
+
+class InvalidatingStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = LocalBus()
+        self.backend = mock.Mock(wraps=memory.Memory())
+        self.storage = self.new_storage()
+        self.other = self.new_storage()
+        self.kw = dict(collection_id='article', parent_id='bob')
+
+    def new_storage(self):
+        timestamps = invalidation.CollectionTimestamps(
+            self.bus, max_size=10, ttl=60, fallback_ttl=0)
+        return invalidation.InvalidatingStorage(self.backend, timestamps)
+
+    def read_timestamps(self):
+        for storage in (self.storage, self.other):
+            storage.collection_timestamp(**self.kw)
+
+    def assert_timestamps_are_evicted(self):
+        calls = self.backend.collection_timestamp.call_count
+        current = self.backend.collection_timestamp(**self.kw)
+        for storage in (self.storage, self.other):
+            self.assertEqual(storage.collection_timestamp(**self.kw),
+                             current)
+        self.assertEqual(self.backend.collection_timestamp.call_count,
+                         calls + 3)
+
+    def test_collection_timestamps_are_read_once(self):
+        first = self.storage.collection_timestamp(**self.kw)
+        self.assertEqual(self.storage.collection_timestamp(**self.kw), first)
+        self.assertEqual(self.backend.collection_timestamp.call_count, 1)
+
+    def test_other_calls_are_sent_to_the_storage(self):
+        self.storage.get_all(**self.kw)
+        self.assertTrue(self.backend.get_all.called)
+
+    def test_creations_evict_collection_timestamps(self):
+        self.read_timestamps()
+        self.storage.create(record={'title': 'a'}, **self.kw)
+        self.assert_timestamps_are_evicted()
+
+    def test_updates_evict_collection_timestamps(self):
+        record = self.storage.create(record={'title': 'a'}, **self.kw)
+        self.read_timestamps()
+        self.storage.update(object_id=record['id'], record={'title': 'b'},
+                            **self.kw)
+        self.assert_timestamps_are_evicted()
+
+    def test_deletions_evict_collection_timestamps(self):
+        record = self.storage.create(record={'title': 'a'}, **self.kw)
+        self.read_timestamps()
+        self.storage.delete(object_id=record['id'], **self.kw)
+        self.assert_timestamps_are_evicted()
+
+    def test_collection_deletions_evict_collection_timestamps(self):
+        self.storage.create(record={'title': 'a'}, **self.kw)
+        self.read_timestamps()
+        self.storage.delete_all(**self.kw)
+        self.assert_timestamps_are_evicted()
+
+    def test_empty_collection_deletions_are_not_announced(self):
+        with mock.patch.object(self.bus, 'publish') as publish:
+            self.storage.delete_all(**self.kw)
+        self.assertFalse(publish.called)
+
+    def test_imports_evict_collection_timestamps(self):
+        self.backend.create_many = mock.Mock(return_value=[
+            ({'id': 'a', 'last_modified': 42}, True),
+            ({'id': 'b', 'last_modified': 41}, False)])
+        with mock.patch.object(self.bus, 'publish') as publish:
+            self.storage.create_many(records=[{}, {}], **self.kw)
+        self.assertIn('"events":[["article","bob",42]]',
+                      publish.call_args[0][1].replace(' ', ''))
+
+    def test_imports_of_existing_records_are_not_announced(self):
+        self.backend.create_many = mock.Mock(return_value=[
+            ({'id': 'a', 'last_modified': 42}, False)])
+        with mock.patch.object(self.bus, 'publish') as publish:
+            self.storage.create_many(records=[{}], **self.kw)
+        self.assertFalse(publish.called)
+
+    def test_purges_evict_collection_timestamps(self):
+        self.backend.purge = mock.Mock()
+        self.read_timestamps()
+        self.storage.purge(**self.kw)
+        self.assert_timestamps_are_evicted()
+
+    def test_flush_forgets_collection_timestamps(self):
+        self.storage.collection_timestamp(**self.kw)
+        self.storage.flush()
+        self.storage.collection_timestamp(**self.kw)
+        self.assertEqual(self.backend.collection_timestamp.call_count, 2)
+
+
+class LoadFromConfigTest(unittest.TestCase):
+    def new_config(self, enabled):
+        config = Configurator(settings={
+            'readinglist.bus_url': '',
+            'readinglist.timestamps_cache_enabled': enabled,
+            'readinglist.timestamps_cache_max_size': 10,
+            'readinglist.timestamps_cache_ttl': 60,
+            'readinglist.timestamps_cache_fallback_ttl': 1})
+        config.registry.storage = mock.sentinel.storage
+        return config
+
+    def test_storage_is_left_as_is_if_disabled(self):
+        storage = invalidation.load_from_config(self.new_config('false'))
+        self.assertEqual(storage, mock.sentinel.storage)
+
+    def test_storage_is_wrapped_if_enabled(self):
+        storage = invalidation.load_from_config(self.new_config('true'))
+        self.assertEqual(storage.storage, mock.sentinel.storage)
+        self.assertEqual(storage.timestamps.fallback_ttl, 1)
+
+
+class TimestampsQueriesTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(TimestampsQueriesTest, self).setUp()
+        storage = self.app.app.registry.storage
+        self.addCleanup(setattr, storage, 'storage', storage.storage)
+        storage.storage = mock.Mock(wraps=storage.storage)
+        self.backend = storage.storage
+
+    def test_collection_timestamp_is_read_once_per_process(self):
+        self.app.get('/articles', headers=self.headers)
+        self.app.get('/articles', headers=self.headers)
+        self.assertEqual(self.backend.collection_timestamp.call_count, 1)
+
+    def test_changes_are_visible_on_next_request(self):
+        resp = self.app.get('/articles', headers=self.headers)
+        etag = resp.headers['ETag']
+        self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                           headers=self.headers)
+        resp = self.app.get('/articles', headers=self.headers)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+        self.assertEqual(len(resp.json['data']), 1)
@@ -0,0 +1,215 @@
+import logging
+import logging.config
+import os
+import tempfile
+import threading
+
+import mock
+import six
+import structlog
+from six.moves import queue
+
+from readinglist import logs
+
+from .support import unittest
+
+
+def new_record(msg, *args, **kwargs):
+    return logging.makeLogRecord(dict(name='readinglist', msg=msg, args=args,
+                                      levelno=kwargs.get('level',
+                                                         logging.INFO)))
+
+
+class QueueHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = six.StringIO()
+        self.target = logging.StreamHandler(self.stream)
+        self.target.setFormatter(logging.Formatter('%(message)s'))
+        self.handler = logs.QueueHandler(max_size=2, batch_size=10,
+                                         target=self.target)
+        self.addCleanup(self.handler.close)
+
+    def without_writer(self):
+        # Records stay in the queue until flushed.
+        self.handler._pid = os.getpid()
+        self.handler._queue = queue.Queue(maxsize=self.handler.max_size)
+        self.handler._thread = threading.Thread(target=lambda: None)
+
+    def test_records_are_written_by_background_thread(self):
+        self.handler.handle(new_record('hello %s', 'bob'))
+        self.handler.close()
+        self.assertEqual(self.stream.getvalue(), 'hello bob\n')
+        self.assertFalse(self.handler._thread.is_alive())
+
+    def test_arguments_are_merged_before_queuing(self):
+        self.without_writer()
+        data = {'name': 'bob'}
+        record = new_record('hello %(name)s')
+        record.args = data
+        self.handler.handle(record)
+        data['name'] = 'alice'
+        self.handler.flush()
+        self.assertEqual(self.stream.getvalue(), 'hello bob\n')
+
+    def test_arguments_are_copied_for_other_targets(self):
+        self.handler.target = logging.Handler()
+        data = {'name': 'bob'}
+        record = new_record('hello %(name)s')
+        record.args = data
+        self.handler.prepare(record)
+        data['name'] = 'alice'
+        self.assertEqual(record.msg, 'hello %(name)s')
+        self.assertEqual(record.args, {'name': 'bob'})
+        record = self.handler.prepare(new_record('hello %s', 'bob'))
+        self.assertEqual((record.msg, record.args), ('hello %s', ('bob',)))
+        record = self.handler.prepare(new_record('hello'))
+        self.assertEqual((record.msg, record.args), ('hello', ()))
+
+    def test_batches_are_written_and_flushed_at_once(self):
+        self.without_writer()
+        self.handler.handle(new_record('a'))
+        self.handler.handle(new_record('b'))
+        with mock.patch.object(self.target, 'flush') as flush:
+            self.handler.flush()
+        self.assertEqual(self.stream.getvalue(), 'a\nb\n')
+        self.assertEqual(flush.call_count, 1)
+
+    def test_records_are_dropped_and_counted_when_full(self):
+        self.without_writer()
+        for msg in ('a', 'b', 'c', 'd'):
+            self.handler.handle(new_record(msg))
+        self.assertEqual(self.handler.dropped, 2)
+        self.handler.flush()
+        self.assertEqual(self.stream.getvalue(),
+                         'a\nb\n2 log records dropped\n')
+        self.handler.flush()
+        self.assertEqual(self.stream.getvalue(),
+                         'a\nb\n2 log records dropped\n')
+
+    def test_records_below_target_level_are_skipped(self):
+        self.without_writer()
+        self.target.setLevel(logging.WARNING)
+        self.handler.handle(new_record('a'))
+        self.handler.handle(new_record('b', level=logging.ERROR))
+        self.handler.flush()
+        self.assertEqual(self.stream.getvalue(), 'b\n')
+
+    def test_other_targets_handle_each_record(self):
+        self.without_writer()
+        target = mock.Mock(level=logging.NOTSET)
+        self.handler.setTarget(target)
+        self.handler.handle(new_record('a'))
+        self.handler.handle(new_record('b'))
+        self.handler.flush()
+        self.assertEqual(target.handle.call_count, 2)
+
+    def test_records_are_discarded_without_target(self):
+        self.without_writer()
+        self.handler.setTarget(None)
+        self.handler.handle(new_record('a'))
+        self.handler.flush()
+        self.assertEqual(self.handler._queue.qsize(), 0)
+
+    def test_a_new_thread_is_started_after_fork(self):
+        self.handler.handle(new_record('a'))
+        thread = self.handler._thread
+        self.handler._pid = -1
+        self.handler.handle(new_record('b'))
+        self.assertIsNot(self.handler._thread, thread)
+        self.handler.close()
+        self.assertIn('b\n', self.stream.getvalue())
+
+    def test_thread_is_started_once(self):
+        self.handler._start()
+        thread = self.handler._thread
+        self.handler._start()
+        self.assertIs(self.handler._thread, thread)
+
+    def test_invalid_records_are_reported(self):
+        self.without_writer()
+        with mock.patch.object(self.handler, 'handleError') as handle_error:
+            self.handler.handle(new_record('%s %s', 'a'))
+        self.assertTrue(handle_error.called)
+
+    def test_formatting_errors_are_reported(self):
+        self.without_writer()
+        self.handler.handle(new_record('a'))
+        with mock.patch.object(self.target, 'format',
+                               side_effect=ValueError), \
+                mock.patch.object(self.target, 'handleError') as handle_error:
+            self.handler.flush()
+        self.assertTrue(handle_error.called)
+
+    def test_stream_errors_are_reported(self):
+        self.without_writer()
+        self.handler.handle(new_record('a'))
+        self.target.stream = mock.Mock(write=mock.Mock(side_effect=IOError))
+        with mock.patch.object(self.target, 'handleError') as handle_error:
+            self.handler.flush()
+        self.assertTrue(handle_error.called)
+
+    def test_unicode_is_encoded_for_byte_streams(self):
+        self.without_writer()
+        written = []
+
+        def write(text):
+            if isinstance(text, six.text_type):
+                raise UnicodeEncodeError('ascii', text, 0, 1, 'ouch')
+            written.append(text)
+
+        self.target.stream = mock.Mock(write=write, encoding=None)
+        self.handler.handle(new_record(u'caf\xe9'))
+        self.handler.flush()
+        self.assertEqual(written, [u'caf\xe9\n'.encode('utf-8')])
+
+    def test_target_is_set_in_logging_configuration(self):
+        config = tempfile.NamedTemporaryFile(mode='w', suffix='.ini')
+        self.addCleanup(config.close)
+        config.write('\n'.join([
+            '[loggers]', 'keys = root',
+            '[handlers]', 'keys = console, queue',
+            '[formatters]', 'keys =',
+            '[logger_root]', 'handlers = queue',
+            '[handler_console]', 'class = StreamHandler',
+            'args = (sys.stdout,)',
+            '[handler_queue]', 'class = readinglist.logs.QueueHandler',
+            'args = (10, 5)', 'target = console']))
+        config.flush()
+        root = logging.getLogger()
+        previous = root.handlers[:]
+        self.addCleanup(setattr, root, 'handlers', previous)
+        logging.config.fileConfig(config.name,
+                                  disable_existing_loggers=False)
+        handler = root.handlers[0]
+        self.assertIsInstance(handler, logs.QueueHandler)
+        self.assertEqual(handler.batch_size, 5)
+        self.assertIsInstance(handler.target, logging.StreamHandler)
+
+
+class BoundLoggerTest(unittest.TestCase):
+    def setUp(self):
+        self.processor = mock.Mock(return_value='rendered')
+        self.stdlib_logger = logging.getLogger('readinglist.tests.logs')
+        self.stdlib_logger.setLevel(logging.INFO)
+        self.addCleanup(self.stdlib_logger.setLevel, logging.NOTSET)
+        self.logger = logs.BoundLogger(self.stdlib_logger, [self.processor],
+                                       {})
+
+    def test_events_of_disabled_levels_are_not_processed(self):
+        with mock.patch.object(self.stdlib_logger, 'debug') as debug:
+            self.logger.debug('event', key='value')
+        self.assertFalse(self.processor.called)
+        self.assertFalse(debug.called)
+
+    def test_events_of_enabled_levels_are_processed(self):
+        with mock.patch.object(self.stdlib_logger, 'info') as info:
+            self.logger.info('event', key='value')
+        self.assertTrue(self.processor.called)
+        info.assert_called_with('rendered')
+
+    def test_logger_is_used_by_structlog(self):
+        self.addCleanup(structlog.configure,
+                        wrapper_class=structlog.stdlib.BoundLogger)
+        logs.setup_logging()
+        logger = structlog.get_logger('readinglist.tests.logs').bind()
+        self.assertIsInstance(logger, logs.BoundLogger)
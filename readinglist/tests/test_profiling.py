@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+
+import mock
+from pyramid.request import Request
+from pyramid.response import Response
+
+from readinglist import API_VERSION, profiling
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+class ReportsMixin(object):
+    def setUp(self):
+        super(ReportsMixin, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def report(self, name, extension='.txt'):
+        with open(os.path.join(self.directory, name + extension)) as f:
+            return f.read()
+
+
+class ProfilerTest(ReportsMixin, unittest.TestCase):
+    def setUp(self):
+        super(ProfilerTest, self).setUp()
+        self.profiler = profiling.Profiler(self.directory, top=10)
+
+    def test_reports_list_top_functions(self):
+        def profiled_function(a, b=0):
+            return sorted(range(a + b))
+
+        result, name = self.profiler.run('Title', profiled_function, 3, b=1)
+        self.assertEqual(result, [0, 1, 2, 3])
+        report = self.report(name)
+        self.assertTrue(report.startswith('Title\nDuration: '))
+        self.assertIn('Top functions (cumulative time)', report)
+        self.assertIn('profiled_function', report)
+        self.assertTrue(self.report(name, '.prof'))
+
+    def test_only_one_function_is_profiled_at_a_time(self):
+        def nested():
+            return self.profiler.run('Nested', lambda: 42)
+
+        (result, nested_name), name = self.profiler.run('Title', nested)
+        self.assertEqual(result, 42)
+        self.assertIsNone(nested_name)
+        self.assertIsNotNone(name)
+
+    def test_failures_are_not_reported(self):
+        self.assertRaises(ZeroDivisionError, self.profiler.run, 'Title',
+                          lambda: 1 / 0)
+        self.assertEqual(os.listdir(self.directory), [])
+        _, name = self.profiler.run('Title', lambda: None)
+        self.assertIsNotNone(name)
+
+    def test_reports_list_top_allocation_sites_if_available(self):
+        with mock.patch.object(profiling, 'tracemalloc') as tracemalloc:
+            tracemalloc.__file__ = 'tracemalloc.py'
+            tracemalloc.is_tracing.return_value = False
+            snapshot = tracemalloc.take_snapshot.return_value
+            snapshot.filter_traces.return_value = snapshot
+            snapshot.compare_to.return_value = ['views.py:12: size=1 KiB']
+            _, name = self.profiler.run('Title', lambda: None)
+        self.assertTrue(tracemalloc.start.called)
+        self.assertTrue(tracemalloc.stop.called)
+        self.assertIn('Top allocation sites\n\nviews.py:12: size=1 KiB',
+                      self.report(name))
+
+    def test_allocations_are_still_traced_if_traced_before(self):
+        with mock.patch.object(profiling, 'tracemalloc') as tracemalloc:
+            tracemalloc.__file__ = 'tracemalloc.py'
+            tracemalloc.is_tracing.return_value = True
+            self.profiler.run('Title', lambda: None)
+        self.assertFalse(tracemalloc.stop.called)
+
+
+class ProfilingTweenTest(ReportsMixin, unittest.TestCase):
+    def setUp(self):
+        super(ProfilingTweenTest, self).setUp()
+        self.settings = {
+            'readinglist.profiling_secret': 'secret',
+            'readinglist.profiling_directory': self.directory,
+            'readinglist.profiling_top': 10}
+        self.tween = self.new_tween()
+
+    def new_tween(self):
+        registry = mock.Mock(settings=self.settings)
+        return profiling.profiling_tween_factory(lambda r: Response(),
+                                                 registry)
+
+    def test_secret_is_required(self):
+        self.settings['readinglist.profiling_secret'] = ''
+        self.assertRaises(ValueError, self.new_tween)
+
+    def test_reports_are_written_in_temporary_directory_by_default(self):
+        self.settings['readinglist.profiling_directory'] = ''
+        with mock.patch.object(profiling.Profiler, '__init__',
+                               return_value=None) as init:
+            self.new_tween()
+        init.assert_called_with(tempfile.gettempdir(), top=10)
+
+    def test_requests_are_not_profiled_without_secret(self):
+        for headers in ({}, {profiling.PROFILE_HEADER: 'wrong'}):
+            response = self.tween(Request.blank('/', headers=headers))
+            self.assertNotIn(profiling.REPORT_HEADER, response.headers)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_requests_with_secret_are_profiled(self):
+        request = Request.blank('/articles?_limit=10', headers={
+            profiling.PROFILE_HEADER: 'secret'})
+        response = self.tween(request)
+        name = response.headers[profiling.REPORT_HEADER]
+        self.assertIn('GET /articles?_limit=10', self.report(name))
+
+
+class ProfilingTest(BaseWebTest, unittest.TestCase):
+    def get_app_settings(self, additional_settings=None):
+        settings = super(ProfilingTest, self).get_app_settings(
+            additional_settings)
+        settings.update({
+            'readinglist.profiling_enabled': 'true',
+            'readinglist.profiling_secret': 'secret',
+            'readinglist.profiling_directory': tempfile.gettempdir(),
+            'readinglist.profiling_top': 1000})
+        return settings
+
+    def test_reports_cover_validation_and_storage(self):
+        headers = self.headers.copy()
+        headers[profiling.PROFILE_HEADER] = 'secret'
+        resp = self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                                  headers=headers)
+        name = resp.headers[profiling.REPORT_HEADER]
+        path = os.path.join(tempfile.gettempdir(), name)
+        self.addCleanup(os.remove, path + '.prof')
+        self.addCleanup(os.remove, path + '.txt')
+        with open(path + '.txt') as f:
+            report = f.read()
+        self.assertIn('POST /v%s/articles' % API_VERSION[1:], report)
+        self.assertIn('process_record', report)
+        self.assertIn('deserialize', report)
+        self.assertIn('storage', report)
+
+    def test_other_requests_are_not_profiled(self):
+        resp = self.app.get('/articles', headers=self.headers)
+        self.assertNotIn(profiling.REPORT_HEADER, resp.headers)
@@ -0,0 +1,198 @@
+import mock
+
+from readinglist import response_cache
+from readinglist.response_cache import ResponseCache, cache_key
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+class CacheKeyTest(unittest.TestCase):
+    def request(self, querystring):
+        request = mock.Mock(host_url='http://localhost', path='/v1/articles')
+        request.GET = dict([p.split('=') for p in querystring.split('&')])
+        return request
+
+    def test_order_of_parameters_does_not_matter(self):
+        self.assertEqual(cache_key(self.request('a=1&b=2'), 'bob', 42),
+                         cache_key(self.request('b=2&a=1'), 'bob', 42))
+
+    def test_key_depends_on_parameters(self):
+        self.assertNotEqual(cache_key(self.request('a=1&b=2'), 'bob', 42),
+                            cache_key(self.request('a=1&b=3'), 'bob', 42))
+
+    def test_key_depends_on_user_and_timestamp(self):
+        key = cache_key(self.request('a=1'), 'bob', 42)
+        self.assertNotEqual(key, cache_key(self.request('a=1'), 'alice', 42))
+        self.assertNotEqual(key, cache_key(self.request('a=1'), 'bob', 43))
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(max_size=30, max_entry_size=20)
+
+    def test_values_are_returned_once_set(self):
+        self.cache.set('a', {'b': 1})
+        self.assertEqual(self.cache.get('a'), {'b': 1})
+
+    def test_missing_values_are_none(self):
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_size_is_the_size_of_serialized_values(self):
+        self.cache.set('a', 'abc')
+        self.cache.set('b', 'abc')
+        self.assertEqual(self.cache.size, 10)
+        self.cache.set('a', 'abcd')
+        self.assertEqual(self.cache.size, 11)
+
+    def test_large_values_are_not_cached(self):
+        self.cache.set('a', 'x' * 20)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_least_recently_used_values_are_evicted(self):
+        self.cache.set('a', 'x' * 10)
+        self.cache.set('b', 'x' * 10)
+        self.cache.get('a')
+        self.cache.set('c', 'x' * 10)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertLessEqual(self.cache.size, 30)
+
+    def test_flush_removes_every_value(self):
+        self.cache.set('a', 'abc')
+        self.cache.flush()
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.size, 0)
+
+
+class SharedResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = mock.Mock()
+        self.backend.get.return_value = None
+        self.cache = ResponseCache(max_size=30, max_entry_size=20,
+                                   backend=self.backend, ttl=60)
+
+    def test_values_are_written_through(self):
+        self.cache.set('a', 'abc')
+        self.backend.set.assert_called_with('a', '"abc"', 60)
+
+    def test_backend_is_read_if_missing_in_memory(self):
+        self.backend.get.return_value = '"abc"'
+        self.assertEqual(self.cache.get('a'), 'abc')
+        self.cache.get('a')
+        self.assertEqual(self.backend.get.call_count, 1)
+
+    def test_large_values_are_not_written(self):
+        self.cache.set('a', 'x' * 20)
+        self.cache.set_bytes('b', b'x' * 21)
+        self.assertFalse(self.backend.set.called)
+
+    def test_binary_data_is_written_base64_encoded(self):
+        self.cache.set_bytes('a', b'\x00\xff')
+        self.backend.set.assert_called_with('a', 'AP8=', 60)
+
+    def test_binary_data_is_read_from_backend(self):
+        self.backend.get.return_value = 'AP8='
+        self.assertEqual(self.cache.get_bytes('a'), b'\x00\xff')
+        self.assertEqual(self.cache.get_bytes('a'), b'\x00\xff')
+        self.assertEqual(self.backend.get.call_count, 1)
+
+    def test_missing_binary_data_is_none(self):
+        self.assertIsNone(self.cache.get_bytes('a'))
+
+
+class LoadFromConfigTest(unittest.TestCase):
+    def load(self, **settings):
+        defaults = {
+            'readinglist.response_cache_enabled': 'true',
+            'readinglist.response_cache_shared': 'false',
+            'readinglist.response_cache_max_size': '100',
+            'readinglist.response_cache_max_entry_size': '10',
+            'readinglist.response_cache_ttl': '60'}
+        defaults.update(settings)
+        config = mock.Mock(get_settings=mock.Mock(return_value=defaults))
+        return response_cache.load_from_config(config), config
+
+    def test_cache_can_be_disabled(self):
+        cache, _ = self.load(**{'readinglist.response_cache_enabled': 'false'})
+        self.assertIsNone(cache)
+
+    def test_cache_is_backed_by_cliquet_cache_if_shared(self):
+        cache, config = self.load(
+            **{'readinglist.response_cache_shared': 'true'})
+        self.assertEqual(cache.backend, config.registry.cache)
+        self.assertEqual(cache.ttl, 60)
+
+    def test_cache_is_in_memory_only_by_default(self):
+        cache, _ = self.load()
+        self.assertIsNone(cache.backend)
+        self.assertEqual(cache.max_size, 100)
+        self.assertEqual(cache.max_entry_size, 10)
+
+
+class ArticlesResponseCacheTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(ArticlesResponseCacheTest, self).setUp()
+        self.cache = self.app.app.registry.response_cache
+        self.cache.flush()
+        for i in range(3):
+            data = MINIMALIST_ARTICLE.copy()
+            data['url'] += '-%s' % i
+            self.app.post_json('/articles', {'data': data},
+                               headers=self.headers)
+
+    def get_without_storage(self, url, **kwargs):
+        storage = self.app.app.registry.storage
+        with mock.patch.object(storage, 'get_all') as get_all:
+            resp = self.app.get(url, headers=self.headers, **kwargs)
+            self.assertFalse(get_all.called)
+        return resp
+
+    def test_identical_queries_are_served_from_cache(self):
+        first = self.app.get('/articles?_limit=2', headers=self.headers)
+        second = self.get_without_storage('/articles?_limit=2')
+        self.assertEqual(first.json, second.json)
+        self.assertEqual(first.headers['Total-Records'],
+                         second.headers['Total-Records'])
+        self.assertEqual(first.headers['Next-Page'],
+                         second.headers['Next-Page'])
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+
+    def test_order_of_parameters_does_not_matter(self):
+        self.app.get('/articles?unread=true&_sort=title',
+                     headers=self.headers)
+        self.get_without_storage('/articles?_sort=title&unread=true')
+
+    def test_writes_invalidate_cached_responses(self):
+        self.app.get('/articles', headers=self.headers)
+        data = MINIMALIST_ARTICLE.copy()
+        self.app.post_json('/articles', {'data': data}, headers=self.headers)
+        resp = self.app.get('/articles', headers=self.headers)
+        self.assertEqual(len(resp.json['data']), 4)
+
+    def test_responses_are_specific_to_users(self):
+        self.app.get('/articles', headers=self.headers)
+        headers = self.headers.copy()
+        headers['Authorization'] = 'Basic YWxpY2U6'  # alice
+        resp = self.app.get('/articles', headers=headers)
+        self.assertEqual(len(resp.json['data']), 0)
+
+    def test_not_modified_is_returned_before_reading_cache(self):
+        resp = self.app.get('/articles', headers=self.headers)
+        headers = self.headers.copy()
+        headers['If-None-Match'] = resp.headers['ETag']
+        with mock.patch.object(self.cache, 'get') as cache_get:
+            self.app.get('/articles', headers=headers, status=304)
+            self.assertFalse(cache_get.called)
+
+    def test_cache_is_not_used_if_disabled(self):
+        self.app.app.registry.response_cache = None
+        self.addCleanup(setattr, self.app.app.registry, 'response_cache',
+                        self.cache)
+        self.app.get('/articles', headers=self.headers)
+        self.assertEqual(self.cache.size, 0)
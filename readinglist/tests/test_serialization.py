@@ -0,0 +1,180 @@
+import json
+import zlib
+
+import mock
+import msgpack
+
+from cliquet.errors import ERRORS
+
+from readinglist import serialization
+from readinglist.serialization import (COLUMNAR_CONTENT_TYPE,
+                                       MSGPACK_CONTENT_TYPE)
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS",
+                          excerpt="Lorem ipsum " * 100)
+
+
+class ColumnsTest(unittest.TestCase):
+    def test_lists_of_objects_are_converted_to_columns(self):
+        value = {'data': [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}]}
+        columns = serialization.to_columns(value)
+        self.assertEqual(columns, {'data': {'$columns': ['a', 'b'],
+                                            '$rows': [[1, 2], [3, 4]]}})
+        self.assertEqual(serialization.from_columns(columns), value)
+
+    def test_nested_lists_are_converted(self):
+        value = [{'a': [{'b': 1}, {'b': 2}]}, {'a': []}]
+        columns = serialization.to_columns(value)
+        self.assertEqual(columns['$rows'][0][0],
+                         {'$columns': ['b'], '$rows': [[1], [2]]})
+        self.assertEqual(serialization.from_columns(columns), value)
+
+    def test_objects_with_different_keys_are_left_as_is(self):
+        value = [{'a': 1}, {'b': 2}]
+        self.assertEqual(serialization.to_columns(value), value)
+
+    def test_single_objects_are_left_as_is(self):
+        value = [{'a': 1}]
+        self.assertEqual(serialization.to_columns(value), value)
+
+    def test_other_values_are_left_as_is(self):
+        self.assertEqual(serialization.to_columns('a'), 'a')
+        self.assertEqual(serialization.from_columns(1), 1)
+
+    def test_objects_without_reserved_keys_are_left_as_is(self):
+        value = {'columns': ['a'], 'rows': [[1]]}
+        self.assertEqual(serialization.from_columns(value), value)
+        value = [{'columns': ['a'], 'rows': [[1]]}, {'$rows': []}]
+        self.assertEqual(serialization.from_columns(value), value)
+
+    def test_rows_must_match_columns(self):
+        self.assertRaises(ValueError, serialization.from_columns,
+                          {'$columns': ['a'], '$rows': [[1, 2]]})
+
+    def test_columnar_objects_must_have_only_columns_and_rows(self):
+        for value in ({'$columns': ['a']},
+                      {'$columns': ['a'], '$rows': [], 'b': 1},
+                      {'$columns': 'a', '$rows': []},
+                      {'$columns': ['a'], '$rows': 1}):
+            self.assertRaises(ValueError, serialization.from_columns, value)
+
+
+class SerializationTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(SerializationTest, self).setUp()
+        self.app.app.registry.response_cache.flush()
+        for i in range(3):
+            data = MINIMALIST_ARTICLE.copy()
+            data['url'] += '-%s' % i
+            self.app.post_json('/articles', {'data': data},
+                               headers=self.headers)
+
+    def get(self, url='/articles', accept=MSGPACK_CONTENT_TYPE, status=200,
+            **headers):
+        headers.update(self.headers)
+        if accept is not None:
+            headers['Accept'] = accept
+        return self.app.get(url, headers=headers, status=status)
+
+    def post(self, url, body, content_type, status=201):
+        headers = self.headers.copy()
+        headers['Content-Type'] = content_type
+        return self.app.post(url, body, headers=headers, status=status)
+
+    def test_responses_are_sent_with_msgpack_if_accepted(self):
+        expected = self.get(accept=None).json
+        resp = self.get()
+        self.assertEqual(resp.headers['Content-Type'], MSGPACK_CONTENT_TYPE)
+        self.assertEqual(msgpack.unpackb(resp.body, raw=False), expected)
+
+    def test_responses_are_sent_as_columns_if_accepted(self):
+        expected = self.get(accept=None).json
+        resp = self.get(accept=COLUMNAR_CONTENT_TYPE)
+        self.assertEqual(resp.content_type, COLUMNAR_CONTENT_TYPE)
+        data = json.loads(resp.body.decode('utf-8'))['data']
+        self.assertEqual(len(data['$rows']), 3)
+        self.assertEqual(serialization.from_columns(data), expected['data'])
+
+    def test_responses_are_sent_with_json_by_default(self):
+        resp = self.get(accept='application/json;q=1, %s;q=0.5' %
+                        MSGPACK_CONTENT_TYPE)
+        self.assertEqual(resp.content_type, 'application/json')
+        resp = self.get(accept=None)
+        self.assertEqual(resp.content_type, 'application/json')
+
+    def test_responses_vary_on_accept(self):
+        resp = self.get(accept=None)
+        self.assertIn('Accept', resp.headers['Vary'])
+
+    def test_errors_are_sent_with_msgpack_if_accepted(self):
+        resp = self.get('/articles/unknown', status=400)
+        error = msgpack.unpackb(resp.body, raw=False)
+        self.assertEqual(error['errno'], ERRORS.INVALID_PARAMETERS)
+
+    def test_streamed_responses_are_left_untouched(self):
+        resp = self.get('/articles/export')
+        self.assertEqual(resp.content_type, 'application/x-ndjson')
+
+    def test_converted_lists_are_served_from_response_cache(self):
+        first = self.get()
+        with mock.patch.object(serialization.msgpack, 'packb') as packb:
+            second = self.get()
+            self.assertFalse(packb.called)
+        self.assertEqual(first.body, second.body)
+
+    def test_responses_are_converted_without_response_cache(self):
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'response_cache',
+                        registry.response_cache)
+        registry.response_cache = None
+        resp = self.get()
+        self.assertEqual(len(msgpack.unpackb(resp.body, raw=False)['data']), 3)
+
+    def test_converted_responses_are_compressed(self):
+        # WebTest decodes responses, use the application directly.
+        self.get(accept=None, **{'Accept-Encoding': 'gzip'})
+        headers = self.headers.copy()
+        headers['Accept'] = MSGPACK_CONTENT_TYPE
+        headers['Accept-Encoding'] = 'gzip'
+        request = self.app.RequestClass.blank('/articles', headers=headers)
+        resp = request.get_response(self.app.app)
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        body = zlib.decompress(resp.body, 16 + zlib.MAX_WBITS)
+        self.assertEqual(len(msgpack.unpackb(body, raw=False)['data']), 3)
+
+    def test_batch_responses_are_sent_with_msgpack_if_accepted(self):
+        headers = self.headers.copy()
+        headers['Accept'] = MSGPACK_CONTENT_TYPE
+        resp = self.app.post_json('/batch', {'requests': [
+            {'path': '/articles'}, {'path': '/articles'}]}, headers=headers)
+        responses = msgpack.unpackb(resp.body, raw=False)['responses']
+        self.assertEqual(len(responses[1]['body']['data']), 3)
+
+    def test_msgpack_bodies_are_accepted(self):
+        body = msgpack.packb({'data': MINIMALIST_ARTICLE})
+        resp = self.post('/articles', body, MSGPACK_CONTENT_TYPE)
+        self.assertEqual(resp.json['data']['added_by'], 'FxOS')
+
+    def test_columnar_batch_requests_are_accepted(self):
+        requests = [{'method': 'POST', 'path': '/articles',
+                     'body': {'data': dict(MINIMALIST_ARTICLE,
+                                           url='http://%s.org' % i)}}
+                    for i in range(5)]
+        body = serialization.dumps_columnar({'requests': requests})
+        self.assertIn(b'"$columns"', body)
+        resp = self.post('/batch', body, COLUMNAR_CONTENT_TYPE, status=200)
+        statuses = [r['status'] for r in resp.json['responses']]
+        self.assertEqual(statuses, [201] * 5)
+
+    def test_invalid_bodies_are_rejected(self):
+        resp = self.post('/articles', b'\xc1', MSGPACK_CONTENT_TYPE,
+                         status=400)
+        self.assertEqual(resp.json['errno'], ERRORS.INVALID_POSTED_DATA)
+        resp = self.post('/articles', b'{"$columns": 1, "$rows": [[]]}',
+                         COLUMNAR_CONTENT_TYPE, status=400)
+        self.assertEqual(resp.json['errno'], ERRORS.INVALID_POSTED_DATA)
@@ -0,0 +1,454 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import mock
+
+from cliquet.storage import exceptions, Filter, Sort
+from cliquet.tests.test_storage import StorageTest
+from cliquet.utils import COMPARISON
+
+from readinglist.storage import memory
+from readinglist.views.article import ArticleSchema
+
+from . import test_views_article, test_views_bulk
+from .support import unittest
+
+
+SETTINGS = {
+    'cliquet.storage_max_fetch_size': 3,
+    'readinglist.storage_memory_snapshot_path': '',
+    'readinglist.storage_memory_snapshot_interval': 0,
+}
+
+
+class MemoryStorageTest(StorageTest, unittest.TestCase):
+    backend = memory
+    settings = SETTINGS
+
+    def setUp(self):
+        super(MemoryStorageTest, self).setUp()
+        self.client_error_patcher = mock.patch.object(
+            self.storage,
+            '_collection',
+            side_effect=exceptions.BackendError("Segmentation fault."))
+
+    def test_backend_error_provides_original_exception(self):
+        pass
+
+    def test_raises_backend_error_if_error_occurs_on_client(self):
+        pass
+
+    def test_backend_error_is_raised_anywhere(self):
+        pass
+
+    def test_backenderror_message_default_to_original_exception_message(self):
+        pass
+
+
+class RecordTest(unittest.TestCase):
+    def test_article_fields_are_slots(self):
+        fields = [node.name for node in ArticleSchema().children]
+        self.assertEqual(set(fields) - set(memory.ARTICLE_FIELDS), set())
+
+    def test_records_have_no_dictionary(self):
+        record = memory.Record({'url': 'a'})
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_other_fields_are_kept(self):
+        data = {'id': 'abc', 'url': 'a', 'unread': False, 'tags': ['x']}
+        record = memory.Record(data)
+        self.assertEqual(record.as_dict(), data)
+        self.assertEqual(record.get('tags'), ['x'])
+        self.assertIsNone(record.get('title'))
+        self.assertIsNone(memory.Record({}).get('tags'))
+
+
+class IndexesTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = memory.Memory()
+        self.kw = dict(collection_id='article', parent_id='bob')
+        self.unique = ('url', 'resolved_url')
+        self.first = self.create(url='a', unread=True, title='B')
+        self.second = self.create(url='b', unread=False)
+        self.third = self.create(url='c', unread=True, title='A')
+
+    def create(self, **record):
+        return self.storage.create(record=record, unique_fields=self.unique,
+                                   **self.kw)
+
+    def get_all(self, *filters, **kwargs):
+        records, total = self.storage.get_all(filters=list(filters),
+                                              **dict(self.kw, **kwargs))
+        return [r['id'] for r in records], total
+
+    def test_filters_on_indexed_fields_do_not_scan_records(self):
+        unread = Filter('unread', True, COMPARISON.EQ)
+        url = Filter('url', 'c', COMPARISON.EQ)
+        with mock.patch.object(memory, 'matches',
+                               wraps=memory.matches) as matches:
+            ids, total = self.get_all(unread, url)
+        self.assertEqual((ids, total), ([self.third['id']], 1))
+        self.assertEqual(matches.call_count, 1)
+
+    def test_filters_on_timestamps_do_not_scan_records(self):
+        since = Filter('last_modified', self.first['last_modified'],
+                       COMPARISON.GT)
+        with mock.patch.object(memory, 'matches',
+                               wraps=memory.matches) as matches:
+            ids, _ = self.get_all(since)
+        self.assertEqual(ids, [self.second['id'], self.third['id']])
+        self.assertEqual(matches.call_count, 2)
+
+    def test_timestamps_can_be_compared_in_every_way(self):
+        timestamp = self.second['last_modified']
+        expected = {
+            COMPARISON.LT: [self.first['id']],
+            COMPARISON.MAX: [self.first['id'], self.second['id']],
+            COMPARISON.EQ: [self.second['id']],
+            COMPARISON.MIN: [self.second['id'], self.third['id']],
+            COMPARISON.NOT: [self.first['id'], self.third['id']],
+        }
+        for operator, ids in expected.items():
+            found, _ = self.get_all(Filter('last_modified', timestamp,
+                                           operator))
+            self.assertEqual(found, ids)
+
+    def test_filters_on_ids_and_other_fields_are_supported(self):
+        ids, _ = self.get_all(Filter('id', self.first['id'], COMPARISON.EQ))
+        self.assertEqual(ids, [self.first['id']])
+        ids, _ = self.get_all(Filter('id', 'unknown', COMPARISON.EQ))
+        self.assertEqual(ids, [])
+        ids, _ = self.get_all(Filter('title', 'A', COMPARISON.EQ))
+        self.assertEqual(ids, [self.third['id']])
+
+    def test_indexes_follow_updates_and_deletions(self):
+        unread = Filter('unread', True, COMPARISON.EQ)
+        self.storage.update(object_id=self.first['id'],
+                            record=dict(self.first, unread=False), **self.kw)
+        self.storage.delete(object_id=self.third['id'], **self.kw)
+        self.assertEqual(self.get_all(unread), ([], 0))
+        self.assertEqual(self.create(url='c')['url'], 'c')
+
+    def test_unique_fields_are_checked_with_indexes(self):
+        with self.assertRaises(exceptions.UnicityError) as cm:
+            self.create(url='a', resolved_url='d')
+        self.assertEqual(cm.exception.record, self.first)
+
+    def test_other_unique_fields_are_checked(self):
+        with self.assertRaises(exceptions.UnicityError):
+            self.storage.create(record={'title': 'A'},
+                                unique_fields=('title',), **self.kw)
+
+    def test_tombstones_are_selected_by_timestamp(self):
+        deleted = self.storage.delete(object_id=self.first['id'], **self.kw)
+        since = Filter('last_modified', self.third['last_modified'],
+                       COMPARISON.GT)
+        records, total = self.storage.get_all(filters=[since],
+                                              include_deleted=True,
+                                              **self.kw)
+        self.assertEqual((records, total), ([deleted], 0))
+
+    def test_records_are_sorted_by_timestamp_without_sorting(self):
+        ids, _ = self.get_all(sorting=[Sort('last_modified', -1)])
+        self.assertEqual(ids, [self.third['id'], self.second['id'],
+                               self.first['id']])
+
+    def test_missing_values_are_sorted_last(self):
+        ids, _ = self.get_all(sorting=[Sort('title', 1)])
+        self.assertEqual(ids, [self.third['id'], self.first['id'],
+                               self.second['id']])
+        ids, _ = self.get_all(sorting=[Sort('title', -1)])
+        self.assertEqual(ids, [self.second['id'], self.first['id'],
+                               self.third['id']])
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = memory.Memory(max_fetch_size=3)
+        self.kw = dict(collection_id='article', parent_id='bob')
+        self.excerpt = self.storage.create(
+            record={'title': 'Cooking', 'excerpt': 'Firefox rocks'},
+            **self.kw)
+        self.title = self.storage.create(
+            record={'title': 'Firefox rocks', 'unread': True}, **self.kw)
+        self.resolved = self.storage.create(
+            record={'resolved_title': 'Firefox is fast', 'unread': False},
+            **self.kw)
+        self.storage.create(record={'title': 'Firefox'},
+                            collection_id='article', parent_id='alice')
+
+    def search(self, terms, **kwargs):
+        kwargs.update(self.kw)
+        return self.storage.search(terms=terms, **kwargs)
+
+    def test_no_results_if_nothing_matches(self):
+        self.assertEqual(self.search('chrome'), ([], 0))
+        self.assertEqual(self.search('!'), ([], 0))
+
+    def test_every_term_must_match_by_relevance(self):
+        records, total = self.search('Firefox ROCKS')
+        self.assertEqual(total, 2)
+        self.assertEqual([r['id'] for r in records],
+                         [self.title['id'], self.excerpt['id']])
+
+    def test_results_can_be_filtered_and_sorted(self):
+        filters = [Filter('unread', False, COMPARISON.NOT)]
+        sorting = [Sort('title', 1)]
+        records, total = self.search('firefox', filters=filters,
+                                     sorting=sorting)
+        self.assertEqual([r['id'] for r in records],
+                         [self.excerpt['id'], self.title['id']])
+
+    def test_results_are_paginated_up_to_max_fetch_size(self):
+        self.storage.create(record={'title': 'Firefox'}, **self.kw)
+        records, total = self.search('firefox', limit=10, offset=1)
+        self.assertEqual(total, 4)
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[-1]['id'], self.excerpt['id'])
+
+    def test_words_of_modified_records_are_indexed(self):
+        self.storage.update(object_id=self.excerpt['id'],
+                            record={'title': 'Gardening'}, **self.kw)
+        self.assertEqual(self.search('rocks')[1], 1)
+        self.assertEqual(self.search('gardening')[1], 1)
+
+
+class BulkTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = memory.Memory()
+        self.kw = dict(collection_id='article', parent_id='bob')
+        self.unique = ('url', 'resolved_url')
+        self.record = self.storage.create(record={'url': 'a'}, **self.kw)
+        self.deleted = self.storage.create(record={'url': 'b'}, **self.kw)
+        self.storage.delete(object_id=self.deleted['id'], **self.kw)
+
+    def create_many(self, *records):
+        return self.storage.create_many(records=records,
+                                        unique_fields=self.unique,
+                                        **self.kw)
+
+    def test_records_and_tombstones_can_be_iterated_since(self):
+        records = list(self.storage.iter_records(**self.kw))
+        self.assertEqual(records, [self.record])
+        records = list(self.storage.iter_records(
+            since=self.record['last_modified'], include_deleted=True,
+            **self.kw))
+        self.assertEqual([r['id'] for r in records], [self.deleted['id']])
+        self.assertTrue(records[0]['deleted'])
+
+    def test_records_purged_during_iteration_are_skipped(self):
+        records = self.storage.iter_records(include_deleted=True, **self.kw)
+        next(records)
+        self.storage.purge(**self.kw)
+        self.assertEqual(list(records), [])
+
+    def test_records_conflicting_with_existing_ones_are_not_created(self):
+        results = self.create_many({'url': 'a', 'resolved_url': 'c'},
+                                   {'url': 'd', 'resolved_url': 'e'},
+                                   {'id': self.record['id'], 'url': 'f'})
+        self.assertEqual(results[0], (self.record, False))
+        self.assertEqual(results[2], (self.record, False))
+        self.assertTrue(results[1][1])
+        self.assertEqual(self.storage.get(object_id=results[1][0]['id'],
+                                          **self.kw), results[1][0])
+
+    def test_records_conflicting_with_previous_ones_are_not_created(self):
+        results = self.create_many({'url': 'c'}, {'url': 'c'})
+        self.assertEqual(results[1], (results[0][0], False))
+        records, _ = self.storage.get_all(**self.kw)
+        self.assertEqual(len(records), 2)
+
+    def test_parents_with_records_or_tombstones_are_listed(self):
+        self.storage.create(record={}, collection_id='article',
+                            parent_id='alice')
+        self.storage.collection_timestamp('article', 'carol')
+        self.assertEqual(sorted(self.storage.parent_ids('article')),
+                         ['alice', 'bob'])
+        self.storage.purge(**self.kw)
+        self.assertEqual(self.storage.parent_ids('article'), ['alice'])
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = memory.Memory()
+        self.kw = dict(collection_id='article', parent_id='bob')
+        self.record = self.storage.create(
+            record={'url': 'a', 'title': 'A', 'unread': True}, **self.kw)
+        self.changes, self.cursor, _ = self.sync()
+
+    def sync(self, device='phone', **kwargs):
+        return self.storage.sync(device=device, **dict(self.kw, **kwargs))
+
+    def update(self, record, **changes):
+        data = dict(record, **changes)
+        return self.storage.update(object_id=record['id'], record=data,
+                                   **self.kw)
+
+    def test_first_synchronization_returns_whole_records(self):
+        self.assertEqual(self.changes, [self.record])
+        self.assertEqual(self.cursor, self.record['last_modified'])
+        self.assertEqual(self.sync(parent_id='alice'), ([], None, False))
+
+    def test_changes_are_merged_across_modifications(self):
+        updated = self.update(self.record, title='B')
+        self.sync(device='laptop')
+        updated = self.update(updated, unread=False)
+        changes, _, _ = self.sync()
+        self.assertEqual(changes, [{'id': self.record['id'],
+                                    'last_modified': updated['last_modified'],
+                                    'title': 'B',
+                                    'unread': False}])
+        changes, _, _ = self.sync(device='laptop')
+        self.assertEqual(changes[0]['unread'], False)
+        self.assertNotIn('title', changes[0])
+
+    def test_removed_fields_are_returned_as_null(self):
+        data = dict(self.record)
+        del data['title']
+        self.storage.update(object_id=self.record['id'], record=data,
+                            **self.kw)
+        changes, _, _ = self.sync()
+        self.assertIsNone(changes[0]['title'])
+
+    def test_created_and_deleted_records_are_returned_in_order(self):
+        created = self.storage.create(record={'url': 'b'}, **self.kw)
+        deleted = self.storage.delete(object_id=self.record['id'], **self.kw)
+        changes, cursor, has_more = self.sync(limit=1)
+        self.assertEqual((changes, has_more), ([created], True))
+        changes, cursor, has_more = self.sync(limit=1)
+        self.assertEqual((changes, has_more), ([deleted], False))
+        self.assertEqual(cursor, deleted['last_modified'])
+
+    def test_explicit_timestamp_overrides_cursor(self):
+        changes, cursor, _ = self.sync(since=self.cursor - 1)
+        self.assertEqual(changes, [self.record])
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'snapshot')
+        self.storage = memory.Memory(snapshot_path=self.path,
+                                     snapshot_interval=60)
+        self.kw = dict(collection_id='article', parent_id='bob')
+
+    def restart(self):
+        return memory.Memory(snapshot_path=self.path)
+
+    def test_collections_survive_restarts(self):
+        record = self.storage.create(record={'url': 'a', 'tags': [u'caf\xe9']},
+                                     unique_fields=('url',), **self.kw)
+        deleted = self.storage.create(record={'url': 'b'}, **self.kw)
+        deleted = self.storage.delete(object_id=deleted['id'], **self.kw)
+        record = self.storage.update(object_id=record['id'],
+                                     record=dict(record, title='A'),
+                                     **self.kw)
+        self.storage.sync(device='phone', **self.kw)
+        self.storage.collection_timestamp('article', 'alice')
+        self.storage.save()
+
+        storage = self.restart()
+        records, _ = storage.get_all(include_deleted=True, **self.kw)
+        self.assertEqual(records, [deleted, record])
+        self.assertEqual(storage.collection_timestamp(**self.kw),
+                         record['last_modified'])
+        self.assertRaises(exceptions.UnicityError, storage.create,
+                          record={'url': 'a'}, unique_fields=('url',),
+                          **self.kw)
+        self.assertEqual(storage.sync(device='phone', **self.kw),
+                         ([], record['last_modified'], False))
+        self.assertEqual(storage.parent_ids('article'), ['bob'])
+
+    def test_snapshots_are_written_after_changes_every_interval(self):
+        self.storage.create(record={}, **self.kw)
+        self.assertIsNone(self.storage._saver)
+        self.storage._saved_at -= 60
+        self.storage.create(record={}, **self.kw)
+        self.storage._saver.join()
+        records, _ = self.restart().get_all(**self.kw)
+        self.assertEqual(len(records), 2)
+
+    def test_snapshots_are_written_once_at_a_time(self):
+        self.storage._saved_at -= 60
+        with mock.patch.object(memory.threading, 'Thread') as thread:
+            self.storage.create(record={}, **self.kw)
+            self.storage._saved_at -= 60
+            self.storage.create(record={}, **self.kw)
+        self.assertEqual(thread.return_value.start.call_count, 1)
+
+    def test_records_can_be_used_while_snapshot_is_written(self):
+        self.storage.create(record={}, **self.kw)
+        dumps = memory.json.dumps
+        used = []
+
+        def use_from_other_thread(state):
+            thread = threading.Thread(
+                target=lambda: used.append(self.storage.get_all(**self.kw)))
+            thread.start()
+            thread.join(5)
+            return dumps(state)
+
+        with mock.patch.object(memory.json, 'dumps',
+                               side_effect=use_from_other_thread):
+            self.storage.save()
+        self.assertEqual(len(used), 1)
+
+    def test_snapshot_failures_in_background_are_logged(self):
+        with mock.patch.object(self.storage, 'save', side_effect=IOError), \
+                mock.patch.object(memory.logger, 'error') as error:
+            self.storage._save_in_background()
+        self.assertTrue(error.called)
+
+    def test_empty_snapshots_are_ignored(self):
+        open(self.path, 'w').close()
+        self.assertEqual(self.restart().parent_ids('article'), [])
+
+    def test_previous_snapshot_is_kept_if_writing_fails(self):
+        self.storage.create(record={}, **self.kw)
+        self.storage.save()
+        with mock.patch.object(memory.json, 'dumps', side_effect=ValueError):
+            self.assertRaises(ValueError, self.storage.save)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)),
+                         ['snapshot'])
+        self.assertEqual(self.restart().parent_ids('article'), ['bob'])
+
+    def test_snapshot_is_written_on_exit(self):
+        config = mock.Mock(get_settings=mock.Mock(return_value=dict(
+            SETTINGS, **{'readinglist.storage_memory_snapshot_path':
+                         self.path})))
+        with mock.patch.object(memory.atexit, 'register') as register:
+            storage = memory.load_from_config(config)
+        register.assert_called_with(storage.save)
+
+
+class MemoryBackendMixin(object):
+    def get_app_settings(self, additional_settings=None):
+        settings = super(MemoryBackendMixin, self).get_app_settings(
+            additional_settings)
+        settings['cliquet.storage_backend'] = 'readinglist.storage.memory'
+        return settings
+
+
+class MemoryDeletedArticleTest(MemoryBackendMixin,
+                               test_views_article.DeletedArticleTest):
+    pass
+
+
+class MemorySearchArticleTest(MemoryBackendMixin,
+                              test_views_article.SearchArticleTest):
+    pass
+
+
+class MemoryExportTest(MemoryBackendMixin, test_views_bulk.ExportTest):
+    pass
+
+
+class MemoryImportTest(MemoryBackendMixin, test_views_bulk.ImportTest):
+    pass
+
+
+class MemorySyncTest(MemoryBackendMixin, test_views_bulk.SyncTest):
+    pass
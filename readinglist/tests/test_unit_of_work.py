@@ -0,0 +1,137 @@
+import mock
+
+from cliquet.storage import exceptions
+
+from readinglist.unit_of_work import UnitOfWork
+
+from .support import BaseWebTest, unittest
+
+
+class UnitOfWorkTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = mock.Mock()
+        self.storage.get.return_value = {'id': 'abc', 'last_modified': 1}
+        self.unit = UnitOfWork(self.storage)
+        self.kw = dict(collection_id='article', parent_id='bob')
+
+    def test_records_are_read_once(self):
+        self.unit.get(object_id='abc', **self.kw)
+        self.unit.get(object_id='abc', **self.kw)
+        self.assertEqual(self.storage.get.call_count, 1)
+        self.assertEqual(self.unit.round_trips, 1)
+
+    def test_cached_records_are_copies(self):
+        self.unit.get(object_id='abc', **self.kw)['title'] = 'changed'
+        self.assertNotIn('title', self.unit.get(object_id='abc', **self.kw))
+
+    def test_missing_records_are_not_cached(self):
+        self.storage.get.side_effect = exceptions.RecordNotFoundError
+        for i in range(2):
+            self.assertRaises(exceptions.RecordNotFoundError,
+                              self.unit.get, object_id='abc', **self.kw)
+        self.assertEqual(self.storage.get.call_count, 2)
+
+    def test_listed_records_are_cached(self):
+        self.storage.get_all.return_value = (
+            [{'id': 'abc', 'last_modified': 1},
+             {'id': 'def', 'last_modified': 2, 'deleted': True}], 2)
+        self.unit.get_all(include_deleted=True, **self.kw)
+        self.unit.get(object_id='abc', **self.kw)
+        self.assertFalse(self.storage.get.called)
+        self.unit.get(object_id='def', **self.kw)
+        self.assertTrue(self.storage.get.called)
+
+    def test_searched_records_are_cached(self):
+        self.storage.search.return_value = (
+            [{'id': 'abc', 'last_modified': 1}], 1)
+        self.unit.search(terms='firefox', **self.kw)
+        self.unit.get(object_id='abc', **self.kw)
+        self.assertFalse(self.storage.get.called)
+        self.assertEqual(self.unit.round_trips, 1)
+
+    def test_written_records_are_cached(self):
+        self.storage.update.return_value = {'id': 'abc', 'last_modified': 3}
+        self.unit.update(object_id='abc', record={}, **self.kw)
+        record = self.unit.get(object_id='abc', **self.kw)
+        self.assertEqual(record['last_modified'], 3)
+        self.assertFalse(self.storage.get.called)
+
+    def test_created_records_are_cached(self):
+        self.storage.create_many.return_value = [
+            ({'id': 'abc', 'last_modified': 3}, True),
+            ({'id': 'def', 'last_modified': 2}, False)]
+        self.unit.create_many(records=[{}, {}], **self.kw)
+        self.unit.get(object_id='abc', **self.kw)
+        self.assertFalse(self.storage.get.called)
+        self.assertEqual(self.unit.round_trips, 1)
+
+    def test_deleted_records_are_forgotten(self):
+        self.storage.delete_all.return_value = [{'id': 'abc',
+                                                 'last_modified': 3}]
+        self.unit.get(object_id='abc', **self.kw)
+        self.unit.delete_all(**self.kw)
+        self.unit.get(object_id='abc', **self.kw)
+        self.assertEqual(self.storage.get.call_count, 2)
+
+    def test_collection_timestamp_is_read_once(self):
+        self.unit.collection_timestamp(**self.kw)
+        self.unit.collection_timestamp(**self.kw)
+        self.assertEqual(self.storage.collection_timestamp.call_count, 1)
+
+    def test_remembered_timestamps_are_not_read(self):
+        self.unit.remember_timestamp(timestamp=42, **self.kw)
+        self.assertEqual(self.unit.collection_timestamp(**self.kw), 42)
+        self.assertEqual(self.unit.round_trips, 0)
+
+    def test_collection_timestamp_is_deduced_from_writes(self):
+        self.unit.remember_timestamp(timestamp=42, **self.kw)
+        self.storage.create.return_value = {'id': 'abc', 'last_modified': 43}
+        self.unit.create(record={}, **self.kw)
+        self.assertEqual(self.unit.collection_timestamp(**self.kw), 43)
+        self.storage.delete.return_value = {'id': 'abc', 'last_modified': 44}
+        self.unit.delete(object_id='abc', **self.kw)
+        self.assertEqual(self.unit.collection_timestamp(**self.kw), 44)
+        self.assertFalse(self.storage.collection_timestamp.called)
+
+    def test_timestamp_is_kept_if_nothing_was_deleted(self):
+        self.unit.remember_timestamp(timestamp=42, **self.kw)
+        self.storage.delete_all.return_value = []
+        self.unit.delete_all(**self.kw)
+        self.assertEqual(self.unit.collection_timestamp(**self.kw), 42)
+
+    def test_other_methods_are_delegated(self):
+        self.unit.flush()
+        self.assertTrue(self.storage.flush.called)
+
+    def test_round_trips_are_bound_to_request_summary(self):
+        with mock.patch('readinglist.unit_of_work.logger') as logger:
+            self.unit.collection_timestamp(**self.kw)
+            logger.bind.assert_called_with(storage_round_trips=1)
+
+
+class ArticleRoundTripsTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(ArticleRoundTripsTest, self).setUp()
+        article = dict(title="MoFo", url="http://mozilla.org",
+                       added_by="FxOS")
+        resp = self.app.post_json('/articles', {'data': article},
+                                  headers=self.headers)
+        self.url = '/articles/%s' % resp.json['data']['id']
+        patcher = mock.patch('readinglist.unit_of_work.logger')
+        self.logger = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @property
+    def round_trips(self):
+        return self.logger.bind.call_args[1]['storage_round_trips']
+
+    def test_patch_reads_timestamp_and_record_then_updates(self):
+        self.app.patch_json(self.url, {'data': {'title': 'Firefox'}},
+                            headers=self.headers)
+        self.assertEqual(self.round_trips, 3)
+
+    def test_collection_timestamp_is_read_once_with_etags(self):
+        headers = self.headers.copy()
+        headers['If-None-Match'] = '"123"'
+        self.app.get('/articles', headers=headers)
+        self.assertEqual(self.round_trips, 2)
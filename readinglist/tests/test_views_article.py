@@ -1,3 +1,5 @@
+from cliquet.storage import memory
+
 from .support import BaseWebTest, unittest
 
 
@@ -309,3 +311,73 @@ class DeletedArticleTest(BaseWebTest, unittest.TestCase):
         records = resp.json['data']
         self.assertEqual(records[0]['deleted'], True)
         self.assertNotIn('deleted', records[1])
+
+
+class SearchArticleTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(SearchArticleTest, self).setUp()
+        articles = [
+            dict(title='Cooking', excerpt='About Firefox OS'),
+            dict(title='Firefox OS', unread=False),
+            dict(title='Firefox', resolved_title='Firefox OS is fast'),
+            dict(title='Gardening', excerpt='Not related'),
+        ]
+        self.ids = []
+        for i, article in enumerate(articles):
+            article.update(url='http://mozilla.org/%s' % i, added_by='FxOS')
+            resp = self.app.post_json('/articles', {'data': article},
+                                      headers=self.headers)
+            self.ids.append(resp.json['data']['id'])
+
+    def search(self, querystring, **kwargs):
+        return self.app.get('/articles?%s' % querystring,
+                            headers=self.headers, **kwargs)
+
+    def test_articles_are_ranked_by_relevance(self):
+        resp = self.search('q=firefox%20os')
+        ids = [r['id'] for r in resp.json['data']]
+        # Titles weigh more than excerpts.
+        self.assertEqual(sorted(ids[:2]), sorted(self.ids[1:3]))
+        self.assertEqual(ids[2], self.ids[0])
+        self.assertEqual(resp.headers['Total-Records'], '3')
+
+    def test_search_can_be_combined_with_filters(self):
+        resp = self.search('q=firefox&unread=false')
+        ids = [r['id'] for r in resp.json['data']]
+        self.assertEqual(ids, [self.ids[1]])
+
+    def test_search_can_be_sorted(self):
+        resp = self.search('q=firefox&_sort=title')
+        titles = [r['title'] for r in resp.json['data']]
+        self.assertEqual(titles, ['Cooking', 'Firefox', 'Firefox OS'])
+
+    def test_search_results_are_paginated(self):
+        resp = self.search('q=firefox&_limit=2')
+        self.assertEqual(len(resp.json['data']), 2)
+        next_page = resp.headers['Next-Page'].replace('http://localhost/v2',
+                                                      '')
+        resp = self.app.get(next_page, headers=self.headers)
+        self.assertEqual([r['id'] for r in resp.json['data']],
+                         [self.ids[0]])
+        self.assertNotIn('Next-Page', resp.headers)
+
+    def test_search_terms_cannot_be_empty(self):
+        resp = self.search('q=%20', status=400)
+        self.assertEqual(resp.json['details'][0]['name'], 'q')
+
+    def test_pagination_token_must_be_valid(self):
+        resp = self.search('q=firefox&_token=abc', status=400)
+        self.assertEqual(resp.json['details'][0]['name'], '_token')
+
+    def test_search_results_are_not_mixed_in_response_cache(self):
+        self.search('q=firefox')
+        resp = self.search('q=gardening')
+        self.assertEqual([r['id'] for r in resp.json['data']],
+                         [self.ids[3]])
+
+    def test_search_is_refused_if_not_supported_by_storage(self):
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'storage', registry.storage)
+        registry.storage = memory.Memory()
+        resp = self.search('q=firefox', status=400)
+        self.assertEqual(resp.json['details'][0]['name'], 'q')
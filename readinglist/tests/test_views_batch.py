@@ -0,0 +1,155 @@
+import sys
+import threading
+import uuid
+
+import mock
+
+from readinglist import workers
+from readinglist.views import batch
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = workers.WorkerPool(2)
+
+    def test_results_are_returned_in_order(self):
+        results = self.pool.map(lambda x: x * 2, range(10))
+        self.assertEqual(results, [x * 2 for x in range(10)])
+
+    def test_workers_are_started_once(self):
+        self.pool.map(str, [1])
+        pool = self.pool._pool
+        self.pool.map(str, [1])
+        self.assertEqual(self.pool._pool, pool)
+
+    def test_workers_are_started_again_in_forked_processes(self):
+        self.pool.map(str, [1])
+        pool = self.pool._pool
+        with mock.patch('readinglist.workers.os.getpid', return_value=-1):
+            self.pool.map(str, [1])
+        self.assertNotEqual(self.pool._pool, pool)
+
+    def test_greenlets_are_used_if_gevent_is_enabled(self):
+        gevent_mocked = mock.MagicMock()
+        modules = {'gevent': gevent_mocked,
+                   'gevent.pool': gevent_mocked.pool}
+        pool = workers.WorkerPool(3, gevent_enabled=True)
+        with mock.patch.dict(sys.modules, modules):
+            pool.map(str, [1])
+        gevent_mocked.pool.Pool.assert_called_with(3)
+
+
+class LoadFromConfigTest(unittest.TestCase):
+    def load(self, **settings):
+        config = mock.Mock(get_settings=mock.Mock(return_value=settings))
+        return workers.load_from_config(config)
+
+    def test_pool_is_disabled_with_less_than_two_workers(self):
+        self.assertIsNone(self.load(**{'readinglist.batch_workers': '1'}))
+
+    def test_pool_size_is_read_from_settings(self):
+        pool = self.load(**{'readinglist.batch_workers': '6',
+                            'readinglist.gevent_enabled': 'true'})
+        self.assertEqual(pool.size, 6)
+        self.assertTrue(pool.gevent_enabled)
+
+
+class ParallelBatchTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(ParallelBatchTest, self).setUp()
+        self.ids = []
+        for i in range(4):
+            data = MINIMALIST_ARTICLE.copy()
+            data['url'] += '/%s' % i
+            resp = self.app.post_json('/articles', {'data': data},
+                                      headers=self.headers)
+            self.ids.append(resp.json['data']['id'])
+
+        self.workers = self.app.app.registry.batch_workers
+        patcher = mock.patch.object(self.workers, 'map',
+                                    wraps=self.workers.map)
+        self.map = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def batch(self, requests, **kwargs):
+        return self.app.post_json('/batch', {'requests': requests},
+                                  headers=self.headers, **kwargs)
+
+    def test_reads_are_run_concurrently(self):
+        arrived = []
+        all_arrived = threading.Event()
+        invoke = batch.invoke
+
+        def wait_for_others(request, subrequest):
+            arrived.append(subrequest)
+            if len(arrived) == 2:
+                all_arrived.set()
+            # Would time out if subrequests were run one after the other.
+            concurrent = all_arrived.wait(5)
+            response = invoke(request, subrequest)
+            response['body']['concurrent'] = concurrent
+            return response
+
+        requests = [{'path': '/articles/%s' % i} for i in self.ids[:2]]
+        with mock.patch.object(batch, 'invoke', wait_for_others):
+            resp = self.batch(requests)
+        concurrent = [r['body']['concurrent'] for r in resp.json['responses']]
+        self.assertEqual(concurrent, [True, True])
+
+    def test_responses_are_returned_in_original_order(self):
+        requests = [{'path': '/articles/%s' % i} for i in self.ids]
+        requests.append({'method': 'HEAD', 'path': '/articles'})
+        resp = self.batch(requests)
+        responses = resp.json['responses']
+        ids = [r['body']['data']['id'] for r in responses[:-1]]
+        self.assertEqual(ids, self.ids)
+        self.assertEqual(responses[-1]['headers']['Total-Records'], '4')
+        self.assertTrue(self.map.called)
+
+    def test_failing_subrequests_return_errors(self):
+        requests = [{'path': '/articles/%s' % self.ids[0]},
+                    {'path': '/articles/%s' % uuid.uuid4()}]
+        with mock.patch('readinglist.views.article.Article._collection_get',
+                        side_effect=ValueError):
+            requests.append({'path': '/articles'})
+            resp = self.batch(requests)
+        statuses = [r['status'] for r in resp.json['responses']]
+        self.assertEqual(statuses, [200, 404, 500])
+
+    def test_batches_with_writes_are_run_sequentially(self):
+        requests = [{'path': '/articles'},
+                    {'method': 'DELETE', 'path': '/articles/%s' % self.ids[0]},
+                    {'path': '/articles'}]
+        resp = self.batch(requests)
+        totals = [r['headers']['Total-Records']
+                  for r in resp.json['responses'][::2]]
+        self.assertEqual(totals, ['4', '3'])
+        self.assertFalse(self.map.called)
+
+    def test_single_requests_are_not_dispatched(self):
+        self.batch([{'path': '/articles'}])
+        self.assertFalse(self.map.called)
+
+    def test_batches_are_sequential_if_workers_are_disabled(self):
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'batch_workers', self.workers)
+        registry.batch_workers = None
+        resp = self.batch([{'path': '/articles'}, {'path': '/articles'}])
+        self.assertEqual(len(resp.json['responses']), 2)
+
+    def test_batch_size_is_still_limited(self):
+        requests = [{'path': '/articles'}] * 26
+        self.batch(requests, status=400)
+        self.assertFalse(self.map.called)
+
+    def test_recursive_batches_are_still_forbidden(self):
+        requests = [{'path': '/articles'}, {'path': '/batch'}]
+        self.batch(requests, status=400)
+        self.assertFalse(self.map.called)
@@ -0,0 +1,290 @@
+import gzip
+import io
+import json
+import uuid
+
+import mock
+
+from cliquet.storage import memory
+
+from readinglist.views import bulk
+
+from .support import BaseWebTest, unittest
+
+
+MINIMALIST_ARTICLE = dict(title="MoFo",
+                          url="http://mozilla.org",
+                          added_by="FxOS")
+
+
+def to_ndjson(*records):
+    return ''.join([json.dumps(r) + '\n' for r in records]).encode('utf-8')
+
+
+class ExportTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        self.records = []
+        for i in range(3):
+            data = MINIMALIST_ARTICLE.copy()
+            data['url'] += '/%s' % i
+            resp = self.app.post_json('/articles', {'data': data},
+                                      headers=self.headers)
+            self.records.append(resp.json['data'])
+
+    def export(self, querystring='', **kwargs):
+        resp = self.app.get('/articles/export%s' % querystring,
+                            headers=self.headers, **kwargs)
+        lines = resp.body.decode('utf-8').splitlines()
+        return resp, [json.loads(line) for line in lines]
+
+    def test_authentication_is_required(self):
+        self.app.get('/articles/export', status=401)
+
+    def test_export_is_refused_if_not_supported_by_storage(self):
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'storage', registry.storage)
+        registry.storage = memory.Memory()
+        resp = self.app.get('/articles/export', headers=self.headers,
+                            status=400)
+        self.assertEqual(resp.json['details'][0]['description'],
+                         'Export is not supported')
+
+    def test_articles_are_exported_by_ascending_timestamp(self):
+        resp, records = self.export()
+        self.assertEqual(records, self.records)
+        self.assertEqual(resp.content_type, 'application/x-ndjson')
+
+    def test_collection_timestamp_is_provided(self):
+        resp, _ = self.export()
+        last_modified = self.records[-1]['last_modified']
+        self.assertEqual(resp.headers['ETag'], '"%s"' % last_modified)
+
+    def test_body_is_streamed(self):
+        with mock.patch.object(bulk, 'to_lines',
+                               wraps=bulk.to_lines) as to_lines:
+            self.export()
+        records = to_lines.call_args[0][0]
+        self.assertEqual(type(records).__name__, 'generator')
+
+    def test_tombstones_are_exported_if_since_is_provided(self):
+        since = self.records[0]['last_modified']
+        self.app.delete('/articles/%s' % self.records[1]['id'],
+                        headers=self.headers)
+        _, records = self.export('?_since=%s' % since)
+        self.assertEqual(records[0], self.records[2])
+        self.assertEqual(records[1]['id'], self.records[1]['id'])
+        self.assertTrue(records[1]['deleted'])
+
+    def test_tombstones_are_not_exported_by_default(self):
+        self.app.delete('/articles/%s' % self.records[1]['id'],
+                        headers=self.headers)
+        _, records = self.export()
+        self.assertEqual(len(records), 2)
+
+    def test_since_must_be_an_integer(self):
+        resp = self.app.get('/articles/export?_since=abc',
+                            headers=self.headers, status=400)
+        self.assertEqual(resp.json['details'][0]['name'], '_since')
+
+    def test_records_of_other_users_are_not_exported(self):
+        headers = self.headers.copy()
+        headers['Authorization'] = 'Basic Ym9iOjE='
+        resp = self.app.get('/articles/export', headers=headers)
+        self.assertEqual(resp.body, b'')
+
+
+class ImportTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(ImportTest, self).setUp()
+        resp = self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                                  headers=self.headers)
+        self.existing = resp.json['data']
+
+    def import_(self, body, **kwargs):
+        return self.app.post('/articles/import', body,
+                             headers=self.headers, **kwargs).json
+
+    def article(self, i):
+        data = MINIMALIST_ARTICLE.copy()
+        data['url'] += '/%s' % i
+        return data
+
+    def list_articles(self):
+        resp = self.app.get('/articles?_sort=url', headers=self.headers)
+        return resp.json['data']
+
+    def test_authentication_is_required(self):
+        self.app.post('/articles/import', b'', status=401)
+
+    def test_import_is_refused_if_not_supported_by_storage(self):
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'storage', registry.storage)
+        registry.storage = memory.Memory()
+        resp = self.import_(to_ndjson(self.article(1)), status=400)
+        self.assertEqual(resp['details'][0]['description'],
+                         'Import is not supported')
+
+    def test_articles_are_created(self):
+        result = self.import_(to_ndjson(self.article(1), self.article(2)))
+        self.assertEqual(result, {'created': 2, 'conflicts': [],
+                                  'errors': []})
+        articles = self.list_articles()
+        self.assertEqual(len(articles), 3)
+        self.assertEqual(articles[1]['resolved_url'], self.article(1)['url'])
+        self.assertIsNotNone(articles[1]['stored_on'])
+
+    def test_articles_are_stored_by_batches(self):
+        storage = self.app.app.registry.storage
+        body = to_ndjson(*[self.article(i) for i in range(5)])
+        with mock.patch.object(bulk, 'IMPORT_BATCH_SIZE', 2):
+            with mock.patch.object(storage, 'create_many',
+                                   wraps=storage.create_many) as create:
+                result = self.import_(body)
+        self.assertEqual(result['created'], 5)
+        self.assertEqual(create.call_count, 3)
+
+    def test_invalid_lines_are_reported(self):
+        body = b'\n'.join([b'{"title": ',
+                           b'[1, 2]',
+                           to_ndjson(self.article(1)).strip(),
+                           to_ndjson({'title': 'MoFo'}).strip(),
+                           to_ndjson({'deleted': True}).strip()])
+        result = self.import_(body)
+        self.assertEqual(result['created'], 1)
+        errors = [(e['line'], e['description']) for e in result['errors']]
+        self.assertEqual(errors[0], (1, 'Invalid JSON'))
+        self.assertEqual(errors[1], (2, 'Invalid JSON object'))
+        self.assertEqual(errors[2][0], 4)
+        self.assertIn('url: Required', errors[2][1])
+        self.assertEqual(errors[3],
+                         (5, 'Deleted articles cannot be imported'))
+
+    def test_empty_lines_are_ignored(self):
+        body = b'\n\n' + to_ndjson(self.article(1)) + b'\n'
+        result = self.import_(body)
+        self.assertEqual(result, {'created': 1, 'conflicts': [],
+                                  'errors': []})
+
+    def test_conflicts_are_reported(self):
+        body = to_ndjson(MINIMALIST_ARTICLE, self.article(1),
+                         self.article(1))
+        result = self.import_(body)
+        self.assertEqual(result['created'], 1)
+        created = [a for a in self.list_articles()
+                   if a['id'] != self.existing['id']][0]
+        self.assertEqual(result['conflicts'], [
+            {'line': 1, 'existing': self.existing['id']},
+            {'line': 3, 'existing': created['id']}])
+
+    def test_ids_can_be_specified(self):
+        article = self.article(1)
+        article['id'] = str(uuid.uuid4())
+        self.import_(to_ndjson(article))
+        self.app.get('/articles/%s' % article['id'], headers=self.headers)
+
+    def test_ids_are_validated(self):
+        article = self.article(1)
+        article['id'] = 'a b'
+        result = self.import_(to_ndjson(article))
+        self.assertEqual(result['errors'],
+                         [{'line': 1, 'description': 'Invalid record id'}])
+
+    def test_export_can_be_imported(self):
+        export = self.app.get('/articles/export', headers=self.headers).body
+        self.app.delete('/articles', headers=self.headers)
+        result = self.import_(export)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(self.list_articles()[0]['id'], self.existing['id'])
+
+    def test_body_can_be_gzipped(self):
+        out = io.BytesIO()
+        with gzip.GzipFile(fileobj=out, mode='wb') as f:
+            f.write(to_ndjson(self.article(1)))
+        headers = self.headers.copy()
+        headers['Content-Encoding'] = 'gzip'
+        resp = self.app.post('/articles/import', out.getvalue(),
+                             headers=headers)
+        self.assertEqual(resp.json['created'], 1)
+
+
+class SyncTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(SyncTest, self).setUp()
+        resp = self.app.post_json('/articles', {'data': MINIMALIST_ARTICLE},
+                                  headers=self.headers)
+        self.record = resp.json['data']
+
+    def sync(self, querystring='?device=phone', **kwargs):
+        return self.app.post('/articles/sync%s' % querystring,
+                             headers=self.headers, **kwargs)
+
+    def test_authentication_is_required(self):
+        self.app.post('/articles/sync?device=phone', status=401)
+
+    def test_device_is_required(self):
+        resp = self.sync('?device=%20', status=400)
+        self.assertEqual(resp.json['details'][0]['name'], 'device')
+
+    def test_first_synchronization_returns_whole_articles(self):
+        resp = self.sync()
+        self.assertEqual(resp.json, {
+            'data': [self.record],
+            'cursor': self.record['last_modified']})
+        self.assertEqual(resp.headers['ETag'],
+                         '"%s"' % self.record['last_modified'])
+
+    def test_modified_fields_and_tombstones_are_returned(self):
+        self.sync()
+        resp = self.app.patch_json('/articles/%s' % self.record['id'],
+                                   {'data': {'title': 'Firefox'}},
+                                   headers=self.headers)
+        updated = resp.json['data']
+        created = self.app.post_json('/articles', {'data': dict(
+            MINIMALIST_ARTICLE, url='http://mozilla.org/1')},
+            headers=self.headers).json['data']
+        self.app.delete('/articles/%s' % created['id'], headers=self.headers)
+        changes = self.sync().json['data']
+        self.assertEqual(changes[0], {
+            'id': updated['id'],
+            'last_modified': updated['last_modified'],
+            'title': 'Firefox'})
+        self.assertTrue(changes[1]['deleted'])
+        self.assertEqual(len(changes), 2)
+
+    def test_since_overrides_the_device_cursor(self):
+        self.sync()
+        resp = self.sync('?device=phone&_since=%s' % (
+            self.record['last_modified'] - 1))
+        self.assertEqual(resp.json['data'], [self.record])
+
+    def test_since_must_be_an_integer(self):
+        resp = self.sync('?device=phone&_since=abc', status=400)
+        self.assertEqual(resp.json['details'][0]['name'], '_since')
+
+    def test_next_page_is_provided_if_changes_are_limited(self):
+        self.app.post_json('/articles', {'data': dict(
+            MINIMALIST_ARTICLE, url='http://mozilla.org/1')},
+            headers=self.headers)
+        resp = self.sync('?device=phone&_since=0&_limit=1')
+        self.assertEqual(len(resp.json['data']), 1)
+        next_page = resp.headers['Next-Page']
+        self.assertNotIn('_since', next_page)
+        resp = self.app.post(next_page.replace('http://localhost/v2', ''),
+                             headers=self.headers)
+        self.assertEqual(len(resp.json['data']), 1)
+        self.assertNotIn('Next-Page', resp.headers)
+
+    def test_articles_of_other_users_are_not_synchronized(self):
+        headers = self.headers.copy()
+        headers['Authorization'] = 'Basic Ym9iOjE='
+        resp = self.app.post('/articles/sync?device=phone', headers=headers)
+        self.assertEqual(resp.json, {'data': [], 'cursor': None})
+
+    def test_synchronization_is_refused_if_not_supported_by_storage(self):
+        registry = self.app.app.registry
+        self.addCleanup(setattr, registry, 'storage', registry.storage)
+        registry.storage = memory.Memory()
+        resp = self.sync(status=400)
+        self.assertEqual(resp.json['details'][0]['description'],
+                         'Synchronization is not supported')
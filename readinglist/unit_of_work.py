@@ -0,0 +1,210 @@
+from cliquet import logger
+from cliquet.storage import (
+    DEFAULT_ID_FIELD, DEFAULT_MODIFIED_FIELD, DEFAULT_DELETED_FIELD)
+
+
+class UnitOfWork(object):
+    """Storage wrapper grouping the storage calls of a single request.
+
+    Records read or written during the request are kept, and read again from
+    memory. Collection timestamps are read once, and deduced from the records
+    written afterwards.
+
+    The number of round trips to the storage backend is bound to the request
+    summary log (``storage_round_trips``).
+
+    .. note::
+
+        It is meant to live during one request only: records are never
+        refreshed from the storage.
+
+    :param storage: the storage backend.
+    :param int round_trips: round trips already performed for the request.
+    """
+
+    def __init__(self, storage, round_trips=0):
+        self.storage = storage
+        self.round_trips = round_trips
+        self._records = {}
+        self._timestamps = {}
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def _round_trip(self):
+        self.round_trips += 1
+        logger.bind(storage_round_trips=self.round_trips)
+
+    def _remember(self, collection_id, parent_id, record, id_field):
+        key = (collection_id, parent_id, record[id_field])
+        self._records[key] = record.copy()
+
+    def _forget(self, collection_id, parent_id, object_id):
+        self._records.pop((collection_id, parent_id, object_id), None)
+
+    def remember_timestamp(self, collection_id, parent_id, timestamp):
+        """Remember the collection timestamp, read outside the unit of work.
+
+        :param str collection_id: the collection id.
+        :param str parent_id: the collection parent.
+        :param int timestamp: the current collection timestamp.
+        """
+        self._timestamps[(collection_id, parent_id)] = timestamp
+
+    def _bump_timestamp(self, collection_id, parent_id, records,
+                        modified_field):
+        # Written records get the new collection timestamp.
+        key = (collection_id, parent_id)
+        if records:
+            self._timestamps[key] = max([r[modified_field] for r in records])
+
+    def collection_timestamp(self, collection_id, parent_id, auth=None):
+        key = (collection_id, parent_id)
+        if key not in self._timestamps:
+            self._round_trip()
+            self._timestamps[key] = self.storage.collection_timestamp(
+                collection_id, parent_id, auth=auth)
+        return self._timestamps[key]
+
+    def get(self, collection_id, parent_id, object_id,
+            id_field=DEFAULT_ID_FIELD,
+            modified_field=DEFAULT_MODIFIED_FIELD,
+            auth=None):
+        cached = self._records.get((collection_id, parent_id, object_id))
+        if cached is not None:
+            return cached.copy()
+
+        self._round_trip()
+        record = self.storage.get(collection_id, parent_id, object_id,
+                                  id_field=id_field,
+                                  modified_field=modified_field,
+                                  auth=auth)
+        self._remember(collection_id, parent_id, record, id_field)
+        return record
+
+    def get_all(self, collection_id, parent_id, filters=None, sorting=None,
+                pagination_rules=None, limit=None, include_deleted=False,
+                id_field=DEFAULT_ID_FIELD,
+                modified_field=DEFAULT_MODIFIED_FIELD,
+                deleted_field=DEFAULT_DELETED_FIELD,
+                auth=None):
+        self._round_trip()
+        records, count = self.storage.get_all(
+            collection_id, parent_id,
+            filters=filters,
+            sorting=sorting,
+            pagination_rules=pagination_rules,
+            limit=limit,
+            include_deleted=include_deleted,
+            id_field=id_field,
+            modified_field=modified_field,
+            deleted_field=deleted_field,
+            auth=auth)
+        for record in records:
+            if not record.get(deleted_field):
+                self._remember(collection_id, parent_id, record, id_field)
+        return records, count
+
+    def search(self, collection_id, parent_id, terms, filters=None,
+               sorting=None, limit=None, offset=0,
+               id_field=DEFAULT_ID_FIELD,
+               modified_field=DEFAULT_MODIFIED_FIELD,
+               auth=None):
+        self._round_trip()
+        records, count = self.storage.search(
+            collection_id, parent_id, terms,
+            filters=filters,
+            sorting=sorting,
+            limit=limit,
+            offset=offset,
+            id_field=id_field,
+            modified_field=modified_field,
+            auth=auth)
+        for record in records:
+            self._remember(collection_id, parent_id, record, id_field)
+        return records, count
+
+    def create(self, collection_id, parent_id, record, id_generator=None,
+               unique_fields=None, id_field=DEFAULT_ID_FIELD,
+               modified_field=DEFAULT_MODIFIED_FIELD,
+               auth=None):
+        self._round_trip()
+        record = self.storage.create(collection_id, parent_id, record,
+                                     id_generator=id_generator,
+                                     unique_fields=unique_fields,
+                                     id_field=id_field,
+                                     modified_field=modified_field,
+                                     auth=auth)
+        self._remember(collection_id, parent_id, record, id_field)
+        self._bump_timestamp(collection_id, parent_id, [record],
+                             modified_field)
+        return record
+
+    def create_many(self, collection_id, parent_id, records,
+                    id_generator=None, unique_fields=None,
+                    id_field=DEFAULT_ID_FIELD,
+                    modified_field=DEFAULT_MODIFIED_FIELD,
+                    auth=None):
+        self._round_trip()
+        results = self.storage.create_many(collection_id, parent_id, records,
+                                           id_generator=id_generator,
+                                           unique_fields=unique_fields,
+                                           id_field=id_field,
+                                           modified_field=modified_field,
+                                           auth=auth)
+        created = [record for record, is_created in results if is_created]
+        for record in created:
+            self._remember(collection_id, parent_id, record, id_field)
+        self._bump_timestamp(collection_id, parent_id, created,
+                             modified_field)
+        return results
+
+    def update(self, collection_id, parent_id, object_id, record,
+               unique_fields=None, id_field=DEFAULT_ID_FIELD,
+               modified_field=DEFAULT_MODIFIED_FIELD,
+               auth=None):
+        self._round_trip()
+        record = self.storage.update(collection_id, parent_id, object_id,
+                                     record,
+                                     unique_fields=unique_fields,
+                                     id_field=id_field,
+                                     modified_field=modified_field,
+                                     auth=auth)
+        self._remember(collection_id, parent_id, record, id_field)
+        self._bump_timestamp(collection_id, parent_id, [record],
+                             modified_field)
+        return record
+
+    def delete(self, collection_id, parent_id, object_id,
+               id_field=DEFAULT_ID_FIELD,
+               modified_field=DEFAULT_MODIFIED_FIELD,
+               deleted_field=DEFAULT_DELETED_FIELD,
+               auth=None):
+        self._round_trip()
+        self._forget(collection_id, parent_id, object_id)
+        deleted = self.storage.delete(collection_id, parent_id, object_id,
+                                      id_field=id_field,
+                                      modified_field=modified_field,
+                                      deleted_field=deleted_field,
+                                      auth=auth)
+        self._bump_timestamp(collection_id, parent_id, [deleted],
+                             modified_field)
+        return deleted
+
+    def delete_all(self, collection_id, parent_id, filters=None,
+                   id_field=DEFAULT_ID_FIELD,
+                   modified_field=DEFAULT_MODIFIED_FIELD,
+                   deleted_field=DEFAULT_DELETED_FIELD,
+                   auth=None):
+        self._round_trip()
+        deleted = self.storage.delete_all(collection_id, parent_id,
+                                          filters=filters,
+                                          id_field=id_field,
+                                          modified_field=modified_field,
+                                          deleted_field=deleted_field,
+                                          auth=auth)
+        for record in deleted:
+            self._forget(collection_id, parent_id, record[id_field])
+        self._bump_timestamp(collection_id, parent_id, deleted,
+                             modified_field)
+        return deleted
@@ -1,15 +1,23 @@
 import colander
 from colander import SchemaNode, String
 
-from cliquet import errors
+from cliquet import errors, logger
 from cliquet.resource import register, BaseResource
 from cliquet.schema import ResourceSchema
-from cliquet.utils import strip_whitespace
+from cliquet.utils import (strip_whitespace, current_service, encode64,
+                           decode64, json)
 from cliquet.schema import URL, TimeStamp
 
+from readinglist.response_cache import cache_key
+from readinglist.unit_of_work import UnitOfWork
+
 
 TITLE_MAX_LENGTH = 1024
 
+CACHED_HEADERS = ('Total-Records', 'Next-Page')
+
+SEARCH_PARAM = 'q'
+
 
 class DeviceName(SchemaNode):
     """String representing the device name."""
@@ -88,6 +96,132 @@ class ArticleSchema(ResourceSchema):
 class Article(BaseResource):
     mapping = ArticleSchema()
 
+    def __init__(self, request, context=None):
+        super(Article, self).__init__(request, context)
+
+        # Group the storage calls of this request. The collection timestamp
+        # was just read by the base class.
+        unit_of_work = UnitOfWork(self.collection.storage, round_trips=1)
+        unit_of_work.remember_timestamp(self.collection.collection_id,
+                                        self.collection.parent_id,
+                                        self.timestamp)
+        self.collection.storage = unit_of_work
+
+    def collection_get(self):
+        """Serve the list from the response cache if the same query was
+        made since the last change in the collection.
+        """
+        response_cache = self.request.registry.response_cache
+        if response_cache is None:
+            return self._collection_get()
+
+        self._add_timestamp_header(self.request.response)
+        self._raise_304_if_not_modified()
+        self._raise_412_if_modified()
+
+        headers = self.request.response.headers
+        key = cache_key(self.request, self.collection.parent_id,
+                        self.timestamp)
+        # Compressed variants of the response are cached too.
+        self.request.response_cache_key = key
+        cached = response_cache.get(key)
+        if cached is None:
+            body = self._collection_get()
+            cached_headers = dict([(h, headers[h]) for h in CACHED_HEADERS
+                                   if h in headers])
+            response_cache.set(key, {'body': body, 'headers': cached_headers})
+            return body
+
+        for header, value in cached['headers'].items():
+            headers[str(header)] = str(value)
+        logger.bind(nb_records=len(cached['body']['data']))
+        return cached['body']
+
+    def _collection_get(self):
+        if SEARCH_PARAM in self.request.GET:
+            return self._search()
+        return super(Article, self).collection_get()
+
+    def _search(self):
+        """Full-text search in titles and excerpts, ranked by relevance.
+
+        Pagination relies on an offset, since the rank of records is not
+        part of them.
+        """
+        self._add_timestamp_header(self.request.response)
+        self._raise_304_if_not_modified()
+        self._raise_412_if_modified()
+
+        terms = self.request.GET[SEARCH_PARAM].strip()
+        if not terms:
+            errors.raise_invalid(self.request,
+                                 location='querystring',
+                                 name=SEARCH_PARAM,
+                                 description='Search terms are empty')
+
+        if not hasattr(self.request.registry.storage, 'search'):
+            errors.raise_invalid(self.request,
+                                 location='querystring',
+                                 name=SEARCH_PARAM,
+                                 description='Search is not supported')
+
+        filters = self._extract_filters()
+        sorting = None
+        if '_sort' in self.request.GET:
+            sorting = self._extract_sorting()
+        limit = self._extract_limit()
+        offset = self._extract_offset_from_token()
+
+        records, total_records = self.collection.storage.search(
+            self.collection.collection_id,
+            self.collection.parent_id,
+            terms,
+            filters=filters,
+            sorting=sorting,
+            limit=limit,
+            offset=offset,
+            id_field=self.collection.id_field,
+            modified_field=self.collection.modified_field,
+            auth=self.collection.auth)
+
+        headers = self.request.response.headers
+        if limit and len(records) == limit and \
+                total_records > offset + limit:
+            token = encode64(json.dumps({'offset': offset + limit}))
+            params = self.request.GET.copy()
+            params['_limit'] = limit
+            params['_token'] = token
+            service = current_service(self.request)
+            headers['Next-Page'] = self.request.route_url(
+                service.name, _query=params, **self.request.matchdict)
+
+        logger.bind(nb_records=len(records), limit=limit)
+        headers['Total-Records'] = ('%s' % total_records)
+        return {'data': records}
+
+    def _extract_offset_from_token(self):
+        token = self.request.GET.get('_token')
+        if not token:
+            return 0
+        try:
+            offset = json.loads(decode64(token))['offset']
+            assert isinstance(offset, int) and offset >= 0
+        except (ValueError, TypeError, KeyError, AssertionError):
+            errors.raise_invalid(self.request,
+                                 location='querystring',
+                                 name='_token',
+                                 description='_token has invalid content')
+        return offset
+
+    def _extract_filters(self, queryparams=None):
+        """Search terms are not a filter."""
+        if queryparams is None:
+            queryparams = self.request.GET.copy()
+        queryparams.pop(SEARCH_PARAM, None)
+        if not queryparams:
+            return []
+        return super(Article, self)._extract_filters(queryparams)
+
     def process_record(self, new, old=None):
         """Operate changes on submitted record.
         This implementation represents the specifities of the *Reading List*
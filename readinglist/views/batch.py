@@ -0,0 +1,76 @@
+import functools
+
+from pyramid import httpexceptions
+from pyramid.security import NO_PERMISSION_REQUIRED
+
+from cliquet import errors, logger, Service
+from cliquet.utils import build_request, build_response
+from cliquet.views import batch as cliquet_batch
+
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+# Replaces the batch endpoint of cliquet.
+batch = Service(name="batch", path='/batch',
+                description="Batch operations",
+                error_handler=errors.json_error_handler)
+
+
+def invoke(request, subrequest):
+    """Run the subrequest, and return its serialized response."""
+    sublogger = logger.new()
+    sublogger.bind(path=subrequest.path,
+                   method=subrequest.method)
+
+    try:
+        subresponse = request.invoke_subrequest(subrequest)
+    except httpexceptions.HTTPException as e:
+        error_msg = 'Failed batch subrequest'
+        subresponse = errors.http_error(e, message=error_msg)
+    except Exception as e:
+        logger.error(e)
+        subresponse = errors.http_error(
+            httpexceptions.HTTPInternalServerError())
+
+    sublogger.bind(code=subresponse.status_code)
+    sublogger.info('subrequest.summary')
+
+    return build_response(subresponse, subrequest)
+
+
+@batch.post(schema=cliquet_batch.BatchPayloadSchema,
+            permission=NO_PERMISSION_REQUIRED)
+def post_batch(request):
+    """Run the subrequests concurrently if none of them has side-effects.
+
+    Otherwise, or if the batch is invalid, the subrequests are run one after
+    the other by *cliquet*.
+    """
+    workers = request.registry.batch_workers
+    requests = request.validated['requests']
+    batch_size = len(requests)
+
+    limit = request.registry.settings['cliquet.batch_max_requests']
+    too_large = limit and batch_size > int(limit)
+    recursive = any([batch.path in req['path'] for req in requests])
+    safe = all([(req.get('method') or 'GET').upper() in SAFE_METHODS
+                for req in requests])
+
+    if workers is None or batch_size < 2 or too_large or recursive or \
+            not safe:
+        return cliquet_batch.post_batch(request)
+
+    subrequests = [build_request(request, spec) for spec in requests]
+    responses = workers.map(functools.partial(invoke, request), subrequests)
+
+    # Bind batch request for summary
+    logger.bind(path=batch.path,
+                method=request.method,
+                batch_size=batch_size,
+                batch_parallel=True,
+                agent=request.headers.get('User-Agent'),)
+
+    return {
+        'responses': responses
+    }
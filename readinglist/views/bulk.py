@@ -0,0 +1,239 @@
+import itertools
+
+import colander
+import six
+
+from cliquet import errors, logger, Service
+from cliquet.authorization import PRIVATE
+from cliquet.utils import json, native_value
+
+from readinglist.views.article import Article
+
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Number of imported lines stored at once.
+IMPORT_BATCH_SIZE = 500
+
+
+export = Service(name='article-export',
+                 path='/articles/export',
+                 description='Export of articles',
+                 cors_origins=('*',),
+                 cors_headers=('Last-Modified', 'ETag'),
+                 error_handler=errors.json_error_handler)
+
+import_ = Service(name='article-import',
+                  path='/articles/import',
+                  description='Import of articles',
+                  cors_origins=('*',),
+                  error_handler=errors.json_error_handler)
+
+sync = Service(name='article-sync',
+               path='/articles/sync',
+               description='Synchronization of articles',
+               cors_origins=('*',),
+               cors_headers=('Last-Modified', 'ETag', 'Next-Page'),
+               error_handler=errors.json_error_handler)
+
+
+def extract_since(request):
+    """Return the ``_since`` timestamp of the querystring, if any."""
+    since = request.GET.get('_since')
+    if since is not None:
+        since = native_value(since)
+        if not isinstance(since, six.integer_types):
+            errors.raise_invalid(request,
+                                 location='querystring',
+                                 name='_since',
+                                 description='Invalid value for _since')
+    return since
+
+
+def to_lines(records):
+    for record in records:
+        yield (json.dumps(record) + '\n').encode('utf-8')
+
+
+@export.get(permission=PRIVATE)
+def export_articles(request):
+    """Stream every article of the user, one JSON object per line, by
+    ascending timestamp.
+
+    If ``_since`` is specified, only articles modified afterwards are
+    exported, tombstones included.
+    """
+    since = extract_since(request)
+
+    if not hasattr(request.registry.storage, 'iter_records'):
+        errors.raise_invalid(request,
+                             location='path',
+                             description='Export is not supported')
+
+    resource = Article(request)
+    collection = resource.collection
+    records = collection.storage.iter_records(
+        collection.collection_id,
+        collection.parent_id,
+        since=since,
+        include_deleted=since is not None,
+        id_field=collection.id_field,
+        modified_field=collection.modified_field,
+        deleted_field=collection.deleted_field,
+        auth=collection.auth)
+
+    response = request.response
+    resource._add_timestamp_header(response)
+    response.content_type = NDJSON_CONTENT_TYPE
+    response.app_iter = to_lines(records)
+    return response
+
+
+def deserialize(resource, line):
+    """Validate an imported line, and return the article to create.
+
+    :raises ValueError: if the line is not a valid article.
+    """
+    collection = resource.collection
+    try:
+        data = json.loads(line.decode('utf-8'))
+    except ValueError:
+        raise ValueError('Invalid JSON')
+    if not isinstance(data, dict):
+        raise ValueError('Invalid JSON object')
+    if data.get(collection.deleted_field):
+        raise ValueError('Deleted articles cannot be imported')
+
+    try:
+        record = resource.mapping.deserialize(data)
+    except colander.Invalid as e:
+        details = sorted(e.asdict().items())
+        raise ValueError('; '.join(['%s: %s' % d for d in details]))
+
+    record_id = data.get(collection.id_field)
+    if record_id is not None:
+        if not collection.id_generator.match(six.text_type(record_id)):
+            raise ValueError('Invalid record id')
+        record[collection.id_field] = record_id
+
+    return resource.process_record(record)
+
+
+@import_.post(permission=PRIVATE)
+def import_articles(request):
+    """Create articles from the request body, one JSON object per line.
+
+    Lines are validated one by one, and stored by batches. Invalid lines,
+    and articles conflicting with existing ones, are reported with their
+    line number.
+    """
+    if not hasattr(request.registry.storage, 'create_many'):
+        errors.raise_invalid(request,
+                             location='path',
+                             description='Import is not supported')
+
+    resource = Article(request)
+    collection = resource.collection
+    unique_fields = resource.mapping.get_option('unique_fields')
+
+    created = 0
+    conflicts = []
+    invalid = []
+
+    lines = enumerate(request.body_file, 1)
+    while True:
+        batch = list(itertools.islice(lines, IMPORT_BATCH_SIZE))
+        if not batch:
+            break
+
+        numbers = []
+        records = []
+        for number, line in batch:
+            if not line.strip():
+                continue
+            try:
+                records.append(deserialize(resource, line))
+                numbers.append(number)
+            except ValueError as e:
+                invalid.append({'line': number, 'description': '%s' % e})
+
+        if not records:
+            continue
+
+        results = collection.storage.create_many(
+            collection.collection_id,
+            collection.parent_id,
+            records,
+            id_generator=collection.id_generator,
+            unique_fields=unique_fields,
+            id_field=collection.id_field,
+            modified_field=collection.modified_field,
+            auth=collection.auth)
+
+        for number, (record, is_created) in zip(numbers, results):
+            if is_created:
+                created += 1
+            else:
+                existing = record[collection.id_field]
+                conflicts.append({'line': number, 'existing': existing})
+
+    logger.bind(nb_records=created)
+    return {
+        'created': created,
+        'conflicts': conflicts,
+        'errors': invalid
+    }
+
+
+@sync.post(permission=PRIVATE)
+def sync_articles(request):
+    """Return the changes of the articles since the last synchronization
+    of the ``device``, and remember it.
+
+    Articles created since then are sent whole, modified ones only with
+    their modified fields, and deleted ones as tombstones. If ``_since`` is
+    specified, changes are sent from this timestamp instead (e.g. if the
+    previous response was lost).
+
+    If there are more than ``_limit`` changes, the ``Next-Page`` header
+    gives the URL of the next synchronization.
+    """
+    device = request.GET.get('device', '').strip()
+    if not device:
+        errors.raise_invalid(request,
+                             location='querystring',
+                             name='device',
+                             description='Device name is missing')
+    since = extract_since(request)
+
+    if not hasattr(request.registry.storage, 'sync'):
+        errors.raise_invalid(request,
+                             location='querystring',
+                             name='device',
+                             description='Synchronization is not supported')
+
+    resource = Article(request)
+    collection = resource.collection
+    limit = resource._extract_limit() or None
+    changes, cursor, has_more = collection.storage.sync(
+        collection.collection_id,
+        collection.parent_id,
+        device,
+        since=since,
+        limit=limit,
+        id_field=collection.id_field,
+        modified_field=collection.modified_field,
+        deleted_field=collection.deleted_field,
+        auth=collection.auth)
+
+    response = request.response
+    resource._add_timestamp_header(response)
+    if has_more:
+        params = request.GET.copy()
+        params.pop('_since', None)
+        params['_limit'] = limit
+        response.headers['Next-Page'] = request.route_url(sync.name,
+                                                          _query=params)
+
+    logger.bind(nb_records=len(changes), limit=limit)
+    return {'data': changes, 'cursor': cursor}
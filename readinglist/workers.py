@@ -0,0 +1,53 @@
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+from pyramid.settings import asbool
+
+
+class WorkerPool(object):
+    """Bounded pool of threads, or greenlets if *gevent* is enabled.
+
+    Workers are started on first use, and again in forked processes, since
+    threads do not survive a fork (e.g. *uWSGI* loading the application
+    before forking its workers).
+
+    :param int size: maximum number of concurrent tasks.
+    :param bool gevent_enabled: use a pool of greenlets instead of threads.
+    """
+
+    def __init__(self, size, gevent_enabled=False):
+        self.size = size
+        self.gevent_enabled = gevent_enabled
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _create_pool(self):
+        if self.gevent_enabled:
+            import gevent.pool
+            return gevent.pool.Pool(self.size)
+        return ThreadPool(self.size)
+
+    def map(self, func, iterable):
+        """Run the function on each item concurrently.
+
+        :returns: the results, in the order of the items.
+        :rtype: list
+        """
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = self._create_pool()
+                self._pid = os.getpid()
+        return self._pool.map(func, iterable)
+
+
+def load_from_config(config):
+    settings = config.get_settings()
+
+    size = int(settings['readinglist.batch_workers'])
+    if size < 2:
+        return None
+
+    gevent_enabled = asbool(settings.get('readinglist.gevent_enabled', False))
+    return WorkerPool(size, gevent_enabled=gevent_enabled)
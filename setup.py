@@ -12,12 +12,21 @@ with open(os.path.join(here, 'CHANGELOG.rst')) as f:
 
 REQUIREMENTS = [
     'waitress>=0.8.9',
+    'requests',
     'cliquet[postgresql,monitoring]>=2.3,<2.4',
 ]
 
+EXTRAS_REQUIREMENTS = {
+    'brotli': ['brotli'],
+    'msgpack': ['msgpack'],
+}
+
 ENTRY_POINTS = {
     'paste.app_factory': [
         'main = readinglist:main',
+    ],
+    'console_scripts': [
+        'readinglist = readinglist.scripts.readinglist:main',
     ]}
 
 setup(name='readinglist',
@@ -39,4 +48,5 @@ setup(name='readinglist',
       include_package_data=True,
       zip_safe=False,
       install_requires=REQUIREMENTS,
+      extras_require=EXTRAS_REQUIREMENTS,
       entry_points=ENTRY_POINTS)